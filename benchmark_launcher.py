@@ -0,0 +1,259 @@
+import os
+import sys
+import csv
+import queue
+import shutil
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+
+import disc_classifier
+import iso9660
+import launch_timing
+import library_index
+import media_events
+import retrospin_launcher as launcher
+
+# End-to-end launcher benchmark with no drive and no MiSTer: synthetic PSX and Saturn
+# images are served through FakeMediaEventSource, /dev/MiSTer_cmd is replaced by a FIFO,
+# and library trees of each size are generated on disk. Exits non-zero if any p95
+# exceeds its threshold, so it can gate changes on the launch path.
+#
+#   python3 benchmark_launcher.py [library sizes...]   (default 1000 10000 50000)
+LIBRARY_SIZES = [1000, 10000, 50000]
+FILES_PER_DIR = 500
+RUNS = 20
+RESPONSE_TIMEOUT = 10
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+CSV_PATH = os.path.join(REPO_DIR, "games.csv")
+
+# p95 ceilings in milliseconds
+THRESHOLDS_MS = {
+    "identify PSX": 20,
+    "identify SATURN": 20,
+    "title lookup": 1,
+    "find_game_file": 5,
+    "insert->load_core (first)": 250,
+    "insert->load_core (cached)": 50,
+    "import launcher (cold)": 300,  # A fresh interpreter importing the launcher, as after boot
+    "launcher startup": 150,  # main() until it waits for discs; the same for any library size
+}
+# Scaled by library size
+LIBRARY_SCAN_MS_PER_1K_FILES = 400  # Cold library index build
+LIBRARY_LOAD_MS_PER_1K_FILES = 15  # Library index loaded from disk, as the warm-up thread does
+
+def directory_record(name, lba, size, is_dir):
+    name = name.encode('ascii')
+    length = 33 + len(name) + (33 + len(name)) % 2
+    record = bytearray(length)
+    record[0] = length
+    record[2:10] = struct.pack("<I", lba) + struct.pack(">I", lba)  # Both-endian fields
+    record[10:18] = struct.pack("<I", size) + struct.pack(">I", size)
+    record[25] = 2 if is_dir else 0
+    record[32] = len(name)
+    record[33:33 + len(name)] = name
+    return bytes(record)
+
+def psx_image(game_id):
+    """A minimal ISO9660 PlayStation data track whose SYSTEM.CNF boots game_id."""
+    boot = f"BOOT = cdrom:\\{game_id.replace('-', '_')[:8]}.{game_id[-2:]};1\r\nTCB = 4\r\n".encode('ascii')
+    sectors = [bytes(iso9660.SECTOR_SIZE)] * 20
+    pvd = bytearray(iso9660.SECTOR_SIZE)
+    pvd[0:7] = b"\x01CD001\x01"
+    pvd[8:40] = b"PLAYSTATION".ljust(32)
+    pvd[156:190] = directory_record("\0", 18, iso9660.SECTOR_SIZE, True)
+    root = directory_record("\0", 18, iso9660.SECTOR_SIZE, True) + directory_record("\1", 18, iso9660.SECTOR_SIZE, True)
+    root += directory_record("SYSTEM.CNF;1", 19, len(boot), False)
+    sectors[16] = bytes(pvd)
+    sectors[17] = b"\xffCD001\x01".ljust(iso9660.SECTOR_SIZE, b"\0")
+    sectors[18] = root.ljust(iso9660.SECTOR_SIZE, b"\0")
+    sectors[19] = boot.ljust(iso9660.SECTOR_SIZE, b"\0")
+    return b"".join(sectors)
+
+def saturn_image(game_id, version="V1.000"):
+    """A Saturn data track with just the IP.BIN header in sector 0."""
+    header = bytearray(iso9660.SECTOR_SIZE)
+    header[0x00:0x10] = b"SEGA SEGASATURN "
+    header[0x10:0x20] = b"SEGA TP T-000   "
+    header[0x20:0x2A] = game_id.encode('ascii').ljust(10)
+    header[0x2A:0x30] = version.encode('ascii')
+    header[0x30:0x38] = b"19960101"
+    header[0x38:0x40] = b"CD-1/1  "
+    header[0x40:0x50] = b"JTUE".ljust(16)
+    header[0x60:0x70] = b"J".ljust(16)
+    return bytes(header) + bytes(iso9660.SECTOR_SIZE * 19)
+
+def read_targets(csv_path):
+    """Pick the first PSX and Saturn game from games.csv, plus every title for library filler."""
+    targets = {}
+    titles = []
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader)
+        for row in reader:
+            if len(row) < 4 or not row[1]:
+                continue
+            titles.append(row[1])
+            # Saturn IDs must fit the 10-byte IP.BIN field
+            if row[3] not in targets and (row[3] != "SATURN" or len(row[0]) <= 10) and "/" not in row[1]:
+                targets[row[3]] = (row[0], row[1])
+    return targets, titles
+
+def populate_library(root, size, titles, targets):
+    """Create size empty game files spread over subdirectories, including the target games."""
+    game_dirs = {"PSX": os.path.join(root, "PSX"), "SATURN": os.path.join(root, "Saturn")}
+    for system, (_, title) in targets.items():
+        os.makedirs(game_dirs[system], exist_ok=True)
+        open(os.path.join(game_dirs[system], f"{title}.chd"), 'w').close()
+    for i in range(size - len(targets)):
+        system = "PSX" if i % 5 else "SATURN"
+        directory = os.path.join(game_dirs[system], f"{i // FILES_PER_DIR:03d}")
+        if i % FILES_PER_DIR < 5:
+            os.makedirs(directory, exist_ok=True)
+        title = titles[i % len(titles)].replace("/", "-")
+        open(os.path.join(directory, f"{title} (Copy {i}).chd"), 'w').close()
+    return game_dirs
+
+class CommandPipe:
+    """A FIFO standing in for /dev/MiSTer_cmd; timestamps every command written to it."""
+
+    def __init__(self, path):
+        self.path = path
+        os.mkfifo(path)
+        self.commands = queue.Queue()
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        while True:
+            # Each command opens and closes the pipe, so reopen after every EOF
+            with open(self.path, 'r') as f:
+                for line in f:
+                    self.commands.put((time.monotonic(), line.strip()))
+
+    def next_command(self, timeout=RESPONSE_TIMEOUT):
+        return self.commands.get(timeout=timeout)
+
+def timed(func, runs=RUNS):
+    samples = []
+    for _ in range(runs):
+        start = time.monotonic()
+        func()
+        samples.append((time.monotonic() - start) * 1000)
+    return samples
+
+def configure_launcher(work_dir, game_dirs, pipe_path):
+    core_dir = os.path.join(work_dir, "_Console")
+    os.makedirs(core_dir)
+    for core in ("PSX_20250101.rbf", "Saturn_20250101.rbf"):
+        open(os.path.join(core_dir, core), 'w').close()
+    launcher.MISTER_CMD = pipe_path
+    launcher.MISTER_CORE_DIR = core_dir
+    launcher.PSX_GAME_PATHS = [game_dirs["PSX"]]
+    launcher.SATURN_GAME_PATHS = [game_dirs["SATURN"]]
+    launcher.CSV_PATH = CSV_PATH
+    launcher.INDEX_PATH = os.path.join(work_dir, "games.idx")
+    launcher.LIBRARY_INDEX_PATH = os.path.join(work_dir, "library.json")
+    launcher.DISC_CACHE_PATH = os.path.join(work_dir, "disc_cache.json")
+    launcher.CORE_CACHE_PATH = os.path.join(work_dir, "cores.json")
+    launcher.TIMING_LOG_PATH = os.path.join(work_dir, "launch_timing.jsonl")
+    launcher.TMP_MGL_PATH = os.path.join(work_dir, "game.mgl")
+    launcher.CONTROL_SOCKET_PATH = os.path.join(work_dir, "retrospin.sock")
+    launcher.STAGING_DIR = os.path.join(work_dir, "staging")
+
+def insert_and_wait(source, pipe, drive_path):
+    """Insert a disc, wait for the load_core command, then eject; return the latency in ms."""
+    start = time.monotonic()
+    source.insert(drive_path)
+    arrived, command = pipe.next_command()
+    if not command.startswith("load_core"):
+        raise RuntimeError(f"Unexpected command from launcher: {command}")
+    source.eject(drive_path)
+    return (arrived - start) * 1000
+
+def benchmark_library(size, targets, titles, work_dir):
+    """Run every measurement against a library of size files; return {metric: samples}."""
+    game_dirs = populate_library(os.path.join(work_dir, "library"), size, titles, targets)
+    pipe = CommandPipe(os.path.join(work_dir, "MiSTer_cmd"))
+    configure_launcher(work_dir, game_dirs, pipe.path)
+    images = {}
+    for system, (game_id, _) in targets.items():
+        images[system] = os.path.join(work_dir, f"{system}.iso")
+        with open(images[system], 'wb') as f:
+            f.write(psx_image(game_id) if system == "PSX" else saturn_image(game_id))
+
+    results = {}
+    results["library scan (cold)"] = timed(launcher.load_game_library, runs=1)
+    results["library index load"] = timed(lambda: library_index.LibraryIndex(launcher.game_library.roots, launcher.LIBRARY_INDEX_PATH), runs=5)
+    results["import launcher (cold)"] = timed(lambda: subprocess.run([sys.executable, "-c", "import retrospin_launcher"], cwd=REPO_DIR, check=True), runs=5)
+    for system, image in images.items():
+        def identify(image=image):
+            with iso9660.SectorReader(image) as reader:
+                disc_classifier.identify(disc_classifier.probe(reader))
+        results[f"identify {system}"] = timed(identify)
+    game_titles = launcher.load_game_titles()
+    results["title lookup"] = timed(lambda: [game_titles.get((game_id, system)) for system, (game_id, _) in targets.items()])
+    results["find_game_file"] = timed(lambda: [launcher.find_game_file(title, system) for system, (_, title) in targets.items()])
+
+    # The real event loop, fed by the fake drive and answering into the FIFO
+    source = media_events.FakeMediaEventSource(images.values())
+    start = time.monotonic()
+    threading.Thread(target=launcher.main, args=(source,), daemon=True).start()
+    if not source.waiting.wait(RESPONSE_TIMEOUT):
+        raise RuntimeError("Launcher did not start waiting for discs")
+    results["launcher startup"] = [(time.monotonic() - start) * 1000]
+    launcher.get_game_library()  # Let the warm-up finish, so the first insert measures identification
+    first, cached = [], []
+    for run in range(RUNS):
+        for image in images.values():
+            (first if run == 0 else cached).append(insert_and_wait(source, pipe, image))
+    results["insert->load_core (first)"] = first
+    results["insert->load_core (cached)"] = cached
+    stage_summary = launcher.timing_log.summary()
+    return results, stage_summary
+
+def report(size, results, out):
+    """Print one table for a library size to out and return the number of thresholds exceeded."""
+    failures = 0
+    thresholds = dict(THRESHOLDS_MS, **{
+        "library scan (cold)": LIBRARY_SCAN_MS_PER_1K_FILES * size / 1000,
+        "library index load": LIBRARY_LOAD_MS_PER_1K_FILES * size / 1000,
+    })
+    print(f"\nLibrary of {size} files", file=out)
+    print(f"{'metric':<28}{'runs':>6}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'limit':>10}", file=out)
+    for metric, samples in results.items():
+        samples = sorted(samples)
+        p95 = launch_timing.percentile(samples, 95)
+        limit = thresholds.get(metric)
+        failed = limit is not None and p95 > limit
+        failures += failed
+        print(f"{metric:<28}{len(samples):>6}{launch_timing.percentile(samples, 50):>10.2f}{p95:>10.2f}"
+              f"{samples[-1]:>10.2f}{limit if limit is not None else '-':>10}{'  FAIL' if failed else ''}", file=out)
+    return failures
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or LIBRARY_SIZES
+    targets, titles = read_targets(CSV_PATH)
+    print("Target discs: " + ", ".join(f"{system} {game_id} ({title})" for system, (game_id, title) in targets.items()))
+    failures = 0
+    out = sys.stdout
+    for size in sizes:
+        work_dir = tempfile.mkdtemp(prefix=f"retrospin-bench-{size}-")
+        try:
+            # The launcher keeps logging from its own thread, so its output stays silenced throughout
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                results, stage_summary = benchmark_library(size, targets, titles, work_dir)
+                failures += report(size, results, out)
+                print("Launcher stage timings:", file=out)
+                print(stage_summary, file=out)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    if failures:
+        print(f"\n{failures} measurements exceeded their thresholds")
+        sys.exit(1)
+    print("\nAll measurements within thresholds")
+
+if __name__ == "__main__":
+    main()
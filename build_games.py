@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+import sqlite3
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "psx"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "saturn"))
+import games_db
+import redump_dat
+import title_index
+from http_cache import CachedFetcher
+
+# One pass from every source to every artifact the launcher reads:
+#   psxdatacenter + Saturn ID pages -> games.db (upserted by ID, system, version, disc)
+#   Redump DAT (if present)         -> games.db titles
+#   games.db                        -> games.csv -> games.idx
+CSV_PATH = "games.csv"
+INDEX_PATH = title_index.INDEX_PATH
+REDUMP_DAT_DIR = "."
+REDUMP_DAT_PREFIX = "Sony - PlayStation"
+
+def run_stage(name, func, *args):
+    start = time.perf_counter()
+    print(f"== {name}")
+    try:
+        result = func(*args)
+    except Exception as e:
+        print(f"{name} failed: {e}")
+        result = None
+    print(f"== {name} took {time.perf_counter() - start:.1f}s")
+    return result
+
+def scrape_psx(fetcher, conn):
+    import game_scraper
+    games = game_scraper.scrape_games(fetcher)
+    games_db.upsert_games(conn, games)
+    return len(games)
+
+def scrape_saturn(fetcher, conn):
+    import scrape_saturn_games
+    games = scrape_saturn_games.scrape_games(fetcher)
+    games_db.upsert_games(conn, games)
+    return len(games)
+
+def import_redump(dat_path):
+    import psx_redump_match
+    psx_redump_match.update_database_with_redump(dat_path)
+
+def build(replay=False, scrape=True):
+    conn = sqlite3.connect(games_db.DB_PATH)
+    migrated = games_db.ensure_schema(conn)
+    if os.path.exists(CSV_PATH) and (migrated or not conn.execute("SELECT 1 FROM games WHERE system = 'SATURN' LIMIT 1").fetchone()):
+        # First build, or the first since the key changed: carry over entries (such as
+        # the other discs of a set an older key collapsed) that only lived in games.csv
+        run_stage(f"Seed from {CSV_PATH}", games_db.import_csv, conn, CSV_PATH)
+
+    if scrape:
+        # The scrapers need BeautifulSoup, so they are only imported when scraping
+        import game_scraper
+        fetcher = CachedFetcher(headers=game_scraper.HEADERS, replay=replay)
+        run_stage("Scrape PSX", scrape_psx, fetcher, conn)
+        run_stage("Scrape Saturn", scrape_saturn, fetcher, conn)
+        fetcher.close()
+        print(f"Pages fetched: {fetcher.stats['fetched']}, unchanged: {fetcher.stats['not_modified']}, replayed: {fetcher.stats['replayed']}")
+
+    dat_path = redump_dat.find_dat(REDUMP_DAT_DIR, REDUMP_DAT_PREFIX)
+    if dat_path:
+        conn.commit()
+        run_stage(f"Import {dat_path}", import_redump, dat_path)
+
+    count = run_stage(f"Export {CSV_PATH}", games_db.export_csv, conn, CSV_PATH)
+    conn.close()
+    if count is not None:
+        print(f"Wrote {count} games to {CSV_PATH}")
+        run_stage(f"Compile {INDEX_PATH}", title_index.build_index, CSV_PATH, INDEX_PATH)
+
+def main():
+    # --replay parses saved pages without the network; --no-scrape only re-imports and re-exports
+    args = sys.argv[1:]
+    build(replay="--replay" in args, scrape="--no-scrape" not in args)
+
+if __name__ == "__main__":
+    main()
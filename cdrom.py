@@ -0,0 +1,110 @@
+import os
+import fcntl
+import struct
+
+# Linux CD-ROM ioctls (linux/cdrom.h)
+CDROMREADTOCHDR = 0x5305
+CDROMREADTOCENTRY = 0x5306
+CDROM_MEDIA_CHANGED = 0x5325
+CDROM_DRIVE_STATUS = 0x5326
+CDSL_CURRENT = 0x7fffffff
+
+# CDROM_DRIVE_STATUS results
+CDS_NO_INFO = 0
+CDS_NO_DISC = 1
+CDS_TRAY_OPEN = 2
+CDS_DRIVE_NOT_READY = 3
+CDS_DISC_OK = 4
+
+CDROM_LBA = 0x01
+CDROM_LEADOUT = 0xAA
+CDROM_DATA_TRACK = 0x04
+
+# struct cdrom_tochdr and struct cdrom_tocentry (LBA addressing)
+TOCHDR = struct.Struct("BB")
+TOCENTRY = struct.Struct("BBBxiBxxx")
+
+# SCSI peripheral device type reported in sysfs for CD/DVD drives
+TYPE_ROM = "5"
+SYS_BLOCK_DIR = "/sys/block"
+
+def list_optical_drives():
+    """List optical drive device paths from sysfs without spawning lsblk."""
+    drives = []
+    try:
+        names = sorted(os.listdir(SYS_BLOCK_DIR))
+    except OSError:
+        return drives
+    for name in names:
+        try:
+            with open(os.path.join(SYS_BLOCK_DIR, name, "device", "type"), 'r') as f:
+                device_type = f.read().strip()
+        except OSError:
+            device_type = None
+        if device_type == TYPE_ROM or (device_type is None and name.startswith("sr")):
+            drives.append(f"/dev/{name}")
+    return drives
+
+def open_drive(drive_path):
+    """Open a drive for ioctls without requiring a disc to be present."""
+    return os.open(drive_path, os.O_RDONLY | os.O_NONBLOCK)
+
+def drive_status(drive_path):
+    """Return the CDS_* status of the drive, or CDS_NO_INFO if it cannot be queried."""
+    try:
+        fd = open_drive(drive_path)
+    except OSError:
+        return CDS_NO_INFO
+    try:
+        return fcntl.ioctl(fd, CDROM_DRIVE_STATUS, CDSL_CURRENT)
+    except OSError:
+        return CDS_NO_INFO
+    finally:
+        os.close(fd)
+
+def media_changed(drive_path):
+    """Return True if the kernel saw a media change since the last call."""
+    try:
+        fd = open_drive(drive_path)
+    except OSError:
+        return False
+    try:
+        return fcntl.ioctl(fd, CDROM_MEDIA_CHANGED, CDSL_CURRENT) == 1
+    except OSError:
+        return False
+    finally:
+        os.close(fd)
+
+def enable_kernel_polling(drive_path, interval_ms):
+    """Ask the block layer to poll the drive for media events if nothing else does."""
+    name = os.path.basename(drive_path)
+    poll_path = os.path.join(SYS_BLOCK_DIR, name, "events_poll_msecs")
+    try:
+        with open(poll_path, 'r') as f:
+            current = int(f.read().strip())
+        if current > 0:
+            return True
+        with open(poll_path, 'w') as f:
+            f.write(str(interval_ms))
+        return True
+    except (OSError, ValueError):
+        return False
+
+def read_toc(drive_path):
+    """Return [(track number, is_data, start lba), ...] ending with the lead-out, or None."""
+    try:
+        fd = open_drive(drive_path)
+    except OSError:
+        return None
+    try:
+        first, last = TOCHDR.unpack(fcntl.ioctl(fd, CDROMREADTOCHDR, bytes(TOCHDR.size)))
+        toc = []
+        for track in list(range(first, last + 1)) + [CDROM_LEADOUT]:
+            request = TOCENTRY.pack(track, 0, CDROM_LBA, 0, 0)
+            _, adr_ctrl, _, lba, _ = TOCENTRY.unpack(fcntl.ioctl(fd, CDROMREADTOCENTRY, request))
+            toc.append((track, bool((adr_ctrl >> 4) & CDROM_DATA_TRACK), lba))
+        return toc
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
@@ -0,0 +1,332 @@
+import os
+import zlib
+import struct
+import hashlib
+import binascii
+import multiprocessing
+from collections import deque
+
+# CHD v5 container written for CD images, readable by chdman and libchdr (MiSTer).
+# Each hunk holds 8 frames of 2352 sector bytes plus 96 (empty) subcode bytes and
+# is compressed with the "cdzl" codec: raw deflate of the sector data, then of the subcode.
+CHD_MAGIC = b"MComprHD"
+CHD_VERSION = 5
+HEADER_SIZE = 124
+SECTOR_SIZE = 2352
+SUBCODE_SIZE = 96
+FRAME_SIZE = SECTOR_SIZE + SUBCODE_SIZE
+FRAMES_PER_HUNK = 8
+HUNK_BYTES = FRAMES_PER_HUNK * FRAME_SIZE
+TRACK_PADDING = 4  # Each track's frame count is padded to a multiple of this
+CODEC_CDZL = b"cdzl"
+COMPRESSION_LEVEL = 9
+
+# Map entry compression types
+COMPRESSION_TYPE_0 = 0
+COMPRESSION_NONE = 4
+
+METADATA_HEADER = struct.Struct(">4sB3sQ")
+CDROM_TRACK_METADATA2_TAG = b"CHT2"
+CDROM_TRACK_METADATA2_FORMAT = "TRACK:{} TYPE:{} SUBTYPE:NONE FRAMES:{} PREGAP:0 PGTYPE:MODE1 PGSUB:RW POSTGAP:0"
+CHD_MDFLAGS_CHECKSUM = 0x01
+TRACK_TYPES = {"MODE1/2352": "MODE1_RAW", "MODE2/2352": "MODE2_RAW", "AUDIO": "AUDIO"}
+
+MAX_PENDING_PER_WORKER = 4
+# Workers come from a fork server, never forked from the caller: a rip worker already runs
+# threads (queue feeders, the DAT loader of its previous job) by the time it writes a CHD
+MP = multiprocessing.get_context("forkserver")
+RESUME_READ_SIZE = 1024 * 1024
+PART_SUFFIX = ".part"  # The CHD is written under this name and only renamed once complete
+
+def compress_hunk(hunk):
+    """Worker: return (cdzl payload or None if it does not shrink, CRC-16 of the hunk)."""
+    frames = len(hunk) // FRAME_SIZE
+    sectors = b"".join(hunk[i * FRAME_SIZE:i * FRAME_SIZE + SECTOR_SIZE] for i in range(frames))
+    subcode = b"".join(hunk[i * FRAME_SIZE + SECTOR_SIZE:(i + 1) * FRAME_SIZE] for i in range(frames))
+    base = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+    base_data = base.compress(sectors) + base.flush()
+    sub = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+    sub_data = sub.compress(subcode) + sub.flush()
+    # Header: ECC-cleared frame bitmap (none cleared), then the 16-bit length of the sector stream
+    payload = bytes((frames + 7) // 8) + struct.pack(">H", len(base_data)) + base_data + sub_data
+    crc = binascii.crc_hqx(hunk, 0xFFFF)
+    if len(payload) >= len(hunk):
+        return None, crc
+    return payload, crc
+
+def decompress_hunk(payload):
+    """Inverse of compress_hunk for a full hunk: return (hunk, payload bytes it used)."""
+    start = (FRAMES_PER_HUNK + 7) // 8 + 2
+    base_length, = struct.unpack_from(">H", payload, start - 2)
+    sectors = zlib.decompress(payload[start:start + base_length], -zlib.MAX_WBITS)
+    sub = zlib.decompressobj(-zlib.MAX_WBITS)
+    rest = payload[start + base_length:]
+    subcode = sub.decompress(rest)
+    if not sub.eof or len(sectors) != FRAMES_PER_HUNK * SECTOR_SIZE or len(subcode) != FRAMES_PER_HUNK * SUBCODE_SIZE:
+        raise ValueError("Corrupt hunk")
+    hunk = bytearray(HUNK_BYTES)
+    for i in range(FRAMES_PER_HUNK):
+        hunk[i * FRAME_SIZE:i * FRAME_SIZE + SECTOR_SIZE] = sectors[i * SECTOR_SIZE:(i + 1) * SECTOR_SIZE]
+        hunk[i * FRAME_SIZE + SECTOR_SIZE:(i + 1) * FRAME_SIZE] = subcode[i * SUBCODE_SIZE:(i + 1) * SUBCODE_SIZE]
+    return bytes(hunk), start + base_length + len(rest) - len(sub.unused_data)
+
+def swap_audio(data):
+    """CHD stores CD audio big-endian; the same swap converts both ways."""
+    swapped = bytearray(len(data))
+    swapped[0::2], swapped[1::2] = data[1::2], data[0::2]
+    return swapped
+
+class BitWriter:
+    """MSB-first bit packer matching MAME's bitstream_out."""
+
+    def __init__(self):
+        self.value = 0
+        self.bits = 0
+
+    def write(self, value, numbits):
+        self.value = (self.value << numbits) | (value & ((1 << numbits) - 1))
+        self.bits += numbits
+
+    def getvalue(self):
+        pad = -self.bits % 8
+        return (self.value << pad).to_bytes((self.bits + pad) // 8, 'big')
+
+def compress_map(entries, first_offset):
+    """Encode the v5 hunk map: entries are (compression type, length, crc) in file order."""
+    bits = BitWriter()
+    # Huffman tree for the 16 type symbols: every symbol 4 bits long, so symbol n is coded as n
+    for _ in range(16):
+        bits.write(4, 4)
+    for comp, _, _ in entries:
+        bits.write(comp, 4)
+    max_length = max((length for comp, length, _ in entries if comp == COMPRESSION_TYPE_0), default=0)
+    length_bits = max_length.bit_length()
+    raw_map = bytearray()
+    offset = first_offset
+    for comp, length, crc in entries:
+        if comp == COMPRESSION_TYPE_0:
+            bits.write(length, length_bits)
+        bits.write(crc, 16)
+        raw_map += struct.pack(">B", comp) + length.to_bytes(3, 'big') + offset.to_bytes(6, 'big') + struct.pack(">H", crc)
+        offset += length
+    payload = bits.getvalue()
+    header = struct.pack(">I", len(payload)) + first_offset.to_bytes(6, 'big') + \
+        struct.pack(">HBBBx", binascii.crc_hqx(bytes(raw_map), 0xFFFF), length_bits, 0, 0)
+    return header + payload
+
+class ChdWriter:
+    """Stream rip sectors into a CD CHD, compressing hunks on every core while the drive reads."""
+
+    def __init__(self, chd_path, workers=None):
+        self.chd_path = chd_path
+        self.part_path = chd_path + PART_SUFFIX
+        self.workers = workers or os.cpu_count() or 1
+        self.out = None
+        self.pool = MP.Pool(self.workers)
+
+    def setup(self, tracks):
+        """Reset the stream state for tracks and return the track metadata that follows the header."""
+        self.tracks = tracks
+        self.track_frames = [t.end - t.start for t in tracks]
+        self.padded_frames = [frames + -frames % TRACK_PADDING for frames in self.track_frames]
+        self.audio = [t.mode == "AUDIO" for t in tracks]
+        self.track = 0
+        self.track_left = self.track_frames[0]
+        self.hunk = bytearray()
+        self.pending = deque()
+        self.entries = []
+        self.uncompressed = []  # Indices of the hunks stored as is, which a resume cannot tell apart otherwise
+        self.raw_sha1 = hashlib.sha1()
+        self.logical_bytes = 0
+        self.meta_hashes = []
+        metadata = bytearray()
+        offset = HEADER_SIZE
+        for i, track in enumerate(tracks):
+            text = CDROM_TRACK_METADATA2_FORMAT.format(track.number, TRACK_TYPES[track.mode], self.track_frames[i])
+            data = text.encode('ascii') + b"\0"
+            next_offset = offset + METADATA_HEADER.size + len(data) if i + 1 < len(tracks) else 0
+            metadata += METADATA_HEADER.pack(CDROM_TRACK_METADATA2_TAG, CHD_MDFLAGS_CHECKSUM,
+                                             len(data).to_bytes(3, 'big'), next_offset) + data
+            self.meta_hashes.append(CDROM_TRACK_METADATA2_TAG + hashlib.sha1(data).digest())
+            offset += METADATA_HEADER.size + len(data)
+        self.first_hunk_offset = offset
+        return bytes(metadata)
+
+    def begin(self, tracks):
+        """Write the header placeholder and track metadata."""
+        metadata = self.setup(tracks)
+        self.out = open(self.part_path, 'wb')
+        self.out.write(bytes(HEADER_SIZE) + metadata)
+
+    def stored_sectors(self, frames):
+        """Number of disc sectors in the first frames frames of the hunk stream."""
+        sectors = 0
+        for count, padded in zip(self.track_frames, self.padded_frames):
+            sectors += min(count, frames)
+            frames -= padded
+            if frames <= 0:
+                break
+        return sectors
+
+    def checkpoint(self):
+        """Store the hunks already compressed and sync them; return (sectors held, state for resume).
+
+        Only whole stored hunks count, so sectors still in the open hunk or waiting on a
+        worker are read from the disc again by a resumed rip.
+        """
+        while self.pending and self.pending[0][1].ready():
+            self.store_next()
+        self.out.flush()
+        os.fdatasync(self.out.fileno())
+        state = {"offset": self.out.tell(), "hunks": len(self.entries), "uncompressed": self.uncompressed}
+        return self.stored_sectors(len(self.entries) * FRAMES_PER_HUNK), state
+
+    def resume(self, tracks, state):
+        """Reopen the part file at a checkpoint and yield the sectors its hunks hold, for hashing.
+
+        Decompressing the stored hunks rebuilds the map entries and the raw SHA-1, so the
+        finished CHD is the same as one written in a single pass.
+        """
+        self.setup(tracks)
+        end = state["offset"]
+        uncompressed = set(state["uncompressed"])
+        self.out = open(self.part_path, 'r+b')
+        try:
+            if os.fstat(self.out.fileno()).st_size < end:
+                raise ValueError(f"{self.part_path} is shorter than its checkpoint")
+            self.out.seek(self.first_hunk_offset)
+            buffer = b""
+            pos = 0
+            track = 0
+            frame_in_track = 0
+            for index in range(state["hunks"]):
+                if len(buffer) - pos < HUNK_BYTES:
+                    buffer = buffer[pos:] + self.out.read(min(RESUME_READ_SIZE, end - self.out.tell()))
+                    pos = 0
+                if index in uncompressed:
+                    hunk, length, comp = buffer[pos:pos + HUNK_BYTES], HUNK_BYTES, COMPRESSION_NONE
+                    if len(hunk) < HUNK_BYTES:
+                        raise ValueError("Truncated hunk")
+                    self.uncompressed.append(index)
+                else:
+                    hunk, length = decompress_hunk(buffer[pos:pos + HUNK_BYTES])
+                    comp = COMPRESSION_TYPE_0
+                pos += length
+                self.entries.append((comp, length, binascii.crc_hqx(hunk, 0xFFFF)))
+                self.raw_sha1.update(hunk)
+                self.logical_bytes += HUNK_BYTES
+                sectors = bytearray()
+                for i in range(FRAMES_PER_HUNK):
+                    if frame_in_track < self.track_frames[track]:
+                        sector = hunk[i * FRAME_SIZE:i * FRAME_SIZE + SECTOR_SIZE]
+                        sectors += swap_audio(sector) if self.audio[track] else sector
+                    frame_in_track += 1
+                    if frame_in_track == self.padded_frames[track]:
+                        track += 1
+                        frame_in_track = 0
+                yield bytes(sectors)
+            if self.out.tell() - (len(buffer) - pos) != end:
+                raise ValueError("Hunks do not end at the checkpoint")
+            self.out.seek(end)
+            self.out.truncate()
+        except BaseException:
+            if self.out:
+                self.out.close()
+                self.out = None
+            raise
+        # Hunks hold 8 frames and tracks are padded to 4, so a hunk never ends inside padding
+        self.track = track
+        if track < len(tracks):
+            self.track_left = self.track_frames[track] - frame_in_track
+
+    def add_frames(self, frames):
+        self.hunk += frames
+        self.logical_bytes += len(frames)
+        while len(self.hunk) >= HUNK_BYTES:
+            hunk = bytes(self.hunk[:HUNK_BYTES])
+            del self.hunk[:HUNK_BYTES]
+            self.raw_sha1.update(hunk)
+            self.submit(hunk)
+
+    def write(self, data):
+        """Add raw 2352-byte sectors in disc order."""
+        view = memoryview(data)
+        while len(view) >= SECTOR_SIZE:
+            count = min(len(view) // SECTOR_SIZE, self.track_left)
+            chunk, view = view[:count * SECTOR_SIZE], view[count * SECTOR_SIZE:]
+            if self.audio[self.track]:
+                chunk = memoryview(swap_audio(chunk))
+            frames = bytearray(count * FRAME_SIZE)
+            for i in range(count):
+                frames[i * FRAME_SIZE:i * FRAME_SIZE + SECTOR_SIZE] = chunk[i * SECTOR_SIZE:(i + 1) * SECTOR_SIZE]
+            self.add_frames(frames)
+            self.track_left -= count
+            if self.track_left == 0:
+                self.end_track()
+
+    def end_track(self):
+        self.add_frames(bytes(-self.track_frames[self.track] % TRACK_PADDING * FRAME_SIZE))
+        self.track += 1
+        if self.track < len(self.tracks):
+            self.track_left = self.track_frames[self.track]
+
+    def submit(self, hunk):
+        self.pending.append((hunk, self.pool.apply_async(compress_hunk, (hunk,))))
+        # Bound memory; the caller only blocks when every core is already busy
+        while len(self.pending) > self.workers * MAX_PENDING_PER_WORKER:
+            self.store_next()
+
+    def store_next(self):
+        hunk, result = self.pending.popleft()
+        payload, crc = result.get()
+        if payload is None:
+            self.uncompressed.append(len(self.entries))
+            self.out.write(hunk)
+            self.entries.append((COMPRESSION_NONE, HUNK_BYTES, crc))
+        else:
+            self.out.write(payload)
+            self.entries.append((COMPRESSION_TYPE_0, len(payload), crc))
+
+    def finish(self):
+        """Flush the remaining hunks, write the map and header, and return the .chd path."""
+        if self.hunk:
+            # The final partial hunk is zero-filled, but only its logical bytes are hashed
+            partial = bytes(self.hunk)
+            self.hunk = bytearray()
+            self.raw_sha1.update(partial)
+            self.submit(partial.ljust(HUNK_BYTES, b"\0"))
+        while self.pending:
+            self.store_next()
+        self.pool.close()
+        self.pool.join()
+        self.pool = None
+        map_offset = self.out.tell()
+        self.out.write(compress_map(self.entries, self.first_hunk_offset))
+        raw_sha1 = self.raw_sha1.digest()
+        overall = hashlib.sha1(raw_sha1 + b"".join(sorted(self.meta_hashes))).digest()
+        header = CHD_MAGIC + struct.pack(">II", HEADER_SIZE, CHD_VERSION)
+        header += CODEC_CDZL + bytes(12)
+        header += struct.pack(">QQQII", self.logical_bytes, map_offset, HEADER_SIZE, HUNK_BYTES, FRAME_SIZE)
+        header += raw_sha1 + overall + bytes(20)
+        self.out.seek(0)
+        self.out.write(header)
+        self.out.close()
+        self.out = None
+        # Only a complete CHD ever appears under a name the library index picks up
+        os.replace(self.part_path, self.chd_path)
+        return self.chd_path
+
+    def abort(self, keep=False):
+        """Stop the workers and close the image; keep leaves the part file for a resumed rip."""
+        if self.pool:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        if self.out:
+            self.out.close()
+            self.out = None
+        if not keep:
+            try:
+                os.remove(self.part_path)
+            except OSError:
+                pass
@@ -0,0 +1,142 @@
+import os
+import sys
+import json
+import socket
+import threading
+
+# Line-oriented JSON over a Unix stream socket, one request per connection:
+#   request:  {"command": "status", "args": []}   (or just the words "status" / "rescan full")
+#   response: {"ok": true, "result": ...} or {"ok": false, "error": "..."}
+SOCKET_PATH = "/tmp/retrospin.sock"
+MAX_REQUEST_SIZE = 64 * 1024
+CLIENT_TIMEOUT = 10
+
+class ControlError(Exception):
+    pass
+
+def parse_request(line):
+    """Accept a JSON request or plain words; return (command, args)."""
+    line = line.strip()
+    if line.startswith("{"):
+        request = json.loads(line)
+        return request.get("command", ""), list(request.get("args", []))
+    words = line.split()
+    return (words[0], words[1:]) if words else ("", [])
+
+class ControlServer:
+    """Answer control requests on a Unix socket, each connection on its own thread.
+
+    A slow handler (a relaunch waiting on a prompt, say) then never holds up a status
+    request or another launcher checking whether this one is alive.
+    """
+
+    def __init__(self, socket_path=SOCKET_PATH):
+        self.socket_path = socket_path
+        self.handlers = {}
+        if os.path.exists(socket_path):
+            if is_running(socket_path):
+                raise ControlError(f"Another launcher is already serving {socket_path}")
+            os.unlink(socket_path)  # Left behind by a launcher that did not exit cleanly
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(socket_path)
+        os.chmod(socket_path, 0o660)
+        self.sock.listen(4)
+        self.thread = None
+        self.register("help", lambda: sorted(self.handlers))
+
+    def register(self, command, handler):
+        """Route command to handler(*args); its return value must be JSON serialisable."""
+        self.handlers[command] = handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, name="control-socket", daemon=True)
+        self.thread.start()
+
+    def serve_forever(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return  # Socket closed
+            threading.Thread(target=self.serve_client, args=(conn,), name="control-client", daemon=True).start()
+
+    def serve_client(self, conn):
+        with conn:
+            conn.settimeout(CLIENT_TIMEOUT)
+            try:
+                self.handle(conn)
+            except OSError as e:
+                print(f"Control client error: {e}")
+
+    def handle(self, conn):
+        data = b""
+        while b"\n" not in data and len(data) < MAX_REQUEST_SIZE:
+            chunk = conn.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+        if not data.strip():
+            return  # A liveness check (see is_running) connects and hangs up
+        try:
+            command, args = parse_request(data.decode('utf-8', errors='replace'))
+            handler = self.handlers.get(command)
+            if handler is None:
+                raise ControlError(f"Unknown command '{command}'. Try 'help'.")
+            response = {"ok": True, "result": handler(*args)}
+        except Exception as e:
+            response = {"ok": False, "error": str(e)}
+        conn.sendall(json.dumps(response, default=str).encode('utf-8') + b"\n")
+
+    def close(self):
+        self.sock.close()
+        try:
+            os.unlink(self.socket_path)
+        except OSError:
+            pass
+
+def send_command(command, *args, socket_path=SOCKET_PATH, timeout=CLIENT_TIMEOUT):
+    """Send one request to the running launcher and return its decoded response."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall(json.dumps({"command": command, "args": list(args)}).encode('utf-8') + b"\n")
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    return json.loads(data)
+
+def is_running(socket_path=SOCKET_PATH):
+    """Whether a launcher is listening on socket_path.
+
+    Only a refused connection marks the socket as stale. A launcher that accepts but is
+    slow to answer is still alive, and its socket must not be taken over.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(2)
+        try:
+            sock.connect(socket_path)
+        except socket.timeout:
+            return True  # Its listen backlog is full: alive, just busy
+        except OSError:
+            return False
+    return True
+
+def main():
+    if len(sys.argv) < 2:
+        print(f"Usage: {sys.argv[0]} <command> [args...]   (e.g. status, rescan, relaunch, rip, stats)")
+        sys.exit(2)
+    try:
+        response = send_command(sys.argv[1], *sys.argv[2:])
+    except OSError as e:
+        print(f"RetroSpin launcher is not running ({e})")
+        sys.exit(1)
+    if not response.get("ok"):
+        print(f"Error: {response.get('error')}")
+        sys.exit(1)
+    print(json.dumps(response["result"], indent=2))
+
+if __name__ == "__main__":
+    main()
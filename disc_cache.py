@@ -0,0 +1,85 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+import cdrom
+
+CACHE_VERSION = 1
+DEFAULT_CAPACITY = 256
+
+def disc_fingerprint(drive_path, probe_data):
+    """Hash the TOC (or image size when there is no TOC) together with the probe sectors."""
+    h = hashlib.sha1()
+    toc = cdrom.read_toc(drive_path)
+    if toc:
+        for track, is_data, lba in toc:
+            h.update(f"{track}:{int(is_data)}:{lba};".encode('ascii'))
+    else:
+        with open(drive_path, 'rb') as f:
+            h.update(f"size:{f.seek(0, os.SEEK_END)};".encode('ascii'))
+    h.update(probe_data)
+    return h.hexdigest()
+
+class DiscCache:
+    """Persistent LRU of fingerprint -> resolved launch details for discs seen before."""
+
+    def __init__(self, cache_path, capacity=DEFAULT_CAPACITY):
+        self.cache_path = cache_path
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.lock = threading.RLock()  # Drives are probed from several threads
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == CACHE_VERSION:
+                self.entries = OrderedDict(data["entries"])
+        except (OSError, ValueError, KeyError):
+            self.entries = OrderedDict()
+
+    def save(self):
+        tmp_path = self.cache_path + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": CACHE_VERSION, "entries": list(self.entries.items())}, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"Failed to save disc cache to {self.cache_path}: {e}")
+
+    def get(self, fingerprint):
+        """Return the cached entry, dropping it if its game file has since disappeared."""
+        with self.lock:
+            entry = self.entries.get(fingerprint)
+            if entry is None:
+                return None
+            if not os.path.exists(entry["game_file"]):
+                self.invalidate(fingerprint)
+                return None
+            self.entries.move_to_end(fingerprint)
+            return entry
+
+    def put(self, fingerprint, system, game_id, title, game_file, mgl):
+        with self.lock:
+            self.entries[fingerprint] = {
+                "system": system,
+                "game_id": game_id,
+                "title": title,
+                "game_file": game_file,
+                "mgl": mgl,
+            }
+            self.entries.move_to_end(fingerprint)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+            self.save()
+
+    def invalidate(self, fingerprint):
+        with self.lock:
+            if self.entries.pop(fingerprint, None) is not None:
+                self.save()
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,131 @@
+import re
+from collections import namedtuple
+
+import game_ids
+import iso9660
+
+SECTOR_SIZE = iso9660.SECTOR_SIZE
+PROBE_SECTORS = 17  # Sectors 0-16: system area headers plus the ISO9660 PVD in one contiguous read
+SYSTEM_CNF = "SYSTEM.CNF"
+SYSTEM_CNF_MAX_SIZE = 4096
+
+# (system, sector, offset, signature) checked in order against the probe read.
+# PC Engine CD keeps its "PC Engine CD-ROM SYSTEM" header in the second track, which
+# the block device does not expose at LBA 0, so it needs a TOC-aware probe before it can be added.
+SIGNATURES = [
+    ("SATURN", 0, 0x00, b"SEGA SEGASATURN "),
+    ("SEGACD", 0, 0x00, b"SEGADISCSYSTEM  "),
+    ("PSX", 16, 0x08, b"PLAYSTATION"),
+]
+
+ID_EXTRACTORS = {}
+
+# Saturn IP.BIN system ID fields in sector 0: (field, start, end)
+IP_BIN_FIELDS = [
+    ("maker", 0x10, 0x20),
+    ("product", 0x20, 0x2A),
+    ("version", 0x2A, 0x30),
+    ("release_date", 0x30, 0x38),
+    ("device_info", 0x38, 0x40),
+    ("areas", 0x40, 0x50),
+    ("peripherals", 0x50, 0x60),
+    ("title", 0x60, 0xD0),
+]
+DEVICE_INFO_PATTERN = re.compile(r"CD-(\d+)/(\d+)")
+SaturnHeader = namedtuple("SaturnHeader", [name for name, _, _ in IP_BIN_FIELDS] + ["disc", "discs"])
+
+class SectorCache:
+    """Serve sectors from memory so each one is read from the disc at most once per identification."""
+
+    def __init__(self, reader):
+        self.reader = reader
+        self.sectors = {}
+
+    def prefetch(self, lba, count):
+        data = self.reader.read(lba, count)
+        for i in range(count):
+            self.sectors[lba + i] = data[i * SECTOR_SIZE:(i + 1) * SECTOR_SIZE]
+
+    def read(self, lba, count=1):
+        """Same interface as iso9660.SectorReader.read, filling gaps with one read per run."""
+        missing = [n for n in range(lba, lba + count) if n not in self.sectors]
+        if missing:
+            self.prefetch(missing[0], missing[-1] - missing[0] + 1)
+        return b"".join(self.sectors[n] for n in range(lba, lba + count))
+
+def register_extractor(system):
+    """Decorator registering a function(cache) -> game_id for a system."""
+    def decorator(func):
+        ID_EXTRACTORS[system] = func
+        return func
+    return decorator
+
+def classify(cache):
+    """Return the system whose signature matches the probe sectors, or None."""
+    for system, lba, offset, signature in SIGNATURES:
+        sector = cache.read(lba)
+        if sector[offset:offset + len(signature)] == signature:
+            return system
+    return None
+
+def parse_system_cnf(file_text):
+    """Extract the normalised game ID from the BOOT line of a SYSTEM.CNF."""
+    for line in file_text.splitlines():
+        if "BOOT" in line.upper() and "=" in line:
+            boot_path = line.split("=", 1)[1].strip()
+            raw_id = boot_path.split(":", 1)[-1].lstrip("\\").split("\\")[-1].split(";")[0]
+            return game_ids.normalize(raw_id)
+    return None
+
+@register_extractor("PSX")
+def extract_psx_game_id(cache):
+    """Read the game ID from SYSTEM.CNF, reusing the cached PVD."""
+    file_data = iso9660.ISO9660(cache).read_file(SYSTEM_CNF, max_size=SYSTEM_CNF_MAX_SIZE)
+    if file_data is None:
+        print("SYSTEM.CNF not found on disc.")
+        return None
+    return parse_system_cnf(file_data.decode('latin-1', errors='ignore'))
+
+def parse_ip_bin(sector):
+    """Decode the Saturn IP.BIN header in sector 0 into a SaturnHeader.
+
+    device_info reads "CD-1/2" for the first of two discs; disc and discs are None if it does not.
+    """
+    fields = [sector[start:end].decode('ascii', errors='ignore').strip("\0 ") for _, start, end in IP_BIN_FIELDS]
+    header = dict(zip((name for name, _, _ in IP_BIN_FIELDS), fields))
+    match = DEVICE_INFO_PATTERN.search(header["device_info"])
+    disc, discs = (int(match.group(1)), int(match.group(2))) if match else (None, None)
+    return SaturnHeader(disc=disc, discs=discs, **header)
+
+@register_extractor("SATURN")
+def extract_saturn_game_id(cache):
+    """Read the product number from the IP.BIN header."""
+    return game_ids.normalize(parse_ip_bin(cache.read(0)).product) or None
+
+def title_hints(cache, system):
+    """Return (version, disc number) narrowing the title lookup, or ("", None) if the disc has none."""
+    if system != "SATURN":
+        return "", None
+    header = parse_ip_bin(cache.read(0))
+    # Single-disc games are indexed without a disc number
+    return header.version, header.disc if header.discs and header.discs > 1 else None
+
+def probe(reader):
+    """Read the probe sectors once and return the cache shared by classification and extraction."""
+    cache = SectorCache(reader)
+    cache.prefetch(0, PROBE_SECTORS)
+    return cache
+
+def identify(cache):
+    """Classify a probed disc and return (system, game_id)."""
+    system = classify(cache)
+    if system is None:
+        print("Disc does not match any known system signature.")
+        return None, None
+    extractor = ID_EXTRACTORS.get(system)
+    if extractor is None:
+        print(f"Detected {system} disc, but it is not supported yet.")
+        return system, None
+    game_id = extractor(cache)
+    print(f"Extracted {system} Game ID: {game_id}")
+    return system, game_id
@@ -0,0 +1,80 @@
+import os
+import re
+import sys
+
+import library_index
+import title_index
+
+# Multi-disc games appear in the title database as one row per disc, e.g.
+#   "Final Fantasy VII (USA) (Disc 2)". Discs belong to the same set when their titles
+# match once the disc tag is removed, so regional releases stay separate sets.
+DISC_PATTERN = re.compile(r"\s*[\(\[]\s*(?:disc|disk|cd)\s*(\d+)(?:\s*of\s*\d+)?\s*[\)\]]", re.IGNORECASE)
+
+def disc_number(title):
+    """Return the disc number in title, or None for a single-disc game."""
+    match = DISC_PATTERN.search(title)
+    return int(match.group(1)) if match else None
+
+def set_key(title, system):
+    """Return the key shared by every disc of title's set, or None for a single-disc game."""
+    if disc_number(title) is None:
+        return None
+    return system, library_index.normalize_title(DISC_PATTERN.sub("", title))
+
+def same_set(title, other_title, system):
+    """True if the two titles are different discs of the same game."""
+    key = set_key(title, system)
+    return key is not None and key == set_key(other_title, system) and disc_number(title) != disc_number(other_title)
+
+def set_name(title):
+    """The title without its disc tag, used to name the set's playlist."""
+    return DISC_PATTERN.sub("", title).strip()
+
+class DiscSetIndex:
+    """Every multi-disc set in the title database, with its discs in order."""
+
+    def __init__(self, rows):
+        self.sets = {}  # {set key: {disc number: title}}
+        for game_id, system, title, _, disc in rows:
+            key = set_key(title, system)
+            if key:
+                # The first ID seen for a disc wins; alternate IDs of the same disc share its title
+                self.sets.setdefault(key, {}).setdefault(disc, title)
+
+    @classmethod
+    def from_csv(cls, csv_path):
+        return cls(title_index.read_csv_titles(csv_path))
+
+    def discs(self, title, system):
+        """Return the titles of every disc in title's set in disc order, or [] for a single disc."""
+        discs = self.sets.get(set_key(title, system), {})
+        if len(discs) < 2:
+            return []  # Only one disc of the set is known
+        return [disc_title for _, disc_title in sorted(discs.items())]
+
+    def __len__(self):
+        return sum(1 for discs in self.sets.values() if len(discs) > 1)
+
+def write_playlist(playlist_path, disc_files):
+    """Write an .m3u listing disc_files relative to the playlist; skip the write if unchanged."""
+    base_dir = os.path.dirname(playlist_path)
+    lines = "".join(os.path.relpath(path, base_dir) + "\n" for path in disc_files)
+    try:
+        with open(playlist_path, 'r', encoding='utf-8') as f:
+            if f.read() == lines:
+                return False
+    except OSError:
+        pass
+    with open(playlist_path, 'w', encoding='utf-8') as f:
+        f.write(lines)
+    return True
+
+def main():
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else title_index.CSV_PATH
+    index = DiscSetIndex.from_csv(csv_path)
+    print(f"{len(index)} multi-disc sets in {csv_path}")
+    for (system, _), discs in [item for item in sorted(index.sets.items()) if len(item[1]) > 1][:20]:
+        print(f"  {system}: {set_name(discs[min(discs)])} ({len(discs)} discs)")
+
+if __name__ == "__main__":
+    main()
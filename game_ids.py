@@ -0,0 +1,61 @@
+import re
+import sys
+
+# One spelling per game ID. SYSTEM.CNF boots "SLUS_009.75", the databases list
+# "SLUS-00975", Redump serials read "SLUS 00975" and some Saturn rows drop the hyphen
+# ("GS9025"). Everything that stores or looks up an ID goes through normalize(), so the
+# title index built from the databases and the ID read off a disc always agree.
+SEPARATOR_PATTERN = re.compile(r"[\s_\-]+")
+PREFIX_PATTERN = re.compile(r"^([A-Z]+)-?(\d)")
+BOOT_FILE_PATTERN = re.compile(r"^([A-Z]{4})-(\d{3})(\d{2})$")  # PSX IDs, booted as SLUS_009.75
+
+def normalize(game_id):
+    """Return the canonical form of a game ID: "slus_009.75", "SLUS 00975" and "SLUS00975" all give "SLUS-00975"."""
+    canonical = SEPARATOR_PATTERN.sub("-", game_id.strip().upper().replace(".", "")).strip("-")
+    return PREFIX_PATTERN.sub(r"\1-\2", canonical, count=1)
+
+def aliases(game_id):
+    """Return the spellings of game_id seen in the wild, canonical form first."""
+    canonical = normalize(game_id)
+    forms = [canonical]
+    if PREFIX_PATTERN.match(canonical):
+        prefix, number = canonical.split("-", 1)
+        forms += [f"{prefix}_{number}", f"{prefix} {number}", prefix + number]
+    boot = BOOT_FILE_PATTERN.match(canonical)
+    if boot:
+        prefix, head, tail = boot.groups()
+        forms += [f"{prefix}_{head}.{tail}", f"{prefix}-{head}.{tail}"]
+    return list(dict.fromkeys(forms))
+
+class AliasTable:
+    """Every spelling of a set of known IDs, mapped to the ID as stored, for one-lookup joins."""
+
+    def __init__(self, game_ids=()):
+        self.table = {}  # alias -> stored game ID
+        for game_id in game_ids:
+            self.add(game_id)
+
+    def add(self, game_id):
+        # The first stored ID claims an alias; later spellings of the same game share it
+        for alias in [game_id] + aliases(game_id):
+            self.table.setdefault(alias, game_id)
+
+    def resolve(self, game_id):
+        """Return the stored ID that game_id spells, or None."""
+        found = self.table.get(game_id)
+        if found is None:
+            found = self.table.get(normalize(game_id))
+        return found
+
+    def __contains__(self, game_id):
+        return self.resolve(game_id) is not None
+
+    def __len__(self):
+        return len(self.table)
+
+def main():
+    for game_id in sys.argv[1:]:
+        print(f"{game_id} -> {normalize(game_id)}  ({', '.join(aliases(game_id))})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import os
+import re
+import csv
+import sqlite3
+
+import disc_sets
+import game_ids
+
+# games.db is the single store every scraper and importer writes to; games.csv and
+# games.idx are generated from it by build_games.py. Rows are unique per (ID, system,
+# version, disc): the discs of a Saturn set often share one product number and version.
+# disc is the number in the title's disc tag, or 0 for a single-disc game.
+DB_PATH = "games.db"
+CSV_HEADER = ["game_id", "title", "region", "system", "language", "updated_from_redump", "version", "disc"]
+DB_SYSTEMS = {"PSX": "PS1"}  # games.csv/launcher system name -> games.db system name
+CSV_SYSTEMS = {db: csv_name for csv_name, db in DB_SYSTEMS.items()}
+VERSION_PATTERN = re.compile(r'^(.+?)\s*(V\d+\.\d+)$')
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS games (
+        game_id TEXT NOT NULL,
+        title TEXT,
+        region TEXT,
+        system TEXT NOT NULL,
+        language TEXT,
+        updated_from_redump INTEGER DEFAULT 0,
+        version TEXT NOT NULL DEFAULT '',
+        disc INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (game_id, system, version, disc)
+    )
+"""
+
+def split_version(game_id):
+    """Split a trailing Saturn version off an ID: "T-8113H-50V1.000" -> ("T-8113H-50", "V1.000")."""
+    match = VERSION_PATTERN.match(game_id.strip())
+    return (match.group(1), match.group(2)) if match else (game_id.strip(), "")
+
+def title_disc(title):
+    """Disc number for the disc column: the title's disc tag, or 0."""
+    return disc_sets.disc_number(title or "") or 0
+
+def ensure_schema(conn):
+    """Create the games table, migrating older tables to the current key; return True if it was created or migrated."""
+    columns = [col[1] for col in conn.execute("PRAGMA table_info(games)")]
+    if "disc" in columns:
+        return False
+    if columns:
+        if "updated_from_redump" not in columns:
+            conn.execute("ALTER TABLE games ADD COLUMN updated_from_redump INTEGER DEFAULT 0")
+        if "version" not in columns:
+            conn.execute("ALTER TABLE games ADD COLUMN version TEXT NOT NULL DEFAULT ''")
+        conn.execute("ALTER TABLE games RENAME TO games_old")
+        conn.execute(SCHEMA)
+        # Rows without an ID can never be looked up, so they are dropped here
+        conn.create_function("title_disc", 1, title_disc)
+        conn.execute("""
+            INSERT OR IGNORE INTO games (game_id, title, region, system, language, updated_from_redump, version, disc)
+            SELECT game_id, title, region, system, language, updated_from_redump, version, title_disc(title)
+            FROM games_old WHERE game_id IS NOT NULL
+        """)
+        conn.execute("DROP TABLE games_old")
+    else:
+        conn.execute(SCHEMA)
+    conn.commit()
+    return True
+
+def connect(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    ensure_schema(conn)
+    return conn
+
+def upsert_games(conn, rows):
+    """Insert or refresh (game_id, title, region, system, language, version) rows.
+
+    Each row is keyed by the disc number in its title as well. Titles already replaced by
+    Redump names are kept; everything else takes the newest scrape.
+    """
+    conn.executemany("""
+        INSERT INTO games (game_id, title, region, system, language, updated_from_redump, version, disc)
+        VALUES (?, ?, ?, ?, ?, 0, ?, ?)
+        ON CONFLICT (game_id, system, version, disc) DO UPDATE SET
+            title = CASE WHEN games.updated_from_redump THEN games.title ELSE excluded.title END,
+            region = excluded.region,
+            language = COALESCE(NULLIF(excluded.language, ''), games.language)
+    """, [tuple(row) + (title_disc(row[1]),) for row in rows])
+    conn.commit()
+
+def import_csv(conn, csv_path):
+    """Seed the store from an existing games.csv without overwriting rows already present."""
+    rows = []
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader)  # Skip header
+        for row in reader:
+            if len(row) < 4 or not row[0].strip():
+                continue
+            game_id, version = split_version(row[0])
+            game_id = game_ids.normalize(game_id)  # The scrapers store canonical IDs too, so a re-scrape updates this row
+            if len(row) > 6 and row[6]:
+                version = row[6]
+            language = row[4] if len(row) > 4 else ""
+            updated = int(row[5]) if len(row) > 5 and row[5].isdigit() else 0
+            disc = int(row[7]) if len(row) > 7 and row[7].isdigit() else title_disc(row[1])
+            rows.append((game_id, row[1], row[2], DB_SYSTEMS.get(row[3], row[3]), language, updated, version, disc))
+    conn.executemany("""
+        INSERT OR IGNORE INTO games (game_id, title, region, system, language, updated_from_redump, version, disc)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    conn.commit()
+    return len(rows)
+
+def export_csv(conn, csv_path):
+    """Write every game to games.csv, sorted, with launcher system names; return the row count."""
+    tmp_path = csv_path + ".tmp"
+    count = 0
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        for game_id, title, region, system, language, updated, version, disc in conn.execute("""
+                SELECT game_id, title, region, system, language, updated_from_redump, version, disc
+                FROM games ORDER BY system, game_id, version, disc"""):
+            writer.writerow([game_id, title, region, CSV_SYSTEMS.get(system, system), language or "", updated or 0, version,
+                             disc or ""])
+            count += 1
+    os.replace(tmp_path, csv_path)
+    return count
@@ -0,0 +1,118 @@
+import os
+import re
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+CACHE_DIR = "scrape_cache"
+MAX_WORKERS = 4
+TIMEOUT = 10
+
+class CacheMiss(Exception):
+    pass
+
+def cache_name(url):
+    """Readable file name for a URL, e.g. psxdatacenter.com_ulist.html, so fixtures can be saved by hand."""
+    name = re.sub(r'^https?://', '', url).rstrip("/")
+    name = re.sub(r'[^A-Za-z0-9.-]+', '_', name)
+    return name if name.endswith((".html", ".htm")) else name + ".html"
+
+class CachedFetcher:
+    """Fetch pages over a pooled session with conditional requests, keeping every response on disk.
+
+    In replay mode nothing touches the network: pages are served from the cache directory,
+    which is how the parsers are benchmarked against saved HTML fixtures.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, headers=None, replay=False, workers=MAX_WORKERS):
+        self.cache_dir = cache_dir
+        self.replay = replay
+        self.workers = workers
+        self.headers = headers or {}
+        self.session = None
+        self.lock = threading.Lock()
+        self.stats = {"fetched": 0, "not_modified": 0, "replayed": 0}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get_session(self):
+        # requests is only needed when going to the network
+        import requests
+        from requests.adapters import HTTPAdapter
+        if self.session is None:
+            self.session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers)
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+            self.session.headers.update(self.headers)
+        return self.session
+
+    def paths(self, url):
+        body_path = os.path.join(self.cache_dir, cache_name(url))
+        return body_path, body_path + ".json"
+
+    def read_cached(self, url):
+        body_path, meta_path = self.paths(url)
+        try:
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except OSError:
+            return None, {}
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {}
+        return body, meta
+
+    def write_cached(self, url, body, meta):
+        body_path, meta_path = self.paths(url)
+        for path, data, mode in ((body_path, body, 'wb'), (meta_path, json.dumps(meta), 'w')):
+            with open(path + ".tmp", mode) as f:
+                f.write(data)
+            os.replace(path + ".tmp", path)
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def fetch(self, url):
+        """Return the page body, revalidating any cached copy with ETag / If-Modified-Since."""
+        body, meta = self.read_cached(url)
+        if self.replay:
+            if body is None:
+                raise CacheMiss(f"No saved copy of {url} in {self.cache_dir}")
+            self.count("replayed")
+            return body
+        headers = {}
+        if body is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        response = self.get_session().get(url, headers=headers, timeout=TIMEOUT)
+        if response.status_code == 304 and body is not None:
+            self.count("not_modified")
+            return body
+        response.raise_for_status()
+        self.write_cached(url, response.content, {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        })
+        self.count("fetched")
+        return response.content
+
+    def fetch_all(self, urls):
+        """Fetch several pages concurrently; returns {url: body or the exception raised}."""
+        def fetch_one(url):
+            try:
+                return self.fetch(url)
+            except Exception as e:
+                return e
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(urls)))) as pool:
+            return dict(zip(urls, pool.map(fetch_one, urls)))
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
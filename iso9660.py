@@ -0,0 +1,124 @@
+SECTOR_SIZE = 2048
+RAW_SECTOR_SIZE = 2352
+SYNC_PATTERN = b"\x00" + b"\xff" * 10 + b"\x00"
+PVD_SECTOR = 16
+MAX_DESCRIPTORS = 16  # Volume descriptor set terminator is normally within a few sectors
+
+class ISO9660Error(Exception):
+    pass
+
+class SectorReader:
+    """Read 2048-byte user data sectors from a block device, .iso or raw 2352-byte .bin image."""
+
+    def __init__(self, path):
+        self.path = path
+        self.f = open(path, 'rb', buffering=0)
+        self.sector_size = SECTOR_SIZE
+        self.data_offset = 0
+        header = self.f.read(16)
+        if header[:12] == SYNC_PATTERN:
+            # Raw image: Mode 1 user data follows the 16-byte header, Mode 2 Form 1 adds an 8-byte subheader
+            self.sector_size = RAW_SECTOR_SIZE
+            self.data_offset = 24 if header[15] == 2 else 16
+
+    def read(self, lba, count=1):
+        """Return the user data of count sectors starting at lba."""
+        if self.sector_size == SECTOR_SIZE:
+            self.f.seek(lba * SECTOR_SIZE)
+            data = self.f.read(count * SECTOR_SIZE)
+        else:
+            self.f.seek(lba * RAW_SECTOR_SIZE)
+            raw = self.f.read(count * RAW_SECTOR_SIZE)
+            data = b"".join(raw[i + self.data_offset:i + self.data_offset + SECTOR_SIZE]
+                            for i in range(0, len(raw), RAW_SECTOR_SIZE))
+        if len(data) < count * SECTOR_SIZE:
+            raise ISO9660Error(f"Short read at sector {lba} of {self.path}")
+        return data
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def parse_directory_record(data, offset):
+    """Return (record length, name, extent lba, data length, is_dir) for the record at offset."""
+    length = data[offset]
+    if length == 0:
+        return 0, None, 0, 0, False
+    extent = int.from_bytes(data[offset + 2:offset + 6], 'little')
+    size = int.from_bytes(data[offset + 10:offset + 14], 'little')
+    is_dir = bool(data[offset + 25] & 0x02)
+    name_len = data[offset + 32]
+    name = data[offset + 33:offset + 33 + name_len].decode('latin-1', errors='ignore')
+    return length, name, extent, size, is_dir
+
+class ISO9660:
+    """Minimal ISO9660 reader that resolves paths without mounting the disc."""
+
+    def __init__(self, reader):
+        self.reader = reader
+        self.root = self.read_primary_volume_descriptor()
+
+    def read_primary_volume_descriptor(self):
+        """Locate the PVD and return the (lba, size) of the root directory."""
+        for lba in range(PVD_SECTOR, PVD_SECTOR + MAX_DESCRIPTORS):
+            sector = self.reader.read(lba)
+            if sector[1:6] != b"CD001":
+                break
+            if sector[0] == 1:
+                _, _, extent, size, _ = parse_directory_record(sector, 156)
+                return extent, size
+            if sector[0] == 255:
+                break
+        raise ISO9660Error("No ISO9660 primary volume descriptor found")
+
+    def list_directory(self, extent, size):
+        """Yield (name, extent, size, is_dir) for each entry, skipping '.' and '..'."""
+        sectors = (size + SECTOR_SIZE - 1) // SECTOR_SIZE
+        data = self.reader.read(extent, sectors)
+        for base in range(0, sectors * SECTOR_SIZE, SECTOR_SIZE):
+            offset = base
+            # Records never cross a sector boundary; a zero length pads to the next sector
+            while offset < base + SECTOR_SIZE:
+                length, name, entry_extent, entry_size, is_dir = parse_directory_record(data, offset)
+                if length == 0:
+                    break
+                if name not in ("\x00", "\x01"):
+                    yield name.split(";")[0], entry_extent, entry_size, is_dir
+                offset += length
+
+    def find(self, path):
+        """Return (extent, size) of path, matching names case-insensitively, or None."""
+        extent, size = self.root
+        parts = [p for p in path.replace("\\", "/").split("/") if p]
+        for i, part in enumerate(parts):
+            wanted = part.upper()
+            for name, entry_extent, entry_size, is_dir in self.list_directory(extent, size):
+                if name.upper() == wanted and (is_dir or i == len(parts) - 1):
+                    extent, size = entry_extent, entry_size
+                    break
+            else:
+                return None
+        return extent, size
+
+    def read_file(self, path, max_size=None):
+        """Read a file's contents, or return None if it does not exist."""
+        entry = self.find(path)
+        if entry is None:
+            return None
+        extent, size = entry
+        if max_size is not None:
+            size = min(size, max_size)
+        if size == 0:
+            return b""
+        sectors = (size + SECTOR_SIZE - 1) // SECTOR_SIZE
+        return self.reader.read(extent, sectors)[:size]
+
+def read_file(image_path, path, max_size=None):
+    """Read a single file from a disc or image at image_path."""
+    with SectorReader(image_path) as reader:
+        return ISO9660(reader).read_file(path, max_size)
@@ -0,0 +1,128 @@
+import sys
+import json
+import math
+import time
+from contextlib import contextmanager
+
+# One JSON object per disc insertion, appended to the timing log:
+#   {"time": wall clock, "drive": path, "outcome": "launched", "total_ms": 41.2,
+#    "stages": {"probe": 12.0, "fingerprint": 1.3, ...}}
+# Stage durations come from the monotonic clock, so they are unaffected by clock changes.
+TIMING_LOG_PATH = "launch_timing.jsonl"
+
+class LaunchTimer:
+    """Collect per-stage durations for a single disc insertion."""
+
+    def __init__(self, drive_path):
+        self.drive_path = drive_path
+        self.started = time.monotonic()
+        self.wall_time = time.time()
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            # A stage entered more than once (e.g. a retried lookup) accumulates
+            self.stages[name] = self.stages.get(name, 0.0) + (time.monotonic() - start) * 1000
+
+    def record(self, outcome):
+        return {
+            "time": round(self.wall_time, 3),
+            "drive": self.drive_path,
+            "outcome": outcome,
+            "total_ms": round((time.monotonic() - self.started) * 1000, 3),
+            "stages": {name: round(ms, 3) for name, ms in self.stages.items()},
+        }
+
+class NullTimer:
+    """Stand-in used when no timer is passed, so callers can always write `with timer.stage(...)`."""
+
+    @contextmanager
+    def stage(self, name):
+        yield
+
+NULL_TIMER = NullTimer()
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sorted list."""
+    return values[max(0, math.ceil(pct / 100 * len(values)) - 1)]
+
+def summarize(records):
+    """Return {stage: {"count", "p50", "p95", "max"}} over records, with "total" for whole launches."""
+    samples = {}
+    for record in records:
+        samples.setdefault("total", []).append(record["total_ms"])
+        for name, ms in record["stages"].items():
+            samples.setdefault(name, []).append(ms)
+    summary = {}
+    for name, values in samples.items():
+        values.sort()
+        summary[name] = {
+            "count": len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "max": values[-1],
+        }
+    return summary
+
+def format_summary(summary):
+    lines = [f"{'stage':<16}{'count':>7}{'p50 ms':>11}{'p95 ms':>11}{'max ms':>11}"]
+    # Slowest stages first, with the whole-launch total at the bottom
+    for name in sorted((n for n in summary if n != "total"), key=lambda n: -summary[n]["p95"]) + ["total"]:
+        if name in summary:
+            s = summary[name]
+            lines.append(f"{name:<16}{s['count']:>7}{s['p50']:>11.1f}{s['p95']:>11.1f}{s['max']:>11.1f}")
+    return "\n".join(lines)
+
+class TimingLog:
+    """Append launch records as JSON lines and keep this session's records for a summary."""
+
+    def __init__(self, log_path=TIMING_LOG_PATH):
+        self.log_path = log_path
+        self.records = []
+
+    def start(self, drive_path):
+        return LaunchTimer(drive_path)
+
+    def finish(self, timer, outcome):
+        record = timer.record(outcome)
+        self.records.append(record)
+        try:
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print(f"Failed to write launch timing to {self.log_path}: {e}")
+        stages = ", ".join(f"{name} {ms:.1f}" for name, ms in record["stages"].items())
+        print(f"Launch timing ({outcome}): {record['total_ms']:.1f} ms [{stages}]")
+        return record
+
+    def summary(self):
+        return format_summary(summarize(self.records)) if self.records else "No launches timed."
+
+def read_log(log_path):
+    records = []
+    with open(log_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue  # Tolerate a line truncated by power loss
+    return records
+
+def main():
+    log_path = sys.argv[1] if len(sys.argv) > 1 else TIMING_LOG_PATH
+    records = read_log(log_path)
+    outcome = sys.argv[2] if len(sys.argv) > 2 else None
+    if outcome:
+        records = [r for r in records if r["outcome"] == outcome]
+    if not records:
+        print(f"No launch records in {log_path}")
+        return
+    print(f"{len(records)} launches from {log_path}")
+    print(format_summary(summarize(records)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import os
+import re
+import json
+import threading
+
+INDEX_VERSION = 1
+GAME_EXTENSIONS = (".chd", ".cue")  # In order of preference
+
+NON_ALNUM_PATTERN = re.compile(r"[^0-9a-z]+")
+
+def normalize_title(title):
+    """Fold case, punctuation and spacing so near-identical file names compare equal."""
+    return NON_ALNUM_PATTERN.sub(" ", title.lower()).strip()
+
+TAG_PATTERN = re.compile(r"\s*[\(\[]([^\)\]]*)[\)\]]")
+DISC_TAG_PATTERN = re.compile(r"^(?:disc|disk|cd) \d+(?: of \d+)?$")  # A normalised "(Disc 2)" tag
+
+def split_tags(title):
+    """Split a title into its normalised base and the set of its (tags) and [tags]."""
+    tags = {normalize_title(tag) for tag in TAG_PATTERN.findall(title)}
+    tags.discard("")
+    return normalize_title(TAG_PATTERN.sub("", title)), frozenset(tags)
+
+class LibraryIndex:
+    """Persistent title -> game file index over the game folders, refreshed by directory mtimes.
+
+    Probe threads, rip completions and control requests all use one index, so scans and
+    lookups hold its lock.
+    """
+
+    def __init__(self, roots, index_path):
+        self.roots = roots  # {system: [base paths in order of preference]}
+        self.index_path = index_path
+        self.dirs = {}      # {dir path: {"mtime": ns, "files": [...], "subdirs": [...]}}
+        self.titles = {}
+        self.files = []         # [(system, rank, stem, game file)] behind the titles table
+        self.base_titles = None  # Built from files on the first lookup that needs it
+        self.dirty = False
+        self.lock = threading.RLock()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION and data.get("roots") == self.roots:
+                self.dirs = data["dirs"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Game library index not loaded ({e}). A full scan will be done.")
+        self.rebuild_lookup()
+
+    def save(self):
+        if not self.dirty:
+            return
+        tmp_path = self.index_path + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": INDEX_VERSION, "roots": self.roots, "dirs": self.dirs}, f)
+            os.replace(tmp_path, self.index_path)
+            self.dirty = False
+        except OSError as e:
+            print(f"Failed to save game library index to {self.index_path}: {e}")
+
+    def scan_dir(self, path):
+        """List one directory and recurse into subdirectories that are new or changed."""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            self.forget_dir(path)
+            return
+        entry = self.dirs.get(path)
+        if entry is None or entry["mtime"] != mtime:
+            files, subdirs = [], []
+            try:
+                with os.scandir(path) as it:
+                    for item in it:
+                        if item.is_dir():
+                            subdirs.append(item.path)
+                        elif item.name.lower().endswith(GAME_EXTENSIONS):
+                            files.append(item.name)
+            except OSError as e:
+                print(f"Error scanning {path}: {e}")
+            for old_subdir in (entry or {}).get("subdirs", []):
+                if old_subdir not in subdirs:
+                    self.forget_dir(old_subdir)
+            entry = {"mtime": mtime, "files": files, "subdirs": subdirs}
+            self.dirs[path] = entry
+            self.dirty = True
+        # A directory's mtime only covers its own entries, so subdirectories are always checked
+        for subdir in entry["subdirs"]:
+            self.scan_dir(subdir)
+
+    def forget_dir(self, path):
+        entry = self.dirs.pop(path, None)
+        if entry is not None:
+            self.dirty = True
+            for subdir in entry["subdirs"]:
+                self.forget_dir(subdir)
+
+    def refresh(self):
+        """Bring the index up to date, re-listing only directories whose mtime changed."""
+        with self.lock:
+            for paths in self.roots.values():
+                for root in paths:
+                    self.scan_dir(os.path.normpath(root))
+            if self.dirty:
+                self.rebuild_lookup()
+                self.save()
+
+    def rescan(self):
+        """Discard every cached listing and scan all folders again."""
+        with self.lock:
+            self.dirs = {}
+            self.dirty = True
+            self.refresh()
+
+    def rebuild_lookup(self):
+        titles = {}
+        files = []
+        for system, paths in self.roots.items():
+            for root_rank, root in enumerate(paths):
+                root = os.path.normpath(root)
+                for dir_path, entry in self.dirs.items():
+                    if dir_path != root and not dir_path.startswith(root + os.sep):
+                        continue
+                    for name in entry["files"]:
+                        stem, ext = os.path.splitext(name)
+                        rank = (GAME_EXTENSIONS.index(ext.lower()), root_rank)
+                        game_file = os.path.join(dir_path, name)
+                        key = (system, normalize_title(stem))
+                        if key not in titles or rank < titles[key][0]:
+                            titles[key] = (rank, game_file)
+                        files.append((system, rank, stem, game_file))
+        self.titles, self.files, self.base_titles = titles, files, None
+
+    def build_base_titles(self, files):
+        # Splitting tags off every file name costs as much as the rest of the rebuild, and
+        # only titles without an exact file need it
+        base_titles = {}
+        for system, rank, stem, game_file in files:
+            base, tags = split_tags(stem)
+            base_titles.setdefault((system, base), []).append((rank, tags, game_file))
+        return base_titles
+
+    def find(self, title, system):
+        """Return the preferred game file for title, or None."""
+        with self.lock:
+            match = self.titles.get((system, normalize_title(title)))
+            if match:
+                return match[1]
+            # Fall back to files named with fewer tags, e.g. "Game.chd" for "Game (USA)",
+            # but never to one whose tags contradict the title such as another region or disc
+            if self.base_titles is None:
+                self.base_titles = self.build_base_titles(self.files)
+            base, tags = split_tags(title)
+            # A disc of a set must name its disc: "Game (Disc 2)" never falls back to "Game.chd"
+            disc_tags = {tag for tag in tags if DISC_TAG_PATTERN.match(tag)}
+            candidates = [(rank, game_file) for rank, file_tags, game_file in self.base_titles.get((system, base), [])
+                          if disc_tags <= file_tags <= tags]
+            return min(candidates)[1] if candidates else None
+
+    def __len__(self):
+        with self.lock:
+            return sum(len(entry["files"]) for entry in self.dirs.values())
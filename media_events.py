@@ -0,0 +1,273 @@
+import os
+import select
+import socket
+import time
+import threading
+import queue
+from collections import namedtuple
+
+import cdrom
+
+# Event kinds
+INSERTED = "inserted"
+EJECTED = "ejected"
+
+MediaEvent = namedtuple("MediaEvent", ["kind", "drive_path"])
+
+NETLINK_KOBJECT_UEVENT = 15
+UEVENT_BUFFER_SIZE = 64 * 1024
+KERNEL_POLL_MSECS = 500   # Block layer media polling interval when nobody has set one
+IOCTL_POLL_INTERVAL = 0.5 # Fallback polling interval; CDROM_DRIVE_STATUS does not spin the disc
+SETTLE_TIMEOUT = 15       # Seconds to wait for a drive to go from "not ready" to "disc ok"
+SETTLE_INTERVAL = 0.1     # How often wait() re-checks drives that are spinning up
+
+class MediaEventSource:
+    """Base class for disc insert/eject event sources driving the launcher loop."""
+
+    def __init__(self):
+        self.present = {}
+        self.settling = {}  # {drive path: deadline} for drives still spinning up a disc
+        # Self-pipe that lets another thread interrupt a blocked wait()
+        self.wake_r, self.wake_w = os.pipe()
+        os.set_blocking(self.wake_r, False)
+        os.set_blocking(self.wake_w, False)
+
+    def wake(self):
+        """Make a blocked wait() return early; safe to call from any thread."""
+        try:
+            os.write(self.wake_w, b"\0")
+        except BlockingIOError:
+            pass  # A wake-up is already pending
+
+    def drain_wake(self):
+        try:
+            while os.read(self.wake_r, 64):
+                pass
+        except BlockingIOError:
+            pass
+
+    def drives(self):
+        """Return the optical drive paths this source is watching."""
+        return sorted(self.present)
+
+    def initial_events(self):
+        """Report discs that were already inserted before the source started."""
+        events = []
+        for drive_path in cdrom.list_optical_drives():
+            has_disc = self.disc_present(drive_path)
+            self.present[drive_path] = has_disc
+            if has_disc:
+                events.append(MediaEvent(INSERTED, drive_path))
+        return events
+
+    def disc_present(self, drive_path):
+        """Check whether a readable disc is in the drive."""
+        return cdrom.drive_status(drive_path) == cdrom.CDS_DISC_OK
+
+    def update(self, drive_path, settle=False):
+        """Re-check one drive and return the event for its state change, if any.
+
+        With settle, a drive that is still spinning up is not reported as empty: it is
+        remembered and checked again by poll_settling() until SETTLE_TIMEOUT, so the
+        caller's loop never sleeps on one drive.
+        """
+        had_disc = self.present.get(drive_path, False)
+        status = cdrom.drive_status(drive_path)
+        now = time.monotonic()
+        if status == cdrom.CDS_DRIVE_NOT_READY and (settle or drive_path in self.settling):
+            if now < self.settling.setdefault(drive_path, now + SETTLE_TIMEOUT):
+                self.present.setdefault(drive_path, False)
+                return None
+        self.settling.pop(drive_path, None)
+        has_disc = status == cdrom.CDS_DISC_OK
+        self.present[drive_path] = has_disc
+        if has_disc and not had_disc:
+            return MediaEvent(INSERTED, drive_path)
+        if had_disc and not has_disc:
+            return MediaEvent(EJECTED, drive_path)
+        return None
+
+    def swap(self, drive_path):
+        """Handle a reported media change; a disc swapped between checks yields eject then insert."""
+        events = []
+        if self.present.get(drive_path):
+            self.present[drive_path] = False
+            events.append(MediaEvent(EJECTED, drive_path))
+        event = self.update(drive_path, settle=True)
+        if event:
+            events.append(event)
+        return events
+
+    def poll_settling(self):
+        """Re-check the drives that are spinning up; return events for those that settled."""
+        events = []
+        for drive_path in list(self.settling):
+            event = self.update(drive_path)
+            if event:
+                events.append(event)
+        return events
+
+    def wait_timeout(self, timeout):
+        """Shorten a wait so drives that are spinning up get re-checked."""
+        if not self.settling:
+            return timeout
+        return SETTLE_INTERVAL if timeout is None else min(timeout, SETTLE_INTERVAL)
+
+    def remove(self, drive_path):
+        """Forget a drive that has been unplugged."""
+        self.settling.pop(drive_path, None)
+        if self.present.pop(drive_path, False):
+            return MediaEvent(EJECTED, drive_path)
+        return None
+
+    def wait(self, timeout=None):
+        """Block until media events arrive or timeout expires; return a list of events."""
+        raise NotImplementedError
+
+    def close(self):
+        os.close(self.wake_r)
+        os.close(self.wake_w)
+
+class UeventMediaEventSource(MediaEventSource):
+    """Sleep on the kernel uevent netlink socket; the process only wakes on block device changes."""
+
+    def __init__(self):
+        super().__init__()
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UEVENT_BUFFER_SIZE)
+        self.sock.bind((0, 1))  # Group 1: kernel-originated events
+        self.pending = self.initial_events()
+        for drive_path in self.drives():
+            if not cdrom.enable_kernel_polling(drive_path, KERNEL_POLL_MSECS):
+                print(f"Warning: could not enable media polling for {drive_path}")
+
+    def parse_uevent(self, data):
+        """Split a raw uevent datagram into its ACTION@DEVPATH header and key/value fields."""
+        parts = data.split(b"\0")
+        fields = {}
+        for part in parts[1:]:
+            key, sep, value = part.partition(b"=")
+            if sep:
+                fields[key.decode('ascii', errors='ignore')] = value.decode('utf-8', errors='ignore')
+        return fields
+
+    def handle_uevent(self, fields):
+        """Translate one uevent into a list of media events for optical drives."""
+        if fields.get("SUBSYSTEM") != "block" or fields.get("DEVTYPE") != "disk":
+            return []
+        drive_path = f"/dev/{fields.get('DEVNAME', '')}"
+        action = fields.get("ACTION")
+        if action == "remove":
+            event = self.remove(drive_path)
+        elif action == "add" and drive_path in cdrom.list_optical_drives():
+            print(f"Detected optical drive: {drive_path}")
+            cdrom.enable_kernel_polling(drive_path, KERNEL_POLL_MSECS)
+            event = self.update(drive_path, settle=True)
+        elif action == "change" and drive_path in self.present:
+            if fields.get("DISK_MEDIA_CHANGE") == "1":
+                return self.swap(drive_path)
+            event = self.update(drive_path)
+        else:
+            event = None
+        return [event] if event else []
+
+    def wait(self, timeout=None):
+        if self.pending:
+            events, self.pending = self.pending, []
+            return events
+        ready, _, _ = select.select([self.sock, self.wake_r], [], [], self.wait_timeout(timeout))
+        if self.wake_r in ready:
+            self.drain_wake()
+            ready.remove(self.wake_r)
+        events = self.poll_settling()
+        while ready:
+            data = self.sock.recv(UEVENT_BUFFER_SIZE)
+            events.extend(self.handle_uevent(self.parse_uevent(data)))
+            ready, _, _ = select.select([self.sock], [], [], 0)
+        return events
+
+    def close(self):
+        self.sock.close()
+        super().close()
+
+class IoctlMediaEventSource(MediaEventSource):
+    """Poll CDROM_DRIVE_STATUS when uevents are unavailable; far cheaper than lsblk plus a mount."""
+
+    def __init__(self, interval=IOCTL_POLL_INTERVAL):
+        super().__init__()
+        self.interval = interval
+        self.pending = self.initial_events()
+        for drive_path in self.drives():
+            cdrom.media_changed(drive_path)  # Clear the flag so the first poll isn't a false swap
+
+    def wait(self, timeout=None):
+        if self.pending:
+            events, self.pending = self.pending, []
+            return events
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            events = []
+            drives = cdrom.list_optical_drives()
+            for drive_path in list(self.present):
+                if drive_path not in drives:
+                    event = self.remove(drive_path)
+                    if event:
+                        events.append(event)
+            for drive_path in drives:
+                if drive_path in self.present and cdrom.media_changed(drive_path):
+                    events.extend(self.swap(drive_path))
+                    continue
+                event = self.update(drive_path, settle=drive_path not in self.present)
+                if event:
+                    events.append(event)
+            if events:
+                return events
+            if deadline is not None and time.monotonic() >= deadline:
+                return []
+            woken, _, _ = select.select([self.wake_r], [], [], self.wait_timeout(self.interval))
+            if woken:
+                self.drain_wake()
+                return []
+
+class FakeMediaEventSource(MediaEventSource):
+    """In-memory event source for tests and benchmarks; call insert()/eject() to drive it."""
+
+    def __init__(self, drives=()):
+        super().__init__()
+        self.events = queue.Queue()
+        self.waiting = threading.Event()  # Set once a consumer first blocks in wait()
+        for drive_path in drives:
+            self.present[drive_path] = False
+
+    def insert(self, drive_path):
+        self.present[drive_path] = True
+        self.events.put(MediaEvent(INSERTED, drive_path))
+
+    def eject(self, drive_path):
+        self.present[drive_path] = False
+        self.events.put(MediaEvent(EJECTED, drive_path))
+
+    def wake(self):
+        self.events.put(None)
+
+    def wait(self, timeout=None):
+        self.waiting.set()
+        try:
+            events = [self.events.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return [event for event in events if event is not None]
+
+def open_media_event_source():
+    """Return the best available event source: kernel uevents, else ioctl polling."""
+    try:
+        source = UeventMediaEventSource()
+        print("Watching for disc changes via kernel uevents")
+        return source
+    except OSError as e:
+        print(f"Kernel uevents unavailable ({e}). Falling back to drive status polling...")
+        return IoctlMediaEventSource()
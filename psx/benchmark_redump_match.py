@@ -0,0 +1,89 @@
+import sys
+import time
+import random
+import sqlite3
+from fuzzywuzzy import fuzz
+
+from psx_redump_match import MATCH_THRESHOLD, clean_title, extract_region_and_language, language_score, match_all
+
+# Benchmark the indexed matcher against the original full scan using Redump-style
+# names synthesised from the bundled games.db (the DAT itself is not shipped).
+DB_PATH = "games.db"
+BASELINE_SAMPLE = 300  # Entries timed with the full scan; its total is extrapolated from these
+SEED = 1
+
+REGION_NAMES = {"NTSC-U": "USA", "PAL": "Europe", "NTSC-J": "Japan"}
+
+def load_db_titles(db_path):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT game_id, title, region, language FROM games WHERE system = 'PS1' AND game_id IS NOT NULL")
+    db_titles = {row[0]: (row[1], row[2], row[3]) for row in cursor.fetchall()}
+    conn.close()
+    return db_titles
+
+def synthesize_redump_data(db_titles, rng):
+    """Turn each database title into a Redump-like name, lightly reworded so matches stay fuzzy."""
+    redump_data = []
+    for title, region, _ in db_titles.values():
+        if not title:
+            continue
+        name = clean_title(title)
+        if rng.random() < 0.3:
+            name = name.replace(":", " -").replace("'", "")
+        if rng.random() < 0.2 and name.startswith("The "):
+            name = name[4:] + ", The"
+        if rng.random() < 0.1:
+            name = name.lower()
+        tags = f" ({REGION_NAMES.get(region, 'Europe')})"
+        if rng.random() < 0.3:
+            tags += " (En,Fr,De)"
+        redump_data.append(extract_region_and_language(name + tags))
+    return redump_data
+
+def full_scan_match(redump_title, redump_region, redump_language, db_titles):
+    """The original O(N x M) scan: clean and score every database title of the region."""
+    best_match = None
+    best_score = 0
+    for db_id, (db_title, db_region, db_language) in db_titles.items():
+        if db_region != redump_region:
+            continue
+        clean_db_title = clean_title(db_title or "")
+        title_score = fuzz.token_sort_ratio(redump_title, clean_db_title)
+        if title_score >= MATCH_THRESHOLD:
+            combined_score = title_score + (language_score(redump_language, db_language or "") * 0.2)
+            if combined_score > best_score:
+                best_score = combined_score
+                best_match = (db_id, db_title, db_language or "")
+    return best_match, best_score if best_match else 0
+
+def main():
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
+    rng = random.Random(SEED)
+    db_titles = load_db_titles(db_path)
+    redump_data = synthesize_redump_data(db_titles, rng)
+    print(f"{len(db_titles)} database titles, {len(redump_data)} synthetic Redump entries")
+
+    sample_rows = sorted(rng.sample(range(len(redump_data)), min(BASELINE_SAMPLE, len(redump_data))))
+    start = time.perf_counter()
+    baseline = [full_scan_match(*redump_data[i][:3], db_titles) for i in sample_rows]
+    baseline_time = (time.perf_counter() - start) * len(redump_data) / len(sample_rows)
+    print(f"Full scan:        {baseline_time:8.1f}s (extrapolated from {len(sample_rows)} entries)")
+
+    start = time.perf_counter()
+    indexed_single = match_all(redump_data, db_titles, workers=1)
+    single_time = time.perf_counter() - start
+    print(f"Indexed, 1 core:  {single_time:8.1f}s ({baseline_time / single_time:.0f}x)")
+
+    start = time.perf_counter()
+    indexed = match_all(redump_data, db_titles)
+    pool_time = time.perf_counter() - start
+    print(f"Indexed, pool:    {pool_time:8.1f}s ({baseline_time / pool_time:.0f}x)")
+
+    if indexed != indexed_single:
+        print("Pool results differ from single-process results!")
+    agree = sum(1 for i, expected in zip(sample_rows, baseline) if indexed[i][0] == expected[0])
+    print(f"Agreement with full scan: {agree}/{len(sample_rows)} sampled entries")
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,12 @@
 import os
+import sys
 import ctypes
 from ctypes import wintypes
 import sqlite3
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import game_ids
+
 # Windows-specific imports for low-level disc access
 kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
 
@@ -126,7 +130,7 @@ def get_psx_id_from_disc(drive_letter):
             print(f"Processing line: '{line}'")
             if "BOOT" in line.upper():
                 raw_id = line.split("=")[1].strip().split("\\")[1].split(";")[0]
-                game_id = raw_id.replace("_", "-").replace(".", "")
+                game_id = game_ids.normalize(raw_id)
                 print(f"Raw game ID from SYSTEM.CNF: {raw_id}")
                 print(f"Normalized game ID: {game_id}")
                 if any(game_id.startswith(prefix) for prefix in valid_prefixes):
@@ -1,9 +1,14 @@
-import requests
+import os
+import sys
 from bs4 import BeautifulSoup
-import sqlite3
 import time
 import re
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import games_db
+import game_ids
+from http_cache import CachedFetcher
+
 # Base URLs for each region (content frames)
 BASE_URLS = {
     "NTSC-U": "https://psxdatacenter.com/ulist.html",
@@ -19,33 +24,10 @@ HEADERS = {
     "Referer": "https://psxdatacenter.com/"
 }
 
-def create_database():
-    """Create SQLite3 database and table with system and language columns."""
-    conn = sqlite3.connect("games.db")
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS games (
-            game_id TEXT PRIMARY KEY,
-            title TEXT,
-            region TEXT,
-            system TEXT,
-            language TEXT,
-            updated_from_redump INTEGER DEFAULT 0
-        )
-    """)
-    conn.commit()
-    conn.close()
-
-def scrape_region(region, url):
-    """Scrape game data, excluding <span> and [ ] content from titles."""
-    print(f"Scraping {region} games from {url}...")
+def parse_region(region, html):
+    """Parse game data from a region page, excluding <span> and [ ] content from titles."""
     try:
-        response = requests.get(url, headers=HEADERS, timeout=10)
-        if response.status_code != 200:
-            print(f"Failed to access {url}: {response.status_code}")
-            return []
-        
-        soup = BeautifulSoup(response.content, "html.parser")
+        soup = BeautifulSoup(html, "html.parser")
         
         print(f"Page title: {soup.title.text if soup.title else 'No title found'}")
         
@@ -64,19 +46,21 @@ def scrape_region(region, url):
                 if len(cols) >= 4:  # Ensure col2 (ID), col3 (title), and col4 (language) exist
                     # Extract game IDs from col2, handling <br> tags
                     col2 = cols[1]
-                    game_ids = []
+                    disc_ids = []
                     contents = col2.contents
                     current_id = ""
                     for content in contents:
                         if isinstance(content, str) and content.strip():
                             current_id += content.strip()
                         elif content.name == "br" and current_id:
-                            game_ids.append(current_id)
+                            disc_ids.append(current_id)
                             current_id = ""
                     if current_id:
-                        game_ids.append(current_id)
-                    if not game_ids:
-                        game_ids = col2.text.strip().split()
+                        disc_ids.append(current_id)
+                    if not disc_ids:
+                        disc_ids = col2.text.strip().split()
+                    # Stored in canonical form so games.csv keys match the IDs read off discs
+                    disc_ids = [game_ids.normalize(disc_id) for disc_id in disc_ids]
                     
                     # Get title from col3, excluding <span> content
                     col3 = cols[2]
@@ -95,52 +79,61 @@ def scrape_region(region, url):
                     language = ", ".join(languages)
                     
                     # Handle single or multi-disc games
-                    if len(game_ids) == 1:
-                        games.append((game_ids[0], base_title, region, "PS1", language, 0))
+                    if len(disc_ids) == 1:
+                        games.append((disc_ids[0], base_title, region, "PS1", language, ""))
                     else:
-                        for i, game_id in enumerate(game_ids, 1):
+                        for i, game_id in enumerate(disc_ids, 1):
                             disc_title = f"{base_title} (Disc {i})"
-                            games.append((game_id, disc_title, region, "PS1", language, 0))
+                            games.append((game_id, disc_title, region, "PS1", language, ""))
         
         print(f"Found {len(games)} game entries in {region}")
         return games
     
     except Exception as e:
-        print(f"Error scraping {url}: {e}")
+        print(f"Error parsing {region} page: {e}")
         return []
 
-def populate_database():
-    """Scrape all regions and populate the database."""
-    create_database()
-    conn = sqlite3.connect("games.db")
-    cursor = conn.cursor()
-    
+def scrape_games(fetcher):
+    """Fetch all region pages concurrently, revalidating cached copies, and return the parsed rows."""
+    pages = fetcher.fetch_all(list(BASE_URLS.values()))
+    games = []
     for region, url in BASE_URLS.items():
-        games = scrape_region(region, url)
-        cursor.executemany("""
-            INSERT OR IGNORE INTO games (game_id, title, region, system, language, updated_from_redump)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, games)
-        conn.commit()
-        print(f"Added {len(games)} games for {region}")
-        time.sleep(2)  # Be polite to the server
+        if isinstance(pages[url], Exception):
+            print(f"Failed to access {url}: {pages[url]}")
+            continue
+        start = time.perf_counter()
+        region_games = parse_region(region, pages[url])
+        print(f"Parsed {region} page in {time.perf_counter() - start:.2f}s")
+        games += region_games
+    return games
+
+def populate_database(replay=False):
+    """Scrape all regions and upsert them into the database."""
+    fetcher = CachedFetcher(headers=HEADERS, replay=replay)
+    games = scrape_games(fetcher)
+    fetcher.close()
+    print(f"Pages fetched: {fetcher.stats['fetched']}, unchanged: {fetcher.stats['not_modified']}, replayed: {fetcher.stats['replayed']}")
     
+    conn = games_db.connect()
+    games_db.upsert_games(conn, games)
     conn.close()
-    print("Database population complete.")
+    print(f"Upserted {len(games)} games. Run build_games.py to regenerate games.csv and games.idx.")
 
 def main():
+    # --replay parses the pages saved in the scrape cache without touching the network
+    replay = "--replay" in sys.argv[1:]
     print("Starting PS1 game data scrape for all regions...")
-    populate_database()
+    populate_database(replay)
     # Verify database contents
-    conn = sqlite3.connect("games.db")
+    conn = games_db.connect()
     cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM games")
+    cursor.execute("SELECT COUNT(*) FROM games WHERE system = 'PS1'")
     count = cursor.fetchone()[0]
     print(f"Total games in database: {count}")
     # Test specific entries
     test_ids = ["SLUS-00518", "SLUS-01026", "SLUS-01183", "SLUS-00955", "SLUS-01224", "SLPS-01330"]  # Added AFRAID GEAR
     for test_id in test_ids:
-        cursor.execute("SELECT title, region, system, language, updated_from_redump FROM games WHERE game_id = ?", (test_id,))
+        cursor.execute("SELECT title, region, system, language, updated_from_redump FROM games WHERE game_id = ? AND system = 'PS1'", (test_id,))
         result = cursor.fetchone()
         if result:
             print(f"Test: {test_id} = {result[0]} ({result[1]}, {result[2]}, Language: {result[3]}, Updated: {result[4]})")
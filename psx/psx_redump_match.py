@@ -1,11 +1,23 @@
-import xml.etree.ElementTree as ET
-import sqlite3
-from fuzzywuzzy import fuzz
+import os
+import sys
+import json
+import hashlib
+import multiprocessing
+from fuzzywuzzy import fuzz, process
 import re
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import game_ids
+import games_db
+import redump_dat
+
 # Path to the Redump XML file (adjust as needed)
 REDUMP_FILE = "Sony - PlayStation - Discs (10850) (2025-04-08 08-03-06).xml"
 MATCH_THRESHOLD = 85  # Minimum similarity score for a match (0-100)
+COMMON_KEY_FRACTION = 0.02  # Words in more than 2% of a region's titles are too common to block on
+TITLE_CLEAN_PATTERN = re.compile(r'\s*\((?!Disc\s*\d+\b)[^)]+\)')
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+SERIAL_SPLIT_PATTERN = re.compile(r'[,/]')
 
 # Region mappings from Redump to games.db
 REGION_MAP = {
@@ -26,26 +38,20 @@ LANGUAGE_MAP = {
 
 def connect_to_database():
     """Connect to games.db and return connection and cursor."""
-    conn = sqlite3.connect("games.db")
+    conn = games_db.connect()
     cursor = conn.cursor()
     return conn, cursor
 
 def update_table_schema(cursor):
-    """Add updated_from_redump column if it doesn’t exist."""
+    """Create the table recording which Redump entries have been imported."""
+    # Content hash of every DAT entry already imported, so later runs only process the delta
     cursor.execute("""
-        CREATE TABLE IF NOT EXISTS games (
-            game_id TEXT PRIMARY KEY,
-            title TEXT,
-            region TEXT,
-            system TEXT,
-            language TEXT,
-            updated_from_redump INTEGER DEFAULT 0
+        CREATE TABLE IF NOT EXISTS redump_entries (
+            name TEXT PRIMARY KEY,
+            content_hash TEXT,
+            game_id TEXT
         )
     """)
-    cursor.execute("PRAGMA table_info(games)")
-    columns = [col[1] for col in cursor.fetchall()]
-    if "updated_from_redump" not in columns:
-        cursor.execute("ALTER TABLE games ADD COLUMN updated_from_redump INTEGER DEFAULT 0")
 
 def extract_region_and_language(redump_title):
     """Extract region, language, and clean title from Redump title, defaulting to PAL if no USA/Japan."""
@@ -68,100 +74,203 @@ def extract_region_and_language(redump_title):
         language = ", ".join(db_langs)
     
     # Clean title: remove all parentheses except (Disc X)
-    title = re.sub(r'\s*\((?!Disc\s*\d+\b)[^)]+\)', '', redump_title).strip()
+    title = clean_title(redump_title)
     return title, region, language, redump_title
 
-def parse_redump_xml(file_path):
-    """Parse the Redump XML file and return a list of (title, region, language, full_title) tuples."""
+def entry_hash(game):
+    """Hash everything a DAT entry carries, so any change to it is detected."""
+    return hashlib.sha1(json.dumps(game, sort_keys=True).encode('utf-8')).hexdigest()
+
+def parse_redump_delta(file_path, known_hashes):
+    """Stream the Redump XML file and return (title, region, language, full_title) tuples for
+    entries added or changed since the last import, {full_title: hash} for every entry, and
+    {full_title: [normalised serials]} for the changed entries."""
     redump_data = []
+    seen_hashes = {}
+    serials = {}
     try:
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-        
-        for game in root.findall("game"):
-            full_title = game.get("name")
-            title, region, language, redump_full_title = extract_region_and_language(full_title)
-            redump_data.append((title, region, language, redump_full_title))
-        
-        return redump_data
+        for game in redump_dat.iter_dat_games(file_path):
+            full_title = game["name"]
+            seen_hashes[full_title] = entry_hash(game)
+            if known_hashes.get(full_title) != seen_hashes[full_title]:
+                redump_data.append(extract_region_and_language(full_title))
+                serials[full_title] = [game_ids.normalize(serial) for serial in SERIAL_SPLIT_PATTERN.split(game["serial"]) if serial.strip()]
+        return redump_data, seen_hashes, serials
     
     except Exception as e:
         print(f"Error parsing Redump XML: {e}")
-        return []
-
-def fuzzy_match_titles(redump_title, redump_region, redump_language, db_titles):
-    """Find the best match for a Redump title, prioritizing title then language."""
-    best_match = None
-    best_score = 0
-    for db_id, (db_title, db_region, db_language) in db_titles.items():
-        if db_region == redump_region:  # Match region first
-            # Clean database title similarly, preserving (Disc X)
-            db_clean_title = re.sub(r'\s*\((?!Disc\s*\d+\b)[^)]+\)', '', db_title).strip()
-            score = fuzz.token_sort_ratio(redump_title, db_clean_title)
-            if score >= MATCH_THRESHOLD:
-                # Check language compatibility (partial match allowed)
-                redump_langs = set(redump_language.split(", "))
-                db_langs = set(db_language.split(", "))
-                lang_overlap = redump_langs.intersection(db_langs)
-                lang_score = len(lang_overlap) / max(len(redump_langs), len(db_langs)) * 100 if redump_langs and db_langs else 0
-                combined_score = score + (lang_score * 0.2)  # Weight language lightly
-                if combined_score > best_score:
-                    best_score = combined_score
-                    best_match = (db_id, db_title, db_language)
-    
-    return best_match, best_score if best_match else 0
+        return None, None, None
+
+def clean_title(title):
+    """Remove all parentheses except (Disc X) from a title."""
+    return TITLE_CLEAN_PATTERN.sub('', title).strip()
+
+def blocking_keys(title):
+    """Return the words of a title plus each adjacent pair joined, so "Spider Man" also meets "Spiderman"."""
+    tokens = TOKEN_PATTERN.findall(title.lower())
+    return set(tokens) | {a + b for a, b in zip(tokens, tokens[1:])}
+
+def language_score(redump_language, db_language):
+    """Percentage overlap between two comma-separated language lists."""
+    redump_langs = set(redump_language.split(", "))
+    db_langs = set(db_language.split(", "))
+    lang_overlap = redump_langs.intersection(db_langs)
+    return len(lang_overlap) / max(len(redump_langs), len(db_langs)) * 100 if redump_langs and db_langs else 0
+
+class TitleMatcher:
+    """Database titles cleaned once and indexed by region and word for candidate blocking."""
+
+    def __init__(self, db_titles):
+        self.rows = {}   # region -> [(db_id, db_title, db_language, clean title)]
+        self.index = {}  # region -> {blocking key: [row numbers]}
+        self.common = {} # region -> blocking keys too frequent to narrow the search
+        for db_id, (db_title, db_region, db_language) in db_titles.items():
+            rows = self.rows.setdefault(db_region, [])
+            clean = clean_title(db_title or "")
+            for key in blocking_keys(clean):
+                self.index.setdefault(db_region, {}).setdefault(key, []).append(len(rows))
+            rows.append((db_id, db_title, db_language or "", clean))
+        for region, keys in self.index.items():
+            limit = max(1, int(len(self.rows[region]) * COMMON_KEY_FRACTION))
+            self.common[region] = {key for key, rows in keys.items() if len(rows) > limit}
+
+    def candidates(self, redump_title, region):
+        """Return row numbers sharing a distinctive word with the title, or any word if it has none."""
+        index = self.index.get(region, {})
+        keys = [key for key in blocking_keys(redump_title) if key in index]
+        rare = [key for key in keys if key not in self.common[region]]
+        rows = set()
+        for key in rare or keys:
+            rows.update(index[key])
+        return sorted(rows)
+
+    def match(self, redump_title, redump_region, redump_language):
+        """Find the best match for a Redump title, prioritizing title then language."""
+        rows = self.rows.get(redump_region, [])
+        choices = {row: rows[row][3] for row in self.candidates(redump_title, redump_region)}
+        scored = process.extractBests(redump_title, choices, scorer=fuzz.token_sort_ratio,
+                                      score_cutoff=MATCH_THRESHOLD, limit=None)
+        best_match = None
+        best_score = 0
+        # Visit in database order so ties resolve the same way as a full scan
+        for _, score, row in sorted(scored, key=lambda result: result[2]):
+            db_id, db_title, db_language, _ = rows[row]
+            combined_score = score + (language_score(redump_language, db_language) * 0.2)  # Weight language lightly
+            if combined_score > best_score:
+                best_score = combined_score
+                best_match = (db_id, db_title, db_language)
+        return best_match, best_score if best_match else 0
+
+_worker_matcher = None
+
+def _init_worker(matcher):
+    global _worker_matcher
+    _worker_matcher = matcher
+
+def _match_entry(entry):
+    redump_title, redump_region, redump_language, _ = entry
+    return _worker_matcher.match(redump_title, redump_region, redump_language)
+
+def match_all(redump_data, db_titles, workers=None):
+    """Match every Redump entry against the database across a process pool, preserving order."""
+    matcher = TitleMatcher(db_titles)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return [matcher.match(title, region, language) for title, region, language, _ in redump_data]
+    chunksize = max(1, len(redump_data) // (workers * 8))
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(matcher,)) as pool:
+        return pool.map(_match_entry, redump_data, chunksize=chunksize)
 
 def update_database_with_redump(redump_file):
-    """Update games.db with Redump names using title-first fuzzy matching."""
-    # Parse Redump data
-    redump_data = parse_redump_xml(redump_file)
-    if not redump_data:
-        print("No titles parsed from Redump file. Exiting.")
-        return
-    
+    """Update games.db with Redump names, joining on serials and fuzzy matching the rest by title."""
     # Connect to database
     conn, cursor = connect_to_database()
     update_table_schema(cursor)
     
+    # Parse only the Redump entries that changed since the last import
+    cursor.execute("SELECT name, content_hash, game_id FROM redump_entries")
+    stored = cursor.fetchall()
+    # Entries that matched nothing are parsed again on every import: games scraped since may match them
+    known_hashes = {name: content_hash for name, content_hash, game_id in stored if game_id is not None}
+    redump_data, seen_hashes, serials = parse_redump_delta(redump_file, known_hashes)
+    if seen_hashes is None:
+        print("No titles parsed from Redump file. Exiting.")
+        conn.close()
+        return
+    removed = [(name,) for name, _, _ in stored if name not in seen_hashes]
+    cursor.executemany("DELETE FROM redump_entries WHERE name = ?", removed)
+    print(f"{len(seen_hashes)} Redump entries: {len(redump_data)} new, changed or still unmatched, {len(removed)} removed.")
+    if not redump_data:
+        conn.commit()
+        conn.close()
+        return
+    
     # Fetch existing games from database
-    cursor.execute("SELECT game_id, title, region, language FROM games")
+    cursor.execute("SELECT game_id, title, region, language FROM games WHERE system = 'PS1'")
     db_titles = {row[0]: (row[1], row[2], row[3]) for row in cursor.fetchall()}
     
+    # Join on serials first; only entries without a known serial go through fuzzy matching
+    db_ids = game_ids.AliasTable(db_titles)
+    resolved = []
+    residue = []
+    for entry in redump_data:
+        matched_ids = [db_ids.resolve(serial) for serial in serials[entry[3]] if serial in db_ids]
+        if matched_ids:
+            resolved.append((entry, [(game_id, db_titles[game_id][0], db_titles[game_id][2]) for game_id in matched_ids], None))
+        else:
+            residue.append(entry)
+    print(f"{len(resolved)} entries joined by serial, {len(residue)} left for fuzzy matching.")
+    if residue:
+        resolved += [(entry, [match] if match else [], score) for entry, (match, score) in zip(residue, match_all(residue, db_titles))]
+    
     updated_count = 0
     added_count = 0
+    unmatched_count = 0
     
-    for redump_title, redump_region, redump_language, redump_full_title in redump_data:
-        match, score = fuzzy_match_titles(redump_title, redump_region, redump_language, db_titles)
+    for (redump_title, redump_region, redump_language, redump_full_title), matches, score in resolved:
+        # An entry added under its own serial counts as matched to that new row
+        entry_id = matches[0][0] if matches else (serials[redump_full_title] or [None])[0]
+        cursor.execute("""
+            INSERT OR REPLACE INTO redump_entries (name, content_hash, game_id)
+            VALUES (?, ?, ?)
+        """, (redump_full_title, seen_hashes[redump_full_title], entry_id))
+        how = "Serial" if score is None else f"Score: {score:.1f}"
         
-        if match:
+        for game_id, old_title, db_language in matches:
             # Update existing game with Redump full title
-            game_id, old_title, db_language = match
             if old_title != redump_full_title:
                 cursor.execute("""
                     UPDATE games 
                     SET title = ?, updated_from_redump = 1 
-                    WHERE game_id = ?
+                    WHERE game_id = ? AND system = 'PS1'
                 """, (redump_full_title, game_id))
                 updated_count += 1
-                print(f"Updated {game_id}: '{old_title}' -> '{redump_full_title}' (Region: {redump_region}, Language Match: {redump_language} vs {db_language}, Score: {score:.1f})")
-        else:
-            # Add new game with inferred data
+                print(f"Updated {game_id}: '{old_title}' -> '{redump_full_title}' (Region: {redump_region}, Language Match: {redump_language} vs {db_language}, {how})")
+        if matches:
+            continue
+        if serials[redump_full_title]:
+            # Add new game under its Redump serial
+            game_id = serials[redump_full_title][0]
             cursor.execute("""
-                INSERT OR IGNORE INTO games (game_id, title, region, system, language, updated_from_redump)
-                VALUES (NULL, ?, ?, ?, ?, 1)
-            """, (redump_full_title, redump_region, "PS1", redump_language))
+                INSERT OR IGNORE INTO games (game_id, title, region, system, language, updated_from_redump, disc)
+                VALUES (?, ?, ?, ?, ?, 1, ?)
+            """, (game_id, redump_full_title, redump_region, "PS1", redump_language, games_db.title_disc(redump_full_title)))
             added_count += 1
-            print(f"Added '{redump_full_title}' (Region: {redump_region}, Language: {redump_language}, No ID match, Score: {score})")
+            print(f"Added {game_id} '{redump_full_title}' (Region: {redump_region}, Language: {redump_language})")
+        else:
+            unmatched_count += 1
+            print(f"No match for '{redump_full_title}' and no serial to add it under (Region: {redump_region}, Score: {score})")
     
     # Commit changes
     conn.commit()
     print(f"\nUpdated {updated_count} games.")
-    print(f"Added {added_count} new games without IDs.")
+    print(f"Added {added_count} new games by serial.")
+    print(f"Skipped {unmatched_count} unmatched entries without a serial.")
     
     # Verify specific examples
     test_ids = ["SLUS-00518", "SLUS-01026", "SLUS-01183", "SLUS-00955"]
     for test_id in test_ids:
-        cursor.execute("SELECT title, region, system, language, updated_from_redump FROM games WHERE game_id = ?", (test_id,))
+        cursor.execute("SELECT title, region, system, language, updated_from_redump FROM games WHERE game_id = ? AND system = 'PS1'", (test_id,))
         result = cursor.fetchone()
         if result:
             print(f"Test: {test_id} = {result[0]} ({result[1]}, {result[2]}, Language: {result[3]}, Updated: {result[4]})")
@@ -169,7 +278,7 @@ def update_database_with_redump(redump_file):
     conn.close()
 
 def main():
-    print("Updating games.db with Redump names using title-first fuzzy matching, region, and language comparison...")
+    print("Updating games.db with Redump names by serial, falling back to fuzzy title, region, and language comparison...")
     update_database_with_redump(REDUMP_FILE)
 
 if __name__ == "__main__":
@@ -1,8 +1,13 @@
+import os
+import sys
 import requests
 from bs4 import BeautifulSoup
 import sqlite3
 import time
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import game_ids
+
 # Base URLs for each region (content frames)
 BASE_URLS = {
     "NTSC-U": "https://psxdatacenter.com/ulist.html",
@@ -61,7 +66,7 @@ def scrape_region(region, url):
                 if len(cols) >= 3:  # Ensure col2 and col3 exist
                     # Extract game IDs from col2, handling <br> tags
                     col2 = cols[1]
-                    game_ids = []
+                    disc_ids = []
                     
                     # Get all text nodes and <br> tags in col2
                     contents = col2.contents
@@ -70,24 +75,24 @@ def scrape_region(region, url):
                         if isinstance(content, str) and content.strip():
                             current_id += content.strip()
                         elif content.name == "br" and current_id:
-                            game_ids.append(current_id)
+                            disc_ids.append(current_id)
                             current_id = ""
                     if current_id:  # Add the last ID if present
-                        game_ids.append(current_id)
+                        disc_ids.append(current_id)
                     
                     # If no <br> tags, split by whitespace
-                    if not game_ids:
-                        game_ids = col2.text.strip().split()
+                    if not disc_ids:
+                        disc_ids = col2.text.strip().split()
                     
                     base_title = cols[2].text.strip().split(" - ")[0].strip()  # col3: Base title
                     
                     # Handle single or multi-disc games
-                    if len(game_ids) == 1:
-                        normalized_id = game_ids[0].replace(".", "_")
+                    if len(disc_ids) == 1:
+                        normalized_id = game_ids.normalize(disc_ids[0])
                         games.append((normalized_id, base_title, region))
                     else:
-                        for i, game_id in enumerate(game_ids, 1):
-                            normalized_id = game_id.replace(".", "_")
+                        for i, game_id in enumerate(disc_ids, 1):
+                            normalized_id = game_ids.normalize(game_id)
                             disc_title = f"{base_title} - Disc {i}"
                             games.append((normalized_id, disc_title, region))
         
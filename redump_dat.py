@@ -0,0 +1,78 @@
+import os
+import json
+import xml.etree.ElementTree as ET
+
+VERIFIED = "verified"
+MISMATCH = "mismatch"
+UNKNOWN = "unknown"
+NO_DAT = "no_dat"
+
+def iter_dat_games(dat_path):
+    """Stream <game> entries from a Redump DAT as dicts, clearing each element once read."""
+    root = None
+    for event, elem in ET.iterparse(dat_path, events=("start", "end")):
+        if root is None:
+            root = elem
+        if event != "end" or elem.tag != "game":
+            continue
+        roms = [{
+            "name": rom.get("name", ""),
+            "size": int(rom.get("size", 0)),
+            "crc": (rom.get("crc") or "").lower(),
+            "md5": (rom.get("md5") or "").lower(),
+            "sha1": (rom.get("sha1") or "").lower(),
+        } for rom in elem.findall("rom")]
+        serial = elem.findtext("serial") or elem.get("serial") or ""
+        yield {"name": elem.get("name", ""), "serial": serial.strip(), "roms": roms}
+        # Drop the finished entry from the root too, so memory stays flat however large the DAT is
+        root.clear()
+
+class RomHashIndex:
+    """Track hashes of every disc in a DAT, indexed by SHA-1 for rip verification."""
+
+    def __init__(self, dat_path):
+        self.dat_path = dat_path
+        self.games = {}
+        self.by_sha1 = {}
+        for game in iter_dat_games(dat_path):
+            tracks = [rom for rom in game["roms"] if rom["name"].lower().endswith(".bin")]
+            self.games[game["name"]] = tracks
+            for rom in tracks:
+                self.by_sha1.setdefault(rom["sha1"], []).append(game["name"])
+
+    def verify(self, track_hashes, title=None):
+        """Return a verdict dict comparing per-track hashes from a rip with the DAT.
+
+        Only data tracks decide the verdict. Redump corrects audio tracks for the drive's
+        read offset and the ripper does not, so audio tracks that differ are listed as
+        "unverified_tracks" (1-based) rather than failing a good rip.
+        """
+        data = [i for i, got in enumerate(track_hashes) if not got.get("audio")]
+        candidates = self.by_sha1.get(track_hashes[data[0]]["sha1"], []) if data else []
+        for name in candidates:
+            tracks = self.games[name]
+            if len(tracks) != len(track_hashes):
+                continue
+            differing = [i for i, (rom, got) in enumerate(zip(tracks, track_hashes))
+                         if (rom["size"], rom["crc"], rom["md5"], rom["sha1"]) != (got["size"], got["crc"], got["md5"], got["sha1"])]
+            if not any(i in data for i in differing):
+                return {"verdict": VERIFIED, "dat_game": name, "unverified_tracks": [i + 1 for i in differing]}
+        if title and title in self.games:
+            return {"verdict": MISMATCH, "dat_game": title}
+        return {"verdict": UNKNOWN, "dat_game": None}
+
+def find_dat(dat_dir, prefix):
+    """Return the newest DAT in dat_dir whose name starts with prefix, or None."""
+    try:
+        names = sorted(n for n in os.listdir(dat_dir) if n.startswith(prefix) and n.lower().endswith((".dat", ".xml")))
+    except OSError:
+        return None
+    # Redump names end in "(YYYY-MM-DD hh-mm-ss)", so the last one sorted is the newest
+    return os.path.join(dat_dir, names[-1]) if names else None
+
+def write_verification(game_file, verdict, track_hashes):
+    """Store the verdict and track hashes next to the game file; return the sidecar path."""
+    sidecar = os.path.splitext(game_file)[0] + ".verify.json"
+    with open(sidecar, 'w', encoding='utf-8') as f:
+        json.dump(dict(verdict, tracks=track_hashes), f, indent=2)
+    return sidecar
@@ -6,6 +6,11 @@ if [ ! -f "$SCRIPT_PATH" ]; then
     exit 1
 fi
 chmod +x "$SCRIPT_PATH"
+# The launcher stays resident; talk to it through its control socket instead of starting another
+if python3 "/media/fat/Scripts/control_socket.py" status > /dev/null 2>&1; then
+    echo "RetroSpin Disc Launcher is already running. Use control_socket.py to talk to it."
+    exit 0
+fi
 echo "Launching RetroSpin Disc Launcher in the background..."
 nohup sudo python3 "$SCRIPT_PATH" > "$LOG_FILE" 2>&1 &
 PID=$!
@@ -1,13 +1,23 @@
 import os
+import json
+import threading
 import time
-import re
-import subprocess
-import csv
-import xml.etree.ElementTree as ET
+
+import control_socket
+import disc_cache
+import disc_classifier
+import disc_sets
+import iso9660
+import launch_timing
+import library_index
+import media_events
+import staging_cache
+import title_index
 
 # MiSTer-specific paths
 MISTER_CMD = "/dev/MiSTer_cmd"
 MISTER_CORE_DIR = "/media/fat/_Console/"
+CORE_PREFIXES = {"PSX": "PSX_", "SATURN": "Saturn_"}
 PSX_GAME_PATHS = [
     "/media/fat/games/PSX/",
     "/media/usb0/games/PSX/"
@@ -17,15 +27,65 @@ SATURN_GAME_PATHS = [
     "/media/usb0/games/Saturn/"
 ]
 CSV_PATH = "/media/fat/retrospin/games.csv"
+INDEX_PATH = "/media/fat/retrospin/games.idx"
+LIBRARY_INDEX_PATH = "/media/fat/retrospin/library.json"
+DISC_CACHE_PATH = "/media/fat/retrospin/disc_cache.json"
+CORE_CACHE_PATH = "/media/fat/retrospin/cores.json"
+TIMING_LOG_PATH = "/media/fat/retrospin/launch_timing.jsonl"
 TMP_MGL_PATH = "/tmp/game.mgl"
-SAVE_SCRIPT = "/media/fat/retrospin/save_disc.sh"
-RIPDISC_PATH = "/media/fat/retrospin/cdrdao"
+CONTROL_SOCKET_PATH = "/tmp/retrospin.sock"
+CORENAME_PATH = "/tmp/CORENAME"  # Written by MiSTer Main: the running core's name, "MENU" at the menu
+RIP_FORMAT = "chd"  # "chd" or "bin" (.bin + .cue)
+RIP_POLL_INTERVAL = 0.5  # Seconds between progress checks while rips are running
+RELAUNCH_WAIT = 5  # Seconds a relaunch request waits for the launch, well inside the client timeout
+# Which drive's disc runs when several hold games: "latest" lets the most recently
+# inserted disc take over; "first" keeps the running game until its disc is ejected
+LAUNCH_POLICY = "latest"
+MAX_PROBE_WORKERS = 4  # Drives identified concurrently
+REDUMP_DAT_DIR = "/media/fat/retrospin/redump"
+REDUMP_DAT_PREFIXES = {
+    "PSX": "Sony - PlayStation",
+    "SATURN": "Sega - Saturn"
+}
+RIP_PATHS = {
+    "PSX": "/media/usb0/games/PSX",
+    "SATURN": "/media/usb0/games/Saturn"
+}
+# Games launched from slower storage are copied here and played from the copy next time.
+# Use a folder on the SD card, or a tmpfs on boards with RAM to spare; None disables staging.
+STAGING_DIR = "/media/fat/retrospin/staging"
+STAGING_BUDGET = 8 * 1024 ** 3
+STAGING_DELAY = 60  # Seconds after a launch before copying, so the core's boot reads are not slowed
+
+game_library = None
+launch_cache = None
+timing_log = None
+rip_jobs = None
+staging = None
+disc_set_index = None
+running_game = None  # The game last loaded on the MiSTer; its core keeps running after the disc is ejected
+# Held while the library index loads, so a disc that needs it waits for the startup load
+library_lock = threading.Lock()
+disc_sets_lock = threading.Lock()
+rip_queue_lock = threading.Lock()
+# Held while a drive claims the MiSTer and sends load_core, so launches never interleave
+launch_lock = threading.Lock()
+# Only one drive at a time may put a prompt on screen
+dialog_lock = threading.Lock()
+
+class LaunchPreempted(Exception):
+    """Raised when the launch policy gives the MiSTer to another drive."""
+
+def find_core(system, names=None):
+    """Find the latest core .rbf file for the given system in /media/fat/_Console/.
 
-def find_core(system):
-    """Find the latest core .rbf file for the given system in /media/fat/_Console/."""
-    prefix = "PSX_" if system == "PSX" else "Saturn_"
+    names, the directory listing if the caller already has it, saves listing it again.
+    """
+    prefix = CORE_PREFIXES[system]
     try:
-        rbf_files = [f for f in os.listdir(MISTER_CORE_DIR) if f.startswith(prefix) and f.endswith(".rbf")]
+        if names is None:
+            names = os.listdir(MISTER_CORE_DIR)
+        rbf_files = [f for f in names if f.startswith(prefix) and f.endswith(".rbf")]
         if not rbf_files:
             print(f"No {system} core found in {MISTER_CORE_DIR}. Please place a {prefix}*.rbf file there.")
             return None
@@ -42,136 +102,135 @@ def find_core(system):
         print(f"Error finding {system} core: {e}")
         return None
 
-def load_game_titles():
-    """Load game ID to title mapping from CSV."""
-    game_titles = {}
-    try:
-        with open(CSV_PATH, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            header = next(reader)  # Skip header
-            print(f"CSV Header: {header}")
-            for row in reader:
-                if len(row) >= 4:  # Minimum required: game_id, title, region, system
-                    game_id, title = row[0].strip(), row[1].strip()
-                    system = row[3].strip() if len(row) > 3 else "Unknown"
-                    key = (game_id, system)
-                    game_titles[key] = title
-                    # Debug: Log specific ID if present
-                    if game_id == "SLUS-00515":
-                        print(f"Loaded PSX entry: {key} -> {title}")
-            print(f"Successfully loaded {len(game_titles)} game titles from {CSV_PATH}")
-            # Debug: Check if SLUS-00515 is in the loaded titles
-            if ('SLUS-00515', 'PSX') in game_titles:
-                print(f"Confirmed: SLUS-00515 mapped to {game_titles[('SLUS-00515', 'PSX')]}")
-            else:
-                print("Warning: SLUS-00515 not found in loaded titles with system 'PSX'")
-    except Exception as e:
-        print(f"Error loading game titles from CSV: {e}")
-    return game_titles
+def find_cores():
+    """Resolve every system's core with at most one listing of MISTER_CORE_DIR.
 
-def get_optical_drive():
-    """Detect an optical drive on MiSTer using lsblk."""
+    The result is saved to CORE_CACHE_PATH with the directory's mtime, which changes
+    whenever a core is added or removed; until then a start costs one stat per core.
+    """
     try:
-        result = subprocess.run(['lsblk', '-d', '-o', 'NAME,TYPE'], capture_output=True, text=True, check=True)
-        lines = result.stdout.splitlines()
-        for line in lines[1:]:
-            parts = line.split()
-            if len(parts) >= 2 and parts[1] == "rom":
-                dev_path = f"/dev/{parts[0]}"
-                print(f"Detected optical drive: {dev_path}")
-                return dev_path
-        print("No optical drive detected.")
-        return None
-    except Exception as e:
-        print(f"Error detecting drive: {e}")
-        return None
+        mtime = os.stat(MISTER_CORE_DIR).st_mtime_ns
+    except OSError as e:
+        print(f"Error finding cores: {e}")
+        return {system: None for system in CORE_PREFIXES}
+    try:
+        with open(CORE_CACHE_PATH, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached["dir"] == MISTER_CORE_DIR and cached["mtime"] == mtime and \
+                all(core is None or os.path.exists(core) for core in cached["cores"].values()):
+            print(f"Using cached cores: {cached['cores']}")
+            return cached["cores"]
+    except (OSError, ValueError, KeyError, AttributeError):
+        pass
+    try:
+        names = os.listdir(MISTER_CORE_DIR)
+    except OSError as e:
+        print(f"Error finding cores: {e}")
+        return {system: None for system in CORE_PREFIXES}
+    cores = {system: find_core(system, names) for system in CORE_PREFIXES}
+    tmp_path = CORE_CACHE_PATH + ".tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"dir": MISTER_CORE_DIR, "mtime": mtime, "cores": cores}, f)
+        os.replace(tmp_path, CORE_CACHE_PATH)
+    except OSError as e:
+        print(f"Failed to save core cache to {CORE_CACHE_PATH}: {e}")
+    return cores
 
-def read_psx_game_id(drive_path):
-    """Read PSX game ID from system.cnf."""
+def load_game_titles():
+    """Open the compiled title index, recompiling it from the CSV if missing or stale."""
     try:
-        mount_point = "/mnt/cdrom"
-        if not os.path.exists(mount_point):
-            os.makedirs(mount_point)
-        
-        mount_cmd = f"mount {drive_path} {mount_point} -t iso9660 -o ro"
-        mount_result = os.system(mount_cmd)
-        if mount_result != 0:
-            print(f"PSX iso9660 mount failed. Trying udf...")
-            mount_cmd = f"mount {drive_path} {mount_point} -t udf -o ro"
-            mount_result = os.system(mount_cmd)
-            if mount_result != 0:
-                print(f"Failed to mount {drive_path} with iso9660 or udf. Return code: {mount_result}")
-                return None
-            else:
-                print(f"Successfully mounted {drive_path} with udf")
-        else:
-            print(f"Successfully mounted {drive_path} with iso9660")
-        
-        system_cnf_variants = ["system.cnf", "SYSTEM.CNF", "System.cnf"]
-        for root, dirs, files in os.walk(mount_point):
-            for variant in system_cnf_variants:
-                if variant in files:
-                    system_cnf_path = os.path.join(root, variant)
-                    with open(system_cnf_path, 'r', encoding='latin-1', errors='ignore') as f:
-                        file_text = f.read()
-                        print(f"Found {variant} at {system_cnf_path}")
-                        for line in file_text.splitlines():
-                            if "BOOT" in line.upper():
-                                raw_id = line.split("=")[1].strip().split("\\")[1].split(";")[0]
-                                game_id = raw_id.replace(".", "").replace("_", "-")
-                                print(f"Extracted PSX Game ID: {game_id}")
-                                return game_id
-        print("system.cnf not found on disc (checked all case variations).")
-        return None
+        if title_index.index_is_stale(INDEX_PATH, [CSV_PATH]):
+            print(f"Title index missing or out of date. Compiling {CSV_PATH}...")
+            title_index.build_index(CSV_PATH, INDEX_PATH)
+        try:
+            game_titles = title_index.TitleIndex(INDEX_PATH)
+        except ValueError:
+            print(f"Title index has an old format. Compiling {CSV_PATH}...")
+            title_index.build_index(CSV_PATH, INDEX_PATH)
+            game_titles = title_index.TitleIndex(INDEX_PATH)
+        print(f"Successfully loaded {len(game_titles)} game titles from {INDEX_PATH}")
+        return game_titles
     except Exception as e:
-        print(f"Error reading PSX disc: {e}")
+        print(f"Error loading game titles: {e}")
+        return {}
+
+def lookup_title(game_titles, system, game_id, version="", disc=None):
+    """Return the title for a disc, trying its version and disc number before the bare ID."""
+    if hasattr(game_titles, "lookup"):
+        return game_titles.lookup(game_id, system, version, disc) or "Unknown Game"
+    return game_titles.get((game_id, system), "Unknown Game")
+
+def load_game_library():
+    """Load the persisted game library index and bring it up to date."""
+    global game_library
+    game_library = library_index.LibraryIndex({"PSX": PSX_GAME_PATHS, "SATURN": SATURN_GAME_PATHS}, LIBRARY_INDEX_PATH)
+    game_library.refresh()
+    print(f"Game library index holds {len(game_library)} game files")
+    return game_library
+
+def get_game_library():
+    """Return the game library index, loading it first unless startup already has."""
+    with library_lock:
+        return game_library or load_game_library()
+
+def get_rip_queue():
+    """Return the rip queue, starting it on the first rip."""
+    global rip_jobs
+    with rip_queue_lock:
+        if rip_jobs is None:
+            import rip_queue
+            rip_jobs = rip_queue.RipQueue()
+        return rip_jobs
+
+def load_staging_cache():
+    """Open the staging cache of games copied to fast storage, if STAGING_DIR is set."""
+    global staging
+    if not STAGING_DIR:
         return None
-    finally:
-        os.system(f"umount {mount_point}")
+    try:
+        os.makedirs(STAGING_DIR, exist_ok=True)
+        staging = staging_cache.StagingCache(STAGING_DIR, STAGING_BUDGET)
+        print(f"Staging cache holds {len(staging)} games in {STAGING_DIR}")
+    except OSError as e:
+        print(f"Staging cache unavailable ({e}). Games will play from where they are stored.")
+        staging = None
+    return staging
 
-def read_saturn_game_id(drive_path):
-    """Read Saturn game ID from disc header at offset 0x20-0x2A."""
+def staged_game_file(game_file):
+    """Return the staged fast copy of game_file if there is one, else game_file."""
+    if staging is None:
+        return game_file
+    return staging.lookup(game_file) or game_file
+
+def schedule_staging(game_file):
+    """Copy a game just launched from another device to the staging cache in the background."""
+    if staging is None:
+        return
     try:
-        with open(drive_path, 'rb') as f:
-            f.seek(0)  # Sector 0
-            sector = f.read(2048)
-            game_id = sector[32:42].decode('ascii', errors='ignore').strip()  # Offset 0x20 to 0x2A
-            print(f"Extracted Saturn Game ID: {game_id}")
-            return game_id
-    except Exception as e:
-        print(f"Error reading Saturn disc: {e}")
-        return None
+        if os.stat(game_file).st_dev == os.stat(STAGING_DIR).st_dev:
+            return  # Already on the fast storage
+    except OSError:
+        return
+    staging.stage_later(game_file, STAGING_DELAY)
 
 def find_game_file(title, system):
-    """Search for .chd or .cue game file based on system."""
-    paths = PSX_GAME_PATHS if system == "PSX" else SATURN_GAME_PATHS
-    
-    # Check for .chd first
-    game_filename = f"{title}.chd"
-    for base_path in paths:
-        game_file = os.path.join(base_path, game_filename)
-        if os.path.exists(game_file):
-            print(f"Found .chd game file: {game_file}")
-            if os.access(game_file, os.R_OK):
-                print(f"Game file {game_file} is readable")
-            else:
-                print(f"Game file {game_file} is not readable")
-            return game_file
-    
-    # If .chd not found, check for .cue
-    game_filename = f"{title}.cue"
-    for base_path in paths:
-        game_file = os.path.join(base_path, game_filename)
-        if os.path.exists(game_file):
-            print(f"Found .cue game file: {game_file}")
-            if os.access(game_file, os.R_OK):
-                print(f"Game file {game_file} is readable")
-            else:
-                print(f"Game file {game_file} is not readable")
-            return game_file
-    
-    print(f"No .chd or .cue game file found for: {title}")
-    return None
+    """Look up the .chd or .cue game file for a title in the game library index."""
+    library = get_game_library()
+    game_file = library.find(title, system)
+    if not game_file:
+        # Pick up games copied since the last scan; only changed directories are re-listed
+        library.refresh()
+        game_file = library.find(title, system)
+    if not game_file or not os.path.exists(game_file):
+        print(f"No .chd or .cue game file found for: {title}")
+        return None
+    print(f"Found game file: {game_file}")
+    if os.access(game_file, os.R_OK):
+        print(f"Game file {game_file} is readable")
+    else:
+        print(f"Game file {game_file} is not readable")
+    return game_file
 
 def show_popup(message):
     """Display a popup message on MiSTer."""
@@ -184,8 +243,9 @@ def show_popup(message):
     except Exception as e:
         print(f"Failed to display popup: {e}")
 
-def create_mgl_file(core_path, game_file, mgl_path, system):
-    """Create a temporary MGL file for the game."""
+def build_mgl(game_file, system):
+    """Return the MGL document that boots the system core with game_file."""
+    import xml.etree.ElementTree as ET
     mgl = ET.Element("mistergamedescription")
     rbf = ET.SubElement(mgl, "rbf")
     rbf.text = "_console/psx" if system == "PSX" else "_console/saturn"
@@ -194,95 +254,565 @@ def create_mgl_file(core_path, game_file, mgl_path, system):
     file_tag.set("type", "s")
     file_tag.set("index", "1" if system == "PSX" else "0")
     file_tag.set("path", game_file)
-    
-    tree = ET.ElementTree(mgl)
-    tree.write(mgl_path, encoding="utf-8", xml_declaration=True)
+    return ET.tostring(mgl, encoding="utf-8", xml_declaration=True).decode("utf-8")
+
+def create_mgl_file(core_path, game_file, mgl_path, system, disc_set=None):
+    """Create a temporary MGL file for the game and return its contents.
+
+    disc_set, a (playlist path, disc files) pair for a multi-disc game, also writes the
+    set's .m3u beside its discs. The MGL still mounts the inserted disc: the CD cores have
+    a single disc slot, so further entries would only remount it.
+    """
+    mgl = build_mgl(game_file, system)
+    write_mgl_file(mgl, mgl_path)
+    if disc_set:
+        playlist_path, disc_files = disc_set
+        try:
+            if disc_sets.write_playlist(playlist_path, disc_files):
+                print(f"Wrote disc playlist {playlist_path}")
+        except OSError as e:
+            print(f"Failed to write disc playlist {playlist_path}: {e}")
+    return mgl
+
+def write_mgl_file(mgl, mgl_path):
+    with open(mgl_path, "w", encoding="utf-8") as f:
+        f.write(mgl)
     print(f"Overwrote MGL file at {mgl_path}")
 
-def launch_game_on_mister(game_id, title, core_path, system, drive_path):
-    """Launch the game on MiSTer using a temporary MGL file."""
+def send_load_core(mgl_path):
+    """Ask MiSTer to load the core and game described by mgl_path."""
+    command = f"load_core {mgl_path}"
+    print(f"Preparing to send command to {MISTER_CMD}: {command}")
+    with open(MISTER_CMD, "w") as cmd_file:
+        cmd_file.write(command + "\n")
+        cmd_file.flush()
+        if os.path.exists(MISTER_CMD):
+            print(f"Command '{command}' sent successfully")
+        else:
+            print(f"Failed to write '{command}' to {MISTER_CMD}")
+    print(f"MGL file preserved at {mgl_path} for inspection")
+
+def rip_output_path(title, system):
+    """Return the image path a rip of title is written to for the configured RIP_FORMAT."""
+    file_name = title.replace("/", "-")
+    return os.path.join(RIP_PATHS[system], f"{file_name}.chd" if RIP_FORMAT == "chd" else f"{file_name}.bin")
+
+def save_disc(drive_path, title, system, game_id, confirm=True):
+    """Ask to save the disc to USB and queue a background rip; return the job id, or None."""
+    import redump_dat
+    import subprocess
+    jobs = get_rip_queue()
+    queued = jobs.pending(drive_path)
+    if queued:
+        print(f"Already saving the disc in {drive_path} (job {queued})")
+        return queued
+    image_type = ".chd" if RIP_FORMAT == "chd" else ".bin/.cue"
+    if confirm:
+        with dialog_lock:
+            prompt = subprocess.run(["dialog", "--yesno", f"Game file not found: {title}. Save disc as {image_type} to USB?", "10", "40"])
+        if prompt.returncode != 0:
+            print("User declined to save disc image")
+            return None
+    
+    output_path = rip_output_path(title, system)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    dat_path = redump_dat.find_dat(REDUMP_DAT_DIR, REDUMP_DAT_PREFIXES.get(system, ""))
+    if not dat_path:
+        print(f"No Redump DAT for {system} found in {REDUMP_DAT_DIR}. Rip will not be verified.")
+    job_id = jobs.submit(drive_path, title, system, game_id, output_path, RIP_FORMAT, dat_path)
+    print(f"Queued rip job {job_id}: saving disc to {output_path}...")
+    show_popup(f"Saving {title} in the background. It will load when the rip completes.")
+    return job_id
+
+def report_rip_progress(session):
+    """Print each running rip whenever its percentage changes."""
+    import rip_queue
+    for job in rip_jobs.status():
+        if job["state"] != rip_queue.RUNNING or "percent" not in job:
+            continue
+        if session["rip_progress"].get(job["id"]) != job["percent"]:
+            session["rip_progress"][job["id"]] = job["percent"]
+            print(f"Saving {job['title']}: {job['percent']}% ({job['sectors_done']}/{job['total_sectors']} sectors, "
+                  f"{job['mb_per_second']:.2f} MB/s)")
+
+def finish_rip(session, outcome):
+    """Handle a rip that left the queue: refresh the library and launch the new image."""
+    import redump_dat
+    import rip_queue
+    job = rip_jobs.jobs[outcome.job_id]["job"]
+    session["rip_progress"].pop(outcome.job_id, None)
+    # Cancelled and failed rips keep their part file and sector map so the next rip resumes
+    part_path = rip_queue.part_path(job)
+    kept = f"partial image kept for resuming at {part_path}" if os.path.exists(part_path) else "nothing saved yet"
+    if outcome.state == rip_queue.CANCELLED:
+        print(f"Rip of {job.title} cancelled after {outcome.sectors} sectors; {kept}")
+        return
+    if outcome.state == rip_queue.FAILED:
+        print(f"Error occurred during disc save: {outcome.error}; {kept}")
+        show_popup(f"Disc save failed for {job.title}.")
+        return
+    print(f"Saved {outcome.sectors} sectors in {outcome.elapsed:.1f}s ({outcome.bytes_per_second / (1024 * 1024):.2f} MB/s)")
+    print(f"Rip verification: {outcome.verdict['verdict']} ({outcome.verdict['dat_game']})")
+    if outcome.verdict.get("unverified_tracks"):
+        # Audio is hashed without the drive's read offset correction Redump applies
+        print(f"Audio tracks not verified: {', '.join(map(str, outcome.verdict['unverified_tracks']))}")
+    unreadable = outcome.verdict.get("unreadable_sectors", [])
+    if unreadable:
+        print(f"Zero-filled unreadable sectors: {', '.join(map(str, unreadable))}")
+        show_popup(f"{job.title} saved, but {len(unreadable)} unreadable sectors were zero-filled; it may be damaged.")
+    elif outcome.verdict["verdict"] == redump_dat.MISMATCH:
+        show_popup(f"{job.title} saved, but it does not match the Redump checksums and may be damaged.")
+    if game_library is not None:
+        game_library.refresh()
+    # Launch the new image if the disc is still in its drive; the launch policy has the final say
+    if drive_state(session, job.drive_path)["inserted"] is not None:
+        start_probe(session, job.drive_path, relaunch=True)
+
+def load_disc_sets():
+    """Group the multi-disc titles in the title CSV into disc sets."""
+    global disc_set_index
+    try:
+        disc_set_index = disc_sets.DiscSetIndex.from_csv(CSV_PATH)
+        print(f"Found {len(disc_set_index)} multi-disc sets in {CSV_PATH}")
+    except OSError as e:
+        print(f"Error loading disc sets: {e}")
+        disc_set_index = disc_sets.DiscSetIndex([])
+    return disc_set_index
+
+def get_disc_set_index():
+    """Return the disc set index, loading it first unless the warm-up already has."""
+    with disc_sets_lock:
+        return disc_set_index if disc_set_index is not None else load_disc_sets()
+
+def disc_set_files(title, system):
+    """Return (playlist path, game files) for title's multi-disc set, or None for a single disc.
+
+    Sibling discs are looked up in the library index as it stands: a launch never waits
+    on a rescan for discs that are not saved yet.
+    """
+    if disc_sets.disc_number(title) is None:
+        return None
+    library = get_game_library()
+    disc_files = [game_file for game_file in (library.find(disc_title, system)
+                                              for disc_title in get_disc_set_index().discs(title, system))
+                  if game_file and os.path.exists(game_file)]
+    if len(disc_files) < 2:
+        return None
+    return os.path.join(os.path.dirname(disc_files[0]), f"{disc_sets.set_name(title)}.m3u"), disc_files
+
+def set_running_game(system, game_id, title, game_file):
+    global running_game
+    running_game = {"system": system, "game_id": game_id, "title": title, "game_file": game_file}
+
+def core_at_menu():
+    """Whether the MiSTer is back at its menu, i.e. the player quit the core we loaded."""
+    try:
+        with open(CORENAME_PATH, 'r', encoding='utf-8') as f:
+            return f.read().strip() == "MENU"
+    except OSError:
+        return False  # Not on a MiSTer, or Main has not written it: assume the core still runs
+
+def swap_disc(system, game_id, title, timer=launch_timing.NULL_TIMER):
+    """Treat another disc of the running game as a disc swap; return its game file, or None if it is not one.
+
+    MiSTer_cmd can only load a core, which would reset the console mid-game. The core is
+    left running instead: the set's .m3u is refreshed and the player is told which image
+    to mount from the OSD, the same way the core swaps discs.
+    """
+    global running_game
+    running = running_game
+    if not running or running["system"] != system or not disc_sets.same_set(title, running["title"], system):
+        return None
+    if core_at_menu():
+        # The game was quit, so the disc boots it again rather than being mounted into it
+        running_game = None
+        return None
+    with timer.stage("find_game_file"):
+        game_file = find_game_file(title, system)
+    if not game_file:
+        return None  # Not saved yet, so it goes down the normal path and the rip is offered
+    with timer.stage("disc_swap"):
+        disc_set = disc_set_files(title, system)
+        if disc_set:
+            try:
+                disc_sets.write_playlist(*disc_set)
+            except OSError as e:
+                print(f"Failed to write disc playlist {disc_set[0]}: {e}")
+        set_running_game(system, game_id, title, game_file)
+    print(f"Disc swap for {running['title']}: now {title}")
+    show_popup(f"Disc {disc_sets.disc_number(title)} inserted. Open the OSD and mount {os.path.basename(game_file)} to continue.")
+    return game_file
+
+def launch_game_on_mister(game_id, title, core_path, system, drive_path, timer=launch_timing.NULL_TIMER, claim=None):
+    """Launch the game on MiSTer using a temporary MGL file; return (game_file, mgl) on success.
+
+    claim, if given, is called under launch_lock just before loading and raises
+    LaunchPreempted when another drive owns the MiSTer.
+    """
     if title == "Unknown Game":
         print(f"Skipping launch for unknown game: {game_id}")
-        return
+        return None
     
-    game_file = find_game_file(title, system)
+    with timer.stage("find_game_file"):
+        game_file = find_game_file(title, system)
     if not game_file:
-        print(f"Game file not found for {title} ({game_id}). Triggering save script...")
-        save_cmd = f"{SAVE_SCRIPT} \"{drive_path}\" \"{title}\" {system}"
-        subprocess.run(save_cmd, shell=True, check=True)
-        return
+        print(f"Game file not found for {title} ({game_id}). Offering to save disc...")
+        with timer.stage("save_disc"):
+            save_disc(drive_path, title, system, game_id)
+        return None
     
+    with timer.stage("staging_lookup"):
+        launch_file = staged_game_file(game_file)
+    with timer.stage("disc_set"):
+        disc_set = disc_set_files(title, system)
+    with launch_lock:
+        if claim:
+            claim()
+        try:
+            with timer.stage("create_mgl"):
+                mgl = create_mgl_file(core_path, launch_file, TMP_MGL_PATH, system, disc_set)
+            with timer.stage("send_load_core"):
+                send_load_core(TMP_MGL_PATH)
+            set_running_game(system, game_id, title, launch_file)
+        except Exception as e:
+            print(f"Failed to launch game on MiSTer: {e}")
+            return None
+    if launch_file == game_file:
+        schedule_staging(game_file)
+    return launch_file, mgl
+
+def load_launch_cache():
+    """Load the persistent cache of discs that have been launched before."""
+    global launch_cache
+    launch_cache = disc_cache.DiscCache(DISC_CACHE_PATH)
+    print(f"Disc cache holds {len(launch_cache)} known discs")
+    return launch_cache
+
+def load_timing_log():
+    """Open the log that per-stage launch timings are appended to."""
+    global timing_log
+    timing_log = launch_timing.TimingLog(TIMING_LOG_PATH)
+    return timing_log
+
+def relaunch_cached_disc(entry, last_game_id, timer=launch_timing.NULL_TIMER, claim=None):
+    """Launch a previously resolved disc straight from its cached MGL; return (last_game_id, outcome)."""
+    game_id, system = entry["game_id"], entry["system"]
+    if (game_id, system) == last_game_id:
+        print(f"{system} game {game_id} already launched. Waiting for new disc...")
+        return last_game_id, "already_launched"
+    print(f"Recognised {system} disc: {entry['title']} ({game_id})")
+    with timer.stage("staging_lookup"):
+        launch_file = staged_game_file(entry["game_file"])
+    with launch_lock:
+        if claim:
+            claim()
+        try:
+            with timer.stage("create_mgl"):
+                # The cached MGL points at the copy launched last time; boot a newer staged copy instead
+                write_mgl_file(entry["mgl"] if launch_file == entry["game_file"] else build_mgl(launch_file, system), TMP_MGL_PATH)
+            with timer.stage("send_load_core"):
+                send_load_core(TMP_MGL_PATH)
+            set_running_game(system, game_id, entry["title"], launch_file)
+        except Exception as e:
+            print(f"Failed to launch game on MiSTer: {e}")
+            return (game_id, system), "launch_failed"
+    if launch_file == entry["game_file"]:
+        schedule_staging(launch_file)
+    return (game_id, system), "cached"
+
+def identify_and_launch(drive_path, game_titles, cores, last_game_id, timer, claim=None):
+    """Identify the disc in drive_path and launch it; return (last_game_id, outcome)."""
     try:
-        create_mgl_file(core_path, game_file, TMP_MGL_PATH, system)
-        command = f"load_core {TMP_MGL_PATH}"
-        print(f"Preparing to send command to {MISTER_CMD}: {command}")
-        with open(MISTER_CMD, "w") as cmd_file:
-            cmd_file.write(command + "\n")
-            cmd_file.flush()
-            if os.path.exists(MISTER_CMD):
-                print(f"Command '{command}' sent successfully")
-            else:
-                print(f"Failed to write '{command}' to {MISTER_CMD}")
-        print(f"MGL file preserved at {TMP_MGL_PATH} for inspection")
+        with iso9660.SectorReader(drive_path) as reader:
+            with timer.stage("probe"):
+                sectors = disc_classifier.probe(reader)
+            with timer.stage("fingerprint"):
+                fingerprint = disc_cache.disc_fingerprint(drive_path, sectors.read(0, disc_classifier.PROBE_SECTORS))
+            with timer.stage("cache_lookup"):
+                entry = launch_cache.get(fingerprint) if launch_cache else None
+            if entry:
+                if (entry["game_id"], entry["system"]) != last_game_id and \
+                        swap_disc(entry["system"], entry["game_id"], entry["title"], timer):
+                    return (entry["game_id"], entry["system"]), "disc_swap"
+                return relaunch_cached_disc(entry, last_game_id, timer, claim)
+            with timer.stage("identify"):
+                system, game_id = disc_classifier.identify(sectors)
+                version, disc = disc_classifier.title_hints(sectors, system)
+    except LaunchPreempted:
+        raise
     except Exception as e:
-        print(f"Failed to launch game on MiSTer: {e}")
+        print(f"Error reading disc in {drive_path}: {e}")
+        return None, "read_error"
+    if not game_id:
+        print("No game detected. Waiting...")
+        return None, "no_game"
+    
+    if (game_id, system) == last_game_id:
+        print(f"{system} game {game_id} already launched. Waiting for new disc...")
+        return last_game_id, "already_launched"
+    
+    with timer.stage("title_lookup"):
+        title = lookup_title(game_titles, system, game_id, version, disc)
+    print(f"Found {system} game: {title} ({game_id})")
+    if swap_disc(system, game_id, title, timer):
+        return (game_id, system), "disc_swap"
+    core = cores.get(system)
+    if not core:
+        print(f"No {system} core available to launch game")
+        return (game_id, system), "no_core"
+    launched = launch_game_on_mister(game_id, title, core, system, drive_path, timer, claim)
+    if not launched:
+        return (game_id, system), "not_launched"
+    if launch_cache is not None:
+        game_file, mgl = launched
+        launch_cache.put(fingerprint, system, game_id, title, game_file, mgl)
+    return (game_id, system), "launched"
+
+def process_disc(drive_path, game_titles, cores, last_game_id, claim=None):
+    """Identify the disc in drive_path and launch it, logging per-stage timings; return the new last_game_id."""
+    print(f"Checking drive {drive_path}...")
+    timer = timing_log.start(drive_path) if timing_log is not None else launch_timing.NULL_TIMER
+    try:
+        last_game_id, outcome = identify_and_launch(drive_path, game_titles, cores, last_game_id, timer, claim)
+    except LaunchPreempted as e:
+        print(f"Not launching the disc in {drive_path}: {e}")
+        last_game_id, outcome = None, "preempted"
+    if timing_log is not None:
+        timing_log.finish(timer, outcome)
+    return last_game_id
+
+def drive_state(session, drive_path):
+    """Per-drive launcher state: the insertion it holds and the game it last launched."""
+    return session["drives"].setdefault(drive_path, {"inserted": None, "last_game_id": None})
+
+def claim_launch(session, drive_path, seq):
+    """Give the MiSTer to the disc inserted as seq in drive_path, or raise LaunchPreempted."""
+    if drive_state(session, drive_path)["inserted"] != seq:
+        raise LaunchPreempted("the disc was ejected or replaced")
+    owner = session["launch"]["drive"]
+    if owner not in (None, drive_path):
+        if LAUNCH_POLICY == "first" and drive_state(session, owner)["inserted"] is not None:
+            raise LaunchPreempted(f"the game from {owner} is still running")
+        if LAUNCH_POLICY == "latest" and session["launch"]["seq"] > seq:
+            raise LaunchPreempted(f"a disc inserted later in {owner} was launched")
+    session["launch"] = {"drive": drive_path, "seq": seq}
+
+def start_probe(session, drive_path, relaunch=False):
+    """Identify and launch the disc in drive_path on the probe pool; return its future.
 
-def main():
+    Every drive is probed on its own thread, so a slow spin-up or a rip prompt on one
+    drive never delays another. relaunch ignores the game last launched from the drive.
+    """
+    drive = drive_state(session, drive_path)
+    if relaunch:
+        session["seq"] += 1
+        drive["inserted"] = session["seq"]
+    seq = drive["inserted"]
+    last_game_id = drive["last_game_id"] if session["launch"]["drive"] == drive_path and not relaunch else None
+
+    def run():
+        try:
+            game = process_disc(drive_path, session["game_titles"], session["cores"], last_game_id,
+                                claim=lambda: claim_launch(session, drive_path, seq))
+        except Exception as e:
+            print(f"Error processing the disc in {drive_path}: {e}")
+            game = None
+        if drive["inserted"] == seq:
+            drive["last_game_id"] = game
+        if rip_jobs is not None and rip_jobs.active():
+            session["wake"]()  # The main loop polls the rip this disc may have queued
+        return game
+
+    return probe_pool(session).submit(run)
+
+def probe_pool(session):
+    """Return the thread pool drives are probed on, creating it on first use."""
+    with session["lock"]:
+        if session["probes"] is None:
+            import concurrent.futures
+            session["probes"] = concurrent.futures.ThreadPoolExecutor(max_workers=MAX_PROBE_WORKERS, thread_name_prefix="probe")
+        return session["probes"]
+
+def disc_inserted(session, drive_path):
+    session["seq"] += 1
+    drive_state(session, drive_path)["inserted"] = session["seq"]
+    session["current_drive"] = drive_path
+    start_probe(session, drive_path)
+
+def disc_ejected(session, drive_path):
+    print(f"Disc ejected from {drive_path}. Waiting for new disc...")
+    drive = drive_state(session, drive_path)
+    drive["inserted"] = None
+    drive["last_game_id"] = None
+    if rip_jobs is not None and rip_jobs.cancel(drive_path):
+        print(f"Cancelling the rip of the disc ejected from {drive_path}")
+    if session["launch"]["drive"] != drive_path:
+        return
+    with launch_lock:
+        session["launch"] = {"drive": None, "seq": 0}
+    # Under "first" a disc that was kept waiting now gets its turn, newest first
+    waiting = [(state["inserted"], path) for path, state in session["drives"].items() if state["inserted"] is not None]
+    if LAUNCH_POLICY == "first" and waiting:
+        start_probe(session, max(waiting)[1])
+
+def reload_config(session):
+    """Re-read the title index and rediscover cores without restarting."""
+    session["game_titles"] = load_game_titles()
+    session["cores"] = find_cores()
+    return {"titles": len(session["game_titles"]), "cores": session["cores"]}
+
+def control_status(session, source):
+    return {
+        "uptime": round(time.monotonic() - session["started"]),
+        "drives": {drive: source.present.get(drive, False) for drive in source.drives()},
+        "current_drive": session["current_drive"],
+        "launch_policy": LAUNCH_POLICY,
+        "launched_drive": session["launch"]["drive"],
+        "running_game": running_game,
+        "last_games": {drive: state["last_game_id"] for drive, state in session["drives"].items()},
+        "rips": rip_jobs.status() if rip_jobs is not None else [],
+        "titles": len(session["game_titles"]),
+        "library_files": len(game_library) if game_library is not None else 0,
+        "known_discs": len(launch_cache) if launch_cache is not None else 0,
+        "staged_games": len(staging) if staging is not None else 0,
+        "cores": session["cores"],
+    }
+
+def control_rescan(session, mode="changed"):
+    """Refresh the library index; "full" discards it and lists every folder again."""
+    with session["lock"]:
+        library = get_game_library()
+        if mode == "full":
+            library.rescan()
+        else:
+            library.refresh()
+        return {"library_files": len(library)}
+
+def control_relaunch(session, drive_path=None):
+    """Identify and launch the disc again, even if it is the game already running."""
+    global running_game
+    drive_path = drive_path or session["current_drive"]
+    if not drive_path:
+        raise ValueError("No disc has been inserted")
+    with session["lock"]:
+        running_game = None  # Boot the core afresh even if the disc belongs to the running game
+        probe = start_probe(session, drive_path, relaunch=True)
+    # Wait outside the session lock so disc events keep flowing meanwhile. A launch held
+    # up by a prompt keeps going in the background; the reply just says it is pending.
+    import concurrent.futures
+    try:
+        return {"drive": drive_path, "game": probe.result(timeout=RELAUNCH_WAIT)}
+    except concurrent.futures.TimeoutError:
+        return {"drive": drive_path, "game": None, "pending": True}
+
+def control_rip(session, drive_path=None):
+    """Queue a background rip of the disc; it is launched when the rip completes."""
+    drive_path = drive_path or session["current_drive"]
+    if not drive_path:
+        raise ValueError("No disc has been inserted")
+    try:
+        with iso9660.SectorReader(drive_path) as reader:
+            sectors = disc_classifier.probe(reader)
+            system, game_id = disc_classifier.identify(sectors)
+            version, disc = disc_classifier.title_hints(sectors, system)
+    except OSError as e:
+        raise ValueError(f"Could not read the disc in {drive_path}: {e}")
+    if not game_id:
+        raise ValueError(f"Could not identify the disc in {drive_path}")
+    title = lookup_title(session["game_titles"], system, game_id, version, disc)
+    if title == "Unknown Game":
+        raise ValueError(f"{system} game {game_id} is not in the title index")
+    with session["lock"]:
+        job_id = save_disc(drive_path, title, system, game_id, confirm=False)
+    # The main loop may be asleep waiting for media events; it polls the queue once woken
+    session["wake"]()
+    return {"job": job_id, "drive": drive_path, "system": system, "game_id": game_id, "title": title}
+
+def control_stats(session):
+    return {
+        "launches": len(timing_log.records),
+        "outcomes": {outcome: sum(1 for r in timing_log.records if r["outcome"] == outcome)
+                     for outcome in sorted({r["outcome"] for r in timing_log.records})},
+        "stages": launch_timing.summarize(timing_log.records) if timing_log.records else {},
+    }
+
+def start_control_server(session, source):
+    """Expose the running launcher on the control socket; returns None if the socket is unavailable."""
+    try:
+        server = control_socket.ControlServer(CONTROL_SOCKET_PATH)
+    except (OSError, control_socket.ControlError) as e:
+        print(f"Control socket unavailable ({e}). Continuing without it...")
+        return None
+    server.register("status", lambda: control_status(session, source))
+    server.register("rescan", lambda *args: control_rescan(session, *args))
+    server.register("reload", lambda: reload_config(session))
+    server.register("relaunch", lambda *args: control_relaunch(session, *args))
+    server.register("rip", lambda *args: control_rip(session, *args))
+    server.register("stats", lambda: control_stats(session))
+    server.start()
+    print(f"Listening for control commands on {CONTROL_SOCKET_PATH}")
+    return server
+
+def warm_up(session):
+    """Load what only some discs need once the launcher is already waiting for one."""
+    get_game_library()
+    get_disc_set_index()
+    probe_pool(session)
+
+def main(event_source=None):
+    global game_library
     print("Starting RetroSpin disc launcher on MiSTer...")
-    game_titles = load_game_titles()
+    if control_socket.is_running(CONTROL_SOCKET_PATH):
+        print(f"RetroSpin launcher is already running (see {CONTROL_SOCKET_PATH}). Exiting...")
+        return
+    session = {"started": time.monotonic(), "lock": threading.RLock(), "current_drive": None,
+               "drives": {}, "launch": {"drive": None, "seq": 0}, "seq": 0, "rip_progress": {},
+               "probes": None}
+    reload_config(session)
+    game_library = None  # Loaded by warm_up below
+    load_launch_cache()
+    load_timing_log()
+    load_staging_cache()
     
-    psx_core = find_core("PSX")
-    saturn_core = find_core("SATURN")
-    if not psx_core and not saturn_core:
+    if not any(session["cores"].values()):
         show_popup("No PSX or Saturn cores found in /media/fat/_Console/.")
         print("Cannot proceed without cores. Exiting...")
         return
     
-    last_game_id = None
+    source = event_source or media_events.open_media_event_source()
+    if not source.drives():
+        print("No optical drive detected. Waiting...")
+    session["wake"] = source.wake
+    server = start_control_server(session, source)
+    # The library index is only needed by discs missing from the disc cache, so it loads
+    # while the launcher already waits; such a disc inserted meanwhile waits for it
+    threading.Thread(target=warm_up, args=(session,), name="warm-up", daemon=True).start()
     
-    while True:
-        drive_path = get_optical_drive()
-        if not drive_path:
-            print("No optical drive detected. Waiting...")
-            time.sleep(10)
-            continue
-        
-        print(f"Checking drive {drive_path}...")
-        
-        # Try PSX first
-        psx_game_id = read_psx_game_id(drive_path)
-        if psx_game_id:
-            if (psx_game_id, "PSX") != last_game_id:
-                title = game_titles.get((psx_game_id, "PSX"), "Unknown Game")
-                print(f"Found PSX game: {title} ({psx_game_id})")
-                if psx_core:
-                    launch_game_on_mister(psx_game_id, title, psx_core, "PSX", drive_path)
-                else:
-                    print("No PSX core available to launch game")
-                last_game_id = (psx_game_id, "PSX")
-            else:
-                print(f"PSX game {psx_game_id} already launched. Waiting for new disc...")
-            time.sleep(10)
-            continue
-        
-        # Try Saturn if PSX fails
-        saturn_game_id = read_saturn_game_id(drive_path)
-        if saturn_game_id:
-            if (saturn_game_id, "SATURN") != last_game_id:
-                title = game_titles.get((saturn_game_id, "SATURN"), "Unknown Game")
-                print(f"Found Saturn game: {title} ({saturn_game_id})")
-                if saturn_core:
-                    launch_game_on_mister(saturn_game_id, title, saturn_core, "SATURN", drive_path)
-                else:
-                    print("No Saturn core available to launch game")
-                last_game_id = (saturn_game_id, "SATURN")
-            else:
-                print(f"Saturn game {saturn_game_id} already launched. Waiting for new disc...")
-        else:
-            print("No game detected. Waiting...")
-            last_game_id = None
-        
-        time.sleep(10)
+    try:
+        while True:
+            # Sleeps until the kernel reports a media change; only wakes periodically while rips run
+            ripping = rip_jobs is not None and rip_jobs.active()
+            events = source.wait(RIP_POLL_INTERVAL if ripping else None)
+            with session["lock"]:
+                for event in events:
+                    if event.kind == media_events.INSERTED:
+                        disc_inserted(session, event.drive_path)
+                    elif event.kind == media_events.EJECTED:
+                        disc_ejected(session, event.drive_path)
+                if rip_jobs is not None:
+                    for outcome in rip_jobs.poll():
+                        finish_rip(session, outcome)
+                    report_rip_progress(session)
+    finally:
+        if server:
+            server.close()
+        if session["probes"] is not None:
+            session["probes"].shutdown(wait=False)
+        if rip_jobs is not None:
+            rip_jobs.close()
+        source.close()
+        print("Launch timings this session:")
+        print(timing_log.summary())
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,237 @@
+import os
+import time
+import queue
+import threading
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import chd
+import redump_dat
+import ripper
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Slots of the shared progress array each worker publishes into
+JOB_ID, SECTORS_DONE, TOTAL_SECTORS, BYTES_PER_SECOND, ELAPSED = range(5)
+PROGRESS_FIELDS = 5
+
+SHUTDOWN_TIMEOUT = 5
+
+# The launcher runs threads (control socket, timers), so workers must not be forked from it
+MP = multiprocessing.get_context("spawn")
+
+RipJob = namedtuple("RipJob", ["job_id", "drive_path", "title", "system", "game_id", "output_path", "rip_format", "dat_path",
+                               "compress_workers"])
+RipOutcome = namedtuple("RipOutcome", ["job_id", "state", "game_file", "verdict", "error", "sectors", "elapsed", "bytes_per_second"])
+
+def output_writer(job):
+    if job.rip_format == "chd":
+        return chd.ChdWriter(job.output_path, job.compress_workers)
+    return ripper.BinCueWriter(job.output_path, os.path.splitext(job.output_path)[0] + ".cue")
+
+def map_path(job):
+    """The sector map that makes a rip resumable, beside its output."""
+    return job.output_path + ripper.MAP_SUFFIX
+
+def part_path(job):
+    """The file a rip writes until it is complete; both writers use the same suffix."""
+    return job.output_path + ripper.PART_SUFFIX
+
+def load_dat(dat_path):
+    return redump_dat.RomHashIndex(dat_path) if dat_path else None
+
+def run_job(job, progress, cancel):
+    """Rip one disc in the worker process and return its RipOutcome."""
+    try:
+        writer = output_writer(job)
+    except Exception as e:
+        return RipOutcome(job.job_id, FAILED, None, None, str(e), 0, 0, 0)
+    # Parse the Redump DAT while the drive is busy so verification costs nothing extra
+    executor = ThreadPoolExecutor(max_workers=1)
+    dat_future = executor.submit(load_dat, job.dat_path)
+
+    def publish(p):
+        with progress.get_lock():
+            progress[SECTORS_DONE] = p.sectors_done
+            progress[TOTAL_SECTORS] = p.total_sectors
+            progress[BYTES_PER_SECOND] = p.bytes_per_second
+            progress[ELAPSED] = p.elapsed
+
+    try:
+        with ripper.SgioSectorSource(job.drive_path) as source:
+            result = ripper.rip_disc(source, writer, progress=publish, cancel=cancel, map_path=map_path(job))
+    except Exception as e:
+        # Already done by rip_disc unless the drive could not be opened. The output only
+        # appears once complete; its part file and sector map stay, so ripping the disc
+        # again resumes where this attempt stopped.
+        writer.abort(keep=True)
+        # No DAT load may outlive its job into the next one
+        executor.shutdown(wait=True, cancel_futures=True)
+        state = CANCELLED if isinstance(e, ripper.RipCancelled) else FAILED
+        return RipOutcome(job.job_id, state, None, None, str(e), int(progress[SECTORS_DONE]), progress[ELAPSED], 0)
+
+    try:
+        redump_index = dat_future.result()
+        if redump_index is None:
+            verdict = {"verdict": redump_dat.NO_DAT, "dat_game": None}
+        else:
+            verdict = redump_index.verify(result.track_hashes, job.title)
+        if result.unreadable:
+            verdict["unreadable_sectors"] = result.unreadable
+        redump_dat.write_verification(result.game_file, verdict, result.track_hashes)
+    except Exception as e:
+        verdict = {"verdict": redump_dat.UNKNOWN, "dat_game": None, "error": str(e)}
+    finally:
+        executor.shutdown(wait=True)
+    return RipOutcome(job.job_id, DONE, result.game_file, verdict, None, result.sectors, result.elapsed, result.bytes_per_second)
+
+def worker_main(jobs, results, progress, cancel):
+    """Worker process loop: rip jobs one after another until a None job arrives."""
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        cancel.clear()
+        with progress.get_lock():
+            progress[:] = [job.job_id, 0, 0, 0, 0]
+        try:
+            outcome = run_job(job, progress, cancel)
+        except Exception as e:
+            outcome = RipOutcome(job.job_id, FAILED, None, None, str(e), 0, 0, 0)
+        with progress.get_lock():
+            progress[JOB_ID] = 0
+        results.put(outcome)
+
+class RipWorker:
+    """A worker process that rips the jobs queued for one drive, publishing progress in shared memory."""
+
+    def __init__(self, results):
+        self.jobs = MP.Queue()
+        self.progress = MP.Array('d', PROGRESS_FIELDS)
+        self.cancel = MP.Event()
+        # Not a daemon: the CHD writer starts its own compression pool inside the worker
+        self.process = MP.Process(target=worker_main, args=(self.jobs, results, self.progress, self.cancel),
+                                               name="rip-worker")
+        self.process.start()
+
+    def running_job(self):
+        with self.progress.get_lock():
+            return int(self.progress[JOB_ID]) or None
+
+    def snapshot(self):
+        with self.progress.get_lock():
+            return list(self.progress)
+
+    def close(self):
+        self.cancel.set()
+        self.jobs.put(None)
+        self.process.join(SHUTDOWN_TIMEOUT)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+
+class RipQueue:
+    """Queue rips to per-drive worker processes so the launcher keeps handling discs meanwhile.
+
+    Each drive has its own worker, so discs in different drives rip concurrently.
+    """
+
+    def __init__(self):
+        self.results = MP.Queue()
+        self.workers = {}  # drive path -> RipWorker
+        self.jobs = {}     # job id -> {"job": RipJob, "state": ..., "submitted": ...}
+        self.next_id = 1
+        self.lock = threading.RLock()  # Jobs are submitted from the probe threads of several drives
+
+    def submit(self, drive_path, title, system, game_id, output_path, rip_format, dat_path=None):
+        """Queue a rip and return its job id."""
+        with self.lock:
+            if drive_path not in self.workers:
+                self.workers[drive_path] = RipWorker(self.results)
+            # Drives rip in parallel, so each one's CHD compression gets an equal share of the cores
+            compress_workers = max(1, (os.cpu_count() or 1) // len(self.workers))
+            job = RipJob(self.next_id, drive_path, title, system, game_id, output_path, rip_format, dat_path, compress_workers)
+            self.next_id += 1
+            self.jobs[job.job_id] = {"job": job, "state": QUEUED, "submitted": time.monotonic()}
+            self.workers[drive_path].jobs.put(job)
+            return job.job_id
+
+    def active(self):
+        with self.lock:
+            return any(info["state"] in (QUEUED, RUNNING) for info in self.jobs.values())
+
+    def pending(self, drive_path):
+        """Return the id of an unfinished job for drive_path, or None."""
+        with self.lock:
+            for job_id, info in self.jobs.items():
+                if info["job"].drive_path == drive_path and info["state"] in (QUEUED, RUNNING) and not info.get("cancel"):
+                    return job_id
+            return None
+
+    def cancel(self, drive_path):
+        """Cancel every unfinished job for a drive, e.g. because its disc was ejected."""
+        with self.lock:
+            cancelled = []
+            for job_id, info in self.jobs.items():
+                if info["job"].drive_path == drive_path and info["state"] in (QUEUED, RUNNING):
+                    info["cancel"] = True
+                    cancelled.append(job_id)
+            self.signal_cancels()
+            return cancelled
+
+    def signal_cancels(self):
+        # A queued job can only be stopped once its worker picks it up
+        for drive_path, worker in self.workers.items():
+            job_id = worker.running_job()
+            if job_id and self.jobs.get(job_id, {}).get("cancel"):
+                worker.cancel.set()
+
+    def poll(self):
+        """Update job states; return the RipOutcomes of jobs that finished since the last poll."""
+        with self.lock:
+            self.signal_cancels()
+            for worker in self.workers.values():
+                job_id = worker.running_job()
+                if job_id and self.jobs[job_id]["state"] == QUEUED:
+                    self.jobs[job_id]["state"] = RUNNING
+            finished = []
+            while True:
+                try:
+                    outcome = self.results.get_nowait()
+                except queue.Empty:
+                    return finished
+                self.jobs[outcome.job_id]["state"] = outcome.state
+                self.jobs[outcome.job_id]["outcome"] = outcome
+                finished.append(outcome)
+
+    def status(self):
+        """JSON-friendly view of every job, with live progress for the running ones."""
+        with self.lock:
+            running = {}
+            for worker in self.workers.values():
+                job_id, done, total, rate, elapsed = worker.snapshot()
+                if job_id:
+                    running[int(job_id)] = {"sectors_done": int(done), "total_sectors": int(total),
+                                            "percent": int(done * 100 // total) if total else 0,
+                                            "mb_per_second": round(rate / (1024 * 1024), 2), "elapsed": round(elapsed, 1)}
+            jobs = []
+            for job_id, info in sorted(self.jobs.items()):
+                job = info["job"]
+                entry = {"id": job_id, "drive": job.drive_path, "title": job.title, "system": job.system,
+                         "state": info["state"], "output": job.output_path}
+                entry.update(running.get(job_id, {}))
+                if "outcome" in info:
+                    entry.update(game_file=info["outcome"].game_file, verdict=info["outcome"].verdict, error=info["outcome"].error)
+                jobs.append(entry)
+            return jobs
+
+    def close(self):
+        for worker in self.workers.values():
+            worker.close()
+        self.workers = {}
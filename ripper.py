@@ -0,0 +1,531 @@
+import os
+import json
+import time
+import zlib
+import hashlib
+import queue
+import ctypes
+import fcntl
+import threading
+from collections import namedtuple
+
+import cdrom
+
+RAW_SECTOR_SIZE = 2352
+SECTORS_PER_SECOND = 75
+PREGAP_SECTORS = 150      # Mandatory 2 second pregap when a data track is followed by audio
+DEFAULT_BATCH_SECTORS = 26
+MAX_BATCH_SECTORS = 432   # About 1 MB per READ CD command
+QUEUE_DEPTH = 2           # Double buffering: one batch being written while the next is read
+
+# Rips stream into the output's part file in disc order. A map beside the output records
+# how many leading sectors the part file holds durably, so an interrupted rip reopens it
+# there and only reads the sectors after that point from the disc again. An unreadable
+# sector stops the rip there, so the next attempt (after cleaning the disc, say) starts
+# by retrying it; once it has failed MAX_SECTOR_FAILURES reads over all attempts it is
+# zero-filled instead and reported in the RipResult, so a damaged disc still finishes.
+MAP_SUFFIX = ".map"
+MAP_VERSION = 3
+PART_SUFFIX = ".part"
+CHECKPOINT_INTERVAL = 2.0  # Seconds between syncing the part file and saving the map
+SECTOR_RETRIES = 3         # Reads of a failing sector per attempt
+MAX_SECTOR_FAILURES = 6    # Failed reads over all attempts before a sector is zero-filled
+FINGERPRINT_SECTORS = 17   # Up to and including the ISO9660 primary volume descriptor
+
+# SG_IO READ CD (MMC-3 0xBE)
+SG_IO = 0x2285
+SG_INTERFACE_ID = ord('S')
+SG_DXFER_FROM_DEV = -3
+SG_TIMEOUT_MS = 30000
+SENSE_BUFFER_SIZE = 32
+READ_CD = 0xBE
+READ_CD_DATA_FLAGS = 0xF8   # Sync, all headers, user data and EDC/ECC: the full 2352-byte sector
+READ_CD_AUDIO_FLAGS = 0x10  # CD-DA sectors are all user data
+
+Track = namedtuple("Track", ["number", "mode", "pregap_start", "start", "end"])
+RipProgress = namedtuple("RipProgress", ["sectors_done", "total_sectors", "elapsed", "bytes_per_second"])
+RipResult = namedtuple("RipResult", ["game_file", "sectors", "elapsed", "bytes_per_second", "track_hashes", "unreadable"])
+
+class RipError(Exception):
+    pass
+
+class RipCancelled(RipError):
+    pass
+
+class RipIncomplete(RipError):
+    """A sector stayed unreadable; the part file and its map are kept for the next attempt."""
+
+class SgIoHeader(ctypes.Structure):
+    """struct sg_io_hdr from <scsi/sg.h>; ctypes lays it out for the running ABI."""
+    _fields_ = [
+        ("interface_id", ctypes.c_int),
+        ("dxfer_direction", ctypes.c_int),
+        ("cmd_len", ctypes.c_ubyte),
+        ("mx_sb_len", ctypes.c_ubyte),
+        ("iovec_count", ctypes.c_ushort),
+        ("dxfer_len", ctypes.c_uint),
+        ("dxferp", ctypes.c_void_p),
+        ("cmdp", ctypes.c_void_p),
+        ("sbp", ctypes.c_void_p),
+        ("timeout", ctypes.c_uint),
+        ("flags", ctypes.c_uint),
+        ("pack_id", ctypes.c_int),
+        ("usr_ptr", ctypes.c_void_p),
+        ("status", ctypes.c_ubyte),
+        ("masked_status", ctypes.c_ubyte),
+        ("msg_status", ctypes.c_ubyte),
+        ("sb_len_wr", ctypes.c_ubyte),
+        ("host_status", ctypes.c_ushort),
+        ("driver_status", ctypes.c_ushort),
+        ("resid", ctypes.c_int),
+        ("duration", ctypes.c_uint),
+        ("info", ctypes.c_uint),
+    ]
+
+class RawSectorSource:
+    """Interface for anything that can return raw 2352-byte sectors and a TOC."""
+
+    def read(self, lba, count, audio=False):
+        """Return count raw sectors starting at lba."""
+        raise NotImplementedError
+
+    def toc(self):
+        """Return [(track number, is_data, start lba), ...] ending with the lead-out."""
+        raise NotImplementedError
+
+    def batch_sectors(self):
+        """Return the largest number of sectors worth requesting in one read."""
+        return MAX_BATCH_SECTORS
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class SgioSectorSource(RawSectorSource):
+    """Read raw sectors from an optical drive with SG_IO READ CD commands."""
+
+    def __init__(self, drive_path):
+        self.drive_path = drive_path
+        self.fd = os.open(drive_path, os.O_RDONLY | os.O_NONBLOCK)
+        self.sense = ctypes.create_string_buffer(SENSE_BUFFER_SIZE)
+
+    def read(self, lba, count, audio=False):
+        buf = ctypes.create_string_buffer(count * RAW_SECTOR_SIZE)
+        cdb = (ctypes.c_ubyte * 12)(
+            READ_CD, 0x00,
+            (lba >> 24) & 0xFF, (lba >> 16) & 0xFF, (lba >> 8) & 0xFF, lba & 0xFF,
+            (count >> 16) & 0xFF, (count >> 8) & 0xFF, count & 0xFF,
+            READ_CD_AUDIO_FLAGS if audio else READ_CD_DATA_FLAGS, 0x00, 0x00)
+        hdr = SgIoHeader(
+            interface_id=SG_INTERFACE_ID,
+            dxfer_direction=SG_DXFER_FROM_DEV,
+            cmd_len=len(cdb),
+            mx_sb_len=SENSE_BUFFER_SIZE,
+            dxfer_len=len(buf),
+            dxferp=ctypes.cast(buf, ctypes.c_void_p),
+            cmdp=ctypes.cast(cdb, ctypes.c_void_p),
+            sbp=ctypes.cast(self.sense, ctypes.c_void_p),
+            timeout=SG_TIMEOUT_MS)
+        try:
+            fcntl.ioctl(self.fd, SG_IO, hdr)
+        except OSError as e:
+            raise RipError(f"SG_IO failed at sector {lba}: {e}")
+        if hdr.status or hdr.host_status or (hdr.driver_status & 0x0F):
+            sense_key = self.sense.raw[2] & 0x0F if hdr.sb_len_wr > 2 else None
+            raise RipError(f"READ CD failed at sector {lba} (status {hdr.status}, sense key {sense_key})")
+        return buf.raw[:len(buf) - hdr.resid]
+
+    def toc(self):
+        toc = cdrom.read_toc(self.drive_path)
+        if not toc:
+            raise RipError(f"Could not read the TOC of {self.drive_path}")
+        return toc
+
+    def batch_sectors(self):
+        """Stay within the block queue's transfer limit so SG_IO requests are not rejected."""
+        name = os.path.basename(self.drive_path)
+        try:
+            with open(f"/sys/block/{name}/queue/max_sectors_kb", 'r') as f:
+                limit = int(f.read().strip()) * 1024 // RAW_SECTOR_SIZE
+            return max(1, min(MAX_BATCH_SECTORS, limit))
+        except (OSError, ValueError):
+            return DEFAULT_BATCH_SECTORS
+
+    def close(self):
+        os.close(self.fd)
+
+class ImageSectorSource(RawSectorSource):
+    """Serve raw sectors from a .bin image, standing in for a drive in tests and benchmarks."""
+
+    def __init__(self, image_path, toc=None):
+        self.f = open(image_path, 'rb')
+        total = os.fstat(self.f.fileno()).st_size // RAW_SECTOR_SIZE
+        self.table = toc or [(1, True, 0), (cdrom.CDROM_LEADOUT, False, total)]
+
+    def read(self, lba, count, audio=False):
+        self.f.seek(lba * RAW_SECTOR_SIZE)
+        data = self.f.read(count * RAW_SECTOR_SIZE)
+        if len(data) != count * RAW_SECTOR_SIZE:
+            raise RipError(f"Short read at sector {lba}")
+        return data
+
+    def toc(self):
+        return self.table
+
+    def close(self):
+        self.f.close()
+
+def build_tracks(source):
+    """Turn the TOC into Track records, reading one sector per data track to find its mode."""
+    toc = source.toc()
+    tracks = []
+    for (number, is_data, start), (_, _, end) in zip(toc, toc[1:]):
+        if is_data:
+            header = source.read(start, 1)
+            mode = "MODE2/2352" if header[15] == 2 else "MODE1/2352"
+        else:
+            mode = "AUDIO"
+        pregap_start = start
+        if mode == "AUDIO" and tracks and tracks[-1].mode != "AUDIO":
+            pregap_start = max(tracks[-1].start, start - PREGAP_SECTORS)
+        tracks.append(Track(number, mode, pregap_start, start, end))
+    if not tracks:
+        raise RipError("Disc has no tracks")
+    return tracks
+
+def msf(lba):
+    """Format a sector count as a cue sheet mm:ss:ff timestamp."""
+    minutes, rest = divmod(lba, 60 * SECTORS_PER_SECOND)
+    seconds, frames = divmod(rest, SECTORS_PER_SECOND)
+    return f"{minutes:02d}:{seconds:02d}:{frames:02d}"
+
+def cue_sheet(bin_name, tracks):
+    """Return a single-file cue sheet for tracks stored back to back in bin_name."""
+    lines = [f'FILE "{bin_name}" BINARY']
+    first = tracks[0].start
+    for track in tracks:
+        lines.append(f"  TRACK {track.number:02d} {track.mode}")
+        if track.pregap_start != track.start:
+            lines.append(f"    INDEX 00 {msf(track.pregap_start - first)}")
+        lines.append(f"    INDEX 01 {msf(track.start - first)}")
+    return "\n".join(lines) + "\n"
+
+class TrackHasher:
+    """CRC32, MD5 and SHA-1 of each track as Redump splits them, fed from the sector stream."""
+
+    def __init__(self, tracks):
+        # Redump track files start at INDEX 00, so a pregap belongs to the track after it
+        self.bounds = [t.pregap_start for t in tracks] + [tracks[-1].end]
+        self.crcs = [0] * len(tracks)
+        self.md5s = [hashlib.md5() for _ in tracks]
+        self.sha1s = [hashlib.sha1() for _ in tracks]
+        self.sizes = [0] * len(tracks)
+        self.audio = [t.mode == "AUDIO" for t in tracks]
+        self.track = 0
+
+    def update(self, lba, data):
+        view = memoryview(data)
+        while len(view):
+            while lba >= self.bounds[self.track + 1]:
+                self.track += 1
+            count = min(len(view) // RAW_SECTOR_SIZE, self.bounds[self.track + 1] - lba)
+            part, view = view[:count * RAW_SECTOR_SIZE], view[count * RAW_SECTOR_SIZE:]
+            self.crcs[self.track] = zlib.crc32(part, self.crcs[self.track])
+            self.md5s[self.track].update(part)
+            self.sha1s[self.track].update(part)
+            self.sizes[self.track] += len(part)
+            lba += count
+
+    def results(self):
+        return [{"size": size, "crc": f"{crc:08x}", "md5": md5.hexdigest(), "sha1": sha1.hexdigest(), "audio": audio}
+                for size, crc, md5, sha1, audio in zip(self.sizes, self.crcs, self.md5s, self.sha1s, self.audio)]
+
+class BinCueWriter:
+    """Write a rip as one raw .bin holding every track plus a matching .cue sheet."""
+
+    def __init__(self, bin_path, cue_path):
+        self.bin_path = bin_path
+        self.part_path = bin_path + PART_SUFFIX
+        self.cue_path = cue_path
+        self.out = None
+        self.tracks = None
+
+    def begin(self, tracks):
+        self.tracks = tracks
+        self.out = open(self.part_path, 'wb')
+
+    def write(self, data):
+        self.out.write(data)
+
+    def checkpoint(self):
+        """Make everything written so far durable; return (sectors held, state for resume)."""
+        self.out.flush()
+        os.fdatasync(self.out.fileno())
+        offset = self.out.tell()
+        return offset // RAW_SECTOR_SIZE, {"offset": offset}
+
+    def resume(self, tracks, state):
+        """Reopen the part file at a checkpoint and yield the sectors it holds, for hashing."""
+        self.tracks = tracks
+        self.out = open(self.part_path, 'r+b')
+        offset = state["offset"]
+        if os.fstat(self.out.fileno()).st_size < offset:
+            raise RipError(f"{self.part_path} is shorter than its checkpoint")
+        self.out.truncate(offset)
+        while self.out.tell() < offset:
+            yield self.out.read(min(MAX_BATCH_SECTORS * RAW_SECTOR_SIZE, offset - self.out.tell()))
+
+    def finish(self):
+        """Close the image and return the path to launch."""
+        self.out.close()
+        self.out = None
+        os.replace(self.part_path, self.bin_path)
+        with open(self.cue_path, 'w', encoding='utf-8') as f:
+            f.write(cue_sheet(os.path.basename(self.bin_path), self.tracks))
+        return self.cue_path
+
+    def abort(self, keep=False):
+        """Close the image; keep leaves the part file for a resumed rip."""
+        if self.out:
+            self.out.close()
+            self.out = None
+        if not keep:
+            try:
+                os.remove(self.part_path)
+            except OSError:
+                pass
+
+class SectorMap:
+    """How much of a resumable rip's part file is held durably, saved beside its output.
+
+    state is the writer's own record of the checkpoint (see the writers' checkpoint()).
+    failures counts the failed reads of each unreadable sector over every attempt.
+    """
+
+    def __init__(self, map_path, fingerprint, total):
+        self.map_path = map_path
+        self.fingerprint = fingerprint
+        self.total = total
+        self.done = 0
+        self.state = None
+        self.failures = {}  # {lba: failed reads over every attempt}
+        self.resumed = self.load()
+
+    def load(self):
+        """Adopt the saved map if it belongs to the same disc; return whether it did."""
+        try:
+            with open(self.map_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if (data.get("version"), data.get("fingerprint"), data.get("total")) != (MAP_VERSION, self.fingerprint, self.total):
+                return False
+            done, state = int(data["done"]), data["state"]
+            failures = {int(lba): int(count) for lba, count in data.get("failures", {}).items()}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return False
+        if state is None or not 0 <= done <= self.total:
+            return False
+        self.done, self.state, self.failures = done, state, failures
+        return True
+
+    def save(self):
+        data = {"version": MAP_VERSION, "fingerprint": self.fingerprint, "total": self.total,
+                "done": self.done, "state": self.state, "failures": self.failures}
+        tmp_path = self.map_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.map_path)
+
+    def set_done(self, count, state):
+        """Record that the first count sectors are held, as described by the writer's state."""
+        self.done = count
+        self.state = state
+
+    def fail(self, lba):
+        self.failures[lba] = self.failures.get(lba, 0) + SECTOR_RETRIES
+
+    def exhausted(self, lba):
+        """Whether one more failed attempt at lba uses up MAX_SECTOR_FAILURES."""
+        return self.failures.get(lba, 0) + SECTOR_RETRIES >= MAX_SECTOR_FAILURES
+
+    def remove(self):
+        try:
+            os.remove(self.map_path)
+        except OSError:
+            pass
+
+def disc_fingerprint(source, tracks):
+    """Identify a disc by its track layout and first sectors, to match a rip to its part file."""
+    h = hashlib.sha1()
+    for track in tracks:
+        h.update(f"{track.number}:{track.mode}:{track.pregap_start}:{track.start}:{track.end};".encode('ascii'))
+    first = tracks[0]
+    h.update(read_sectors(source, first.start, min(FINGERPRINT_SECTORS, first.end - first.start), first.mode == "AUDIO"))
+    return h.hexdigest()
+
+def read_sectors(source, lba, count, audio):
+    try:
+        return source.read(lba, count, audio=audio)
+    except RipError:
+        # Transition pregaps may be encoded differently from the track around them
+        return source.read(lba, count, audio=not audio)
+
+def read_batches(source, tracks, batch, out_queue, cancel, stop, start=None, skip=None):
+    """Reader thread: push (lba, data) batches from sector start on, then None.
+
+    A batch that fails is read again one sector at a time; a sector still unreadable
+    after SECTOR_RETRIES reads is pushed as (lba, None). The stream then ends, unless
+    skip(lba) says the sector is given up on and reading goes on past it. Any other
+    exception is pushed as is.
+    """
+    try:
+        for track in tracks:
+            audio = track.mode == "AUDIO"
+            lba = track.start if start is None else max(track.start, start)
+            while lba < track.end:
+                if stop.is_set():
+                    return
+                if cancel is not None and cancel.is_set():
+                    raise RipCancelled("Rip cancelled")
+                count = min(batch, track.end - lba)
+                try:
+                    out_queue.put((lba, read_sectors(source, lba, count, audio)))
+                    lba += count
+                    continue
+                except RipError:
+                    pass
+                # Narrow a failed batch down to the sectors that are actually bad
+                for sector in range(lba, lba + count):
+                    data = None
+                    for _ in range(SECTOR_RETRIES):
+                        try:
+                            data = read_sectors(source, sector, 1, audio)
+                            break
+                        except RipError:
+                            pass
+                    out_queue.put((sector, data))
+                    if data is None and not (skip and skip(sector)):
+                        return
+                lba += count
+        out_queue.put(None)
+    except Exception as e:
+        out_queue.put(e)
+
+def save_checkpoint(writer, sector_map):
+    """Sync the writer's part file, then record in the map how much of it is held."""
+    sectors, state = writer.checkpoint()
+    sector_map.set_done(sectors, state)
+    sector_map.save()
+
+def rip_disc(source, writer, progress=None, cancel=None, map_path=None):
+    """Copy every sector of source into writer and return a RipResult.
+
+    Reads run on a separate thread so the drive keeps streaming while the
+    previous batch is handed to the writer and hashed per track. progress,
+    if given, is called with a RipProgress after every batch.
+
+    With map_path the rip is resumable: the writer is checkpointed into that map as
+    it goes, and if the rip stops (cancelled, an unreadable sector, an error) its part
+    file is kept. The next rip of the same disc hashes what the part file already holds
+    and reads the disc only from where the last attempt stopped. Without map_path an
+    unreadable sector cannot be retried later, so it is zero-filled straight away.
+    RipResult.unreadable lists the zero-filled sectors.
+    """
+    tracks = build_tracks(source)
+    first = tracks[0].start
+    total = tracks[-1].end - first
+    hasher = TrackHasher(tracks)
+    sector_map = SectorMap(map_path, disc_fingerprint(source, tracks), total) if map_path else None
+    started = time.monotonic()
+    done = 0
+    unreadable = []
+    skip = sector_map.exhausted if sector_map is not None else lambda lba: True
+
+    def report(read):
+        if progress:
+            elapsed = time.monotonic() - started
+            progress(RipProgress(done, total, elapsed, read * RAW_SECTOR_SIZE / elapsed if elapsed else 0))
+
+    resumed = sector_map is not None and sector_map.resumed
+    if resumed:
+        print(f"Resuming rip: {sector_map.done}/{total} sectors already saved")
+        try:
+            for data in writer.resume(tracks, sector_map.state):
+                if cancel is not None and cancel.is_set():
+                    raise RipCancelled("Rip cancelled")
+                hasher.update(first + done, data)
+                done += len(data) // RAW_SECTOR_SIZE
+                report(0)
+            unreadable = sorted(lba for lba, count in sector_map.failures.items()
+                                if count >= MAX_SECTOR_FAILURES and lba < first + done)
+        except RipCancelled:
+            writer.abort(keep=True)
+            raise
+        except (OSError, RipError, ValueError, zlib.error) as e:
+            print(f"Cannot resume the rip ({e}); starting over")
+            resumed = False
+    if not resumed:
+        hasher = TrackHasher(tracks)
+        done = 0
+        unreadable = []
+        writer.begin(tracks)
+
+    batches = queue.Queue(maxsize=QUEUE_DEPTH)
+    stop = threading.Event()
+    reader = threading.Thread(target=read_batches, args=(source, tracks, source.batch_sectors(), batches, cancel, stop,
+                                                        first + done, skip), daemon=True)
+    read = 0
+    last_checkpoint = time.monotonic()
+    reader.start()
+    try:
+        while True:
+            item = batches.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+            lba, data = item
+            if data is None:
+                give_up = skip(lba)  # Decided before fail() counts this attempt, as the reader did
+                if sector_map is not None:
+                    sector_map.fail(lba)
+                if not give_up:
+                    raise RipIncomplete(f"Sector {lba} unreadable after {SECTOR_RETRIES} reads; "
+                                        f"rip again to retry from there")
+                print(f"Sector {lba} still unreadable; zero-filling it")
+                unreadable.append(lba)
+                data = bytes(RAW_SECTOR_SIZE)
+            writer.write(data)
+            hasher.update(lba, data)
+            done += len(data) // RAW_SECTOR_SIZE
+            read += len(data) // RAW_SECTOR_SIZE
+            if sector_map is not None and time.monotonic() - last_checkpoint >= CHECKPOINT_INTERVAL:
+                save_checkpoint(writer, sector_map)
+                last_checkpoint = time.monotonic()
+            report(read)
+        game_file = writer.finish()
+    except BaseException:
+        if sector_map is not None:
+            try:
+                save_checkpoint(writer, sector_map)
+            except Exception as e:
+                print(f"Could not checkpoint the interrupted rip: {e}")
+        writer.abort(keep=sector_map is not None)
+        raise
+    finally:
+        stop.set()
+        while reader.is_alive():
+            # Unblock a reader waiting on a full queue after a write failure
+            try:
+                batches.get(timeout=0.1)
+            except queue.Empty:
+                pass
+    if sector_map is not None:
+        sector_map.remove()
+    elapsed = time.monotonic() - started
+    return RipResult(game_file, done, elapsed, read * RAW_SECTOR_SIZE / elapsed if elapsed else 0, hasher.results(),
+                     unreadable)
@@ -1,34 +1,32 @@
-import requests
 from bs4 import BeautifulSoup
-import csv
 import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import games_db
+import game_ids
+from http_cache import CachedFetcher
 
 URL = "https://elephantflea.pw/2024/07/sega-saturn-game-ids"
-CSV_FILE = "games.csv"
-
-# Initialize CSV file with header if it doesn't exist
-if not os.path.exists(CSV_FILE):
-    with open(CSV_FILE, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow(["ID", "Title", "Region", "System"])
-
-# Scrape the website
-response = requests.get(URL)
-soup = BeautifulSoup(response.content, "html.parser")
-table = soup.find("table")
-rows = table.find_all("tr")[1:]  # Skip header
-
-# Append all entries, including duplicate IDs
-with open(CSV_FILE, 'a', newline='', encoding='utf-8') as f:
-    writer = csv.writer(f)
+
+def parse_games(html):
+    """Return (game_id, title, region, system, language, version) rows from the Saturn ID table."""
+    soup = BeautifulSoup(html, "html.parser")
+    table = soup.find("table")
+    rows = table.find_all("tr")[1:]  # Skip header
+    games = []
     for row in rows:
         cols = row.find_all("td")
         if len(cols) >= 2:
             title = cols[0].text.strip()    # e.g., "Tokimeki Memorial Drama Series Vol. 1 - Nijiiro no Seishun (Japan) (Demo)"
             full_id = cols[1].text.strip()  # e.g., "6106663   V1.000"
-            game_id = full_id.split()[0]    # Take first part, e.g., "6106663"
+            if not full_id:
+                continue
+            game_id, version = games_db.split_version(full_id)  # e.g., ("6106663", "V1.000")
+            game_id = game_ids.normalize(game_id)  # Canonical, so games.csv keys match the IDs read off discs
             system = "SATURN"
-            
+
             # Determine region from title
             if "(Japan)" in title:
                 region = "NTSC-J"
@@ -38,9 +36,29 @@ with open(CSV_FILE, 'a', newline='', encoding='utf-8') as f:
                 region = "PAL"
             else:
                 region = "Unknown"
-            
-            # Write every entry, even if ID duplicates
-            writer.writerow([game_id, title, region, system])
-            print(f"Added: {game_id}, {title}, {region}, {system}")
+            games.append((game_id, title, region, system, "", version))
+    return games
+
+def scrape_games(fetcher):
+    """Fetch (or revalidate) the ID table and return the parsed rows."""
+    html = fetcher.fetch(URL)
+    start = time.perf_counter()
+    games = parse_games(html)
+    print(f"Parsed {len(games)} Saturn entries in {time.perf_counter() - start:.2f}s")
+    return games
+
+def main():
+    # --replay parses the page saved in the scrape cache without touching the network
+    fetcher = CachedFetcher(replay="--replay" in sys.argv[1:])
+    games = scrape_games(fetcher)
+    fetcher.close()
+    print(f"Page fetched: {fetcher.stats['fetched']}, unchanged: {fetcher.stats['not_modified']}, replayed: {fetcher.stats['replayed']}")
+
+    # Rows are keyed by (ID, system, version, disc), so re-running refreshes entries instead of duplicating them
+    conn = games_db.connect()
+    games_db.upsert_games(conn, games)
+    conn.close()
+    print(f"Upserted {len(games)} Saturn games. Run build_games.py to regenerate games.csv and games.idx.")
 
-print("Scraping complete")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -81,7 +81,10 @@ if [ $RESPONSE -eq 0 ]; then  # Yes
     
     # Prompt user to close and restart launcher
     dialog --msgbox "$FINAL_MESSAGE" 10 50
-    /media/fat/Scripts/retrospin.sh  # Updated to retrospin.sh
+    # A running launcher picks up the new image in-process; only start one if none is running
+    if ! python3 /media/fat/Scripts/control_socket.py rescan > /dev/null 2>&1; then
+        /media/fat/Scripts/retrospin.sh
+    fi
 else
     echo "User declined to save disc image"
 fi
\ No newline at end of file
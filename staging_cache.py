@@ -0,0 +1,244 @@
+import os
+import re
+import sys
+import json
+import errno
+import time
+import shutil
+import hashlib
+import threading
+
+# Copies of games from slow storage (USB sticks) kept on a faster target such as the SD
+# card or a tmpfs, so the core streams the image from there. Entries are evicted by
+# recency weighted with play count until the set fits the size budget.
+INDEX_NAME = "staging.json"
+INDEX_VERSION = 1
+DEFAULT_BUDGET = 8 * 1024 ** 3
+FREE_SPACE_RESERVE = 256 * 1024 ** 2  # Never fill the target past this much free space
+HIT_WEIGHT = 24 * 60 * 60  # Each earlier launch counts as this many seconds of recency
+MAX_COUNTED_HITS = 7
+COPY_CHUNK = 64 * 1024 * 1024
+FALLBACK_ERRNOS = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.EBADF}
+CUE_FILE_PATTERN = re.compile(r'^\s*FILE\s+"?([^"]+?)"?\s+\S+\s*$', re.IGNORECASE | re.MULTILINE)
+
+def game_files(game_file):
+    """Return game_file plus every track file its cue sheet references."""
+    files = [game_file]
+    if game_file.lower().endswith(".cue"):
+        with open(game_file, 'r', encoding='utf-8', errors='replace') as f:
+            base_dir = os.path.dirname(game_file)
+            files += [os.path.join(base_dir, name) for name in CUE_FILE_PATTERN.findall(f.read())]
+    return files
+
+def copy_file(src, dst):
+    """Copy src to dst inside the kernel: copy_file_range, else sendfile, else a buffered copy."""
+    with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+        size = os.fstat(fin.fileno()).st_size
+        for copy in (copy_range, send_file):
+            try:
+                copy(fin.fileno(), fout.fileno(), size)
+                return copy.__name__
+            except OSError as e:
+                if e.errno not in FALLBACK_ERRNOS:
+                    raise
+                # Not supported between these filesystems; start over with the next method
+                fout.truncate(0)
+                os.lseek(fout.fileno(), 0, os.SEEK_SET)
+        shutil.copyfileobj(fin, fout, COPY_CHUNK)
+        return "copyfileobj"
+
+def copy_range(fd_in, fd_out, size):
+    offset = 0
+    while offset < size:
+        copied = os.copy_file_range(fd_in, fd_out, min(size - offset, COPY_CHUNK), offset, offset)
+        if copied == 0:
+            break  # Source shrank while copying
+        offset += copied
+
+def send_file(fd_in, fd_out, size):
+    offset = 0
+    while offset < size:
+        sent = os.sendfile(fd_out, fd_in, offset, min(size - offset, COPY_CHUNK))
+        if sent == 0:
+            break
+        offset += sent
+
+def source_signature(files):
+    """Sizes and mtimes of a game's files, to notice when the original changes."""
+    signature = []
+    for path in files:
+        st = os.stat(path)
+        signature.append([st.st_size, st.st_mtime_ns])
+    return signature
+
+class StagingCache:
+    """Persistent size-bounded cache of game files copied to fast storage."""
+
+    def __init__(self, cache_dir, budget=DEFAULT_BUDGET):
+        self.cache_dir = cache_dir
+        self.budget = budget
+        self.index_path = os.path.join(cache_dir, INDEX_NAME)
+        self.entries = {}  # {source game file: {"staged", "files", "signature", "size", "hits", "last_used"}}
+        self.lock = threading.RLock()
+        self.pending = set()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                self.entries = data["entries"]
+        except (OSError, ValueError, KeyError):
+            self.entries = {}
+        # A tmpfs target comes back empty after a reboot
+        for source, entry in list(self.entries.items()):
+            if not all(os.path.exists(path) for path in entry["files"]):
+                self.remove(source, save=False)
+
+    def save(self):
+        tmp_path = self.index_path + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": INDEX_VERSION, "entries": self.entries}, f)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"Failed to save staging index to {self.index_path}: {e}")
+
+    def staged_dir(self, source):
+        # One directory per source folder keeps cue sheets' relative track names valid
+        return os.path.join(self.cache_dir, hashlib.sha1(os.path.dirname(os.path.abspath(source)).encode('utf-8')).hexdigest()[:16])
+
+    def lookup(self, game_file):
+        """Return the staged copy of game_file, or game_file itself if it is one; None otherwise."""
+        with self.lock:
+            entry = self.entries.get(game_file)
+            source = game_file
+            if entry is None:
+                source = next((s for s, e in self.entries.items() if e["staged"] == game_file), None)
+                entry = self.entries.get(source)
+            if entry is None:
+                return None
+            try:
+                current = source_signature(game_files(source))
+            except OSError:
+                current = None  # Source drive unplugged: the staged copy is still good to play
+            if (current is not None and current != entry["signature"]) or not os.path.exists(entry["staged"]):
+                self.remove(source)
+                return None
+            entry["hits"] += 1
+            entry["last_used"] = time.time()
+            self.save()
+            return entry["staged"]
+
+    def score(self, entry):
+        return entry["last_used"] + HIT_WEIGHT * min(entry["hits"], MAX_COUNTED_HITS)
+
+    def used(self):
+        return sum(entry["size"] for entry in self.entries.values())
+
+    def make_room(self, size):
+        """Evict the lowest scoring entries until size more bytes fit; return whether they do."""
+        try:
+            st = os.statvfs(self.cache_dir)
+            free = st.f_bavail * st.f_frsize - FREE_SPACE_RESERVE
+        except OSError:
+            return False
+        for source in sorted(self.entries, key=lambda s: self.score(self.entries[s])):
+            if self.used() + size <= self.budget and size <= free:
+                break
+            free += self.entries[source]["size"]
+            print(f"Evicting staged copy of {source}")
+            self.remove(source, save=False)
+        return self.used() + size <= self.budget and size <= free
+
+    def stage(self, source):
+        """Copy source and its track files into the cache; return the staged game file or None."""
+        with self.lock:
+            if source in self.entries:
+                return self.entries[source]["staged"]
+        try:
+            files = game_files(source)
+            signature = source_signature(files)
+        except OSError as e:
+            print(f"Cannot stage {source}: {e}")
+            return None
+        size = sum(size for size, _ in signature)
+        with self.lock:
+            if size > self.budget or not self.make_room(size):
+                print(f"Not staging {source}: {size} bytes do not fit the staging budget")
+                self.save()
+                return None
+        staged_dir = self.staged_dir(source)
+        os.makedirs(staged_dir, exist_ok=True)
+        staged_files = []
+        start = time.monotonic()
+        try:
+            for path in files:
+                staged = os.path.join(staged_dir, os.path.basename(path))
+                copy_file(path, staged + ".part")
+                os.replace(staged + ".part", staged)
+                staged_files.append(staged)
+        except OSError as e:
+            print(f"Failed to stage {source}: {e}")
+            for path in staged_files + [staged + ".part"]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            return None
+        elapsed = time.monotonic() - start
+        print(f"Staged {source} ({size / (1024 * 1024):.1f} MB in {elapsed:.1f}s)")
+        with self.lock:
+            self.entries[source] = {"staged": staged_files[0], "files": staged_files, "signature": signature,
+                                    "size": size, "hits": 1, "last_used": time.time()}
+            self.save()
+        return staged_files[0]
+
+    def stage_later(self, source, delay=0):
+        """Stage source on a background thread after delay seconds; at most one copy per source."""
+        with self.lock:
+            if source in self.entries or source in self.pending:
+                return None
+            self.pending.add(source)
+
+        def run():
+            time.sleep(delay)
+            try:
+                self.stage(source)
+            finally:
+                with self.lock:
+                    self.pending.discard(source)
+
+        thread = threading.Thread(target=run, name="staging", daemon=True)
+        thread.start()
+        return thread
+
+    def remove(self, source, save=True):
+        entry = self.entries.pop(source, None)
+        if entry is None:
+            return
+        for path in entry["files"]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        try:
+            os.rmdir(os.path.dirname(entry["staged"]))
+        except OSError:
+            pass  # Still holds other games from the same folder
+        if save:
+            self.save()
+
+    def __len__(self):
+        return len(self.entries)
+
+def main():
+    cache_dir = sys.argv[1] if len(sys.argv) > 1 else "."
+    cache = StagingCache(cache_dir)
+    print(f"{len(cache)} staged games using {cache.used() / (1024 ** 3):.2f} GB in {cache_dir}")
+    for source, entry in sorted(cache.entries.items(), key=lambda item: -cache.score(item[1])):
+        print(f"  {entry['hits']:>4} launches  {entry['size'] / (1024 * 1024):>8.1f} MB  {source}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+import os
+import sys
+import zlib
+import random
+import struct
+import hashlib
+import binascii
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import cdrom
+import chd
+import ripper
+
+SECTOR = 2352
+FRAME = 2448
+MAP_NUMCODES = 16   # Compression type symbols in the v5 map's Huffman tree
+MAP_TREE_BITS = 4   # Bits per code length in the RLE-encoded tree (maxbits 8)
+
+class BitReader:
+    """MSB-first bit reader, written from the CHD v5 spec rather than from chd.py."""
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def read(self, count):
+        value = 0
+        for _ in range(count):
+            byte = self.pos // 8
+            bit = (self.data[byte] >> (7 - self.pos % 8)) & 1 if byte < len(self.data) else 0
+            value = (value << 1) | bit
+            self.pos += 1
+        return value
+
+def read_huffman_tree(bits):
+    """Import the RLE-encoded code lengths and return {(length, code): symbol}."""
+    lengths = []
+    while len(lengths) < MAP_NUMCODES:
+        length = bits.read(MAP_TREE_BITS)
+        if length != 1:
+            lengths.append(length)
+            continue
+        length = bits.read(MAP_TREE_BITS)
+        if length == 1:
+            lengths.append(1)
+        else:
+            lengths += [length] * (bits.read(MAP_TREE_BITS) + 3)
+    histogram = [0] * 33
+    for length in lengths:
+        histogram[length] += 1
+    start = [0] * 33
+    code = 0
+    for length in range(32, 0, -1):
+        start[length] = code
+        code = (code + histogram[length]) >> 1
+    codes = {}
+    for symbol, length in enumerate(lengths):
+        if length:
+            codes[(length, start[length])] = symbol
+            start[length] += 1
+    return codes
+
+def read_symbol(bits, codes):
+    value = 0
+    for length in range(1, 9):
+        value = (value << 1) | bits.read(1)
+        if (length, value) in codes:
+            return codes[(length, value)]
+    raise ValueError("Bad Huffman code")
+
+def read_chd(path):
+    """Decode a CD CHD written with cdzl and return (logical bytes, [track metadata strings])."""
+    with open(path, 'rb') as f:
+        blob = f.read()
+    assert blob[:8] == b"MComprHD"
+    assert struct.unpack_from(">II", blob, 8) == (124, 5)
+    compressors = [blob[16 + 4 * i:20 + 4 * i] for i in range(4)]
+    logical, map_offset, meta_offset, hunk_bytes, unit_bytes = struct.unpack_from(">QQQII", blob, 32)
+    raw_sha1, sha1 = blob[64:84], blob[84:104]
+    assert unit_bytes == FRAME and hunk_bytes % FRAME == 0
+    hunks = (logical + hunk_bytes - 1) // hunk_bytes
+
+    map_bytes, = struct.unpack_from(">I", blob, map_offset)
+    first_offset = int.from_bytes(blob[map_offset + 4:map_offset + 10], 'big')
+    map_crc, length_bits, self_bits, parent_bits = struct.unpack_from(">HBBB", blob, map_offset + 10)
+    bits = BitReader(blob[map_offset + 16:map_offset + 16 + map_bytes])
+    codes = read_huffman_tree(bits)
+    types = []
+    last = 0
+    repeat = 0
+    for _ in range(hunks):
+        if repeat:
+            types.append(last)
+            repeat -= 1
+            continue
+        symbol = read_symbol(bits, codes)
+        if symbol == 7:  # RLE small
+            types.append(last)
+            repeat = 2 + read_symbol(bits, codes)
+        elif symbol == 8:  # RLE large
+            types.append(last)
+            repeat = 2 + 16 + (read_symbol(bits, codes) << 4)
+            repeat += read_symbol(bits, codes)
+        else:
+            types.append(symbol)
+            last = symbol
+    entries = []
+    raw_map = bytearray()
+    offset = first_offset
+    for comp in types:
+        if comp <= 3:
+            length = bits.read(length_bits)
+        elif comp == 4:
+            length = hunk_bytes
+        else:
+            raise ValueError(f"Unexpected map entry type {comp}")
+        crc = bits.read(16)
+        entries.append((comp, offset, length, crc))
+        raw_map += bytes([comp]) + length.to_bytes(3, 'big') + offset.to_bytes(6, 'big') + crc.to_bytes(2, 'big')
+        offset += length
+    assert binascii.crc_hqx(bytes(raw_map), 0xFFFF) == map_crc
+
+    data = bytearray()
+    frames = hunk_bytes // FRAME
+    for comp, offset, length, crc in entries:
+        payload = blob[offset:offset + length]
+        if comp == 4:
+            hunk = payload
+        else:
+            assert compressors[comp] == b"cdzl"
+            ecc_bytes = (frames + 7) // 8
+            base_length = int.from_bytes(payload[ecc_bytes:ecc_bytes + 2], 'big')
+            base = zlib.decompress(payload[ecc_bytes + 2:ecc_bytes + 2 + base_length], -15)
+            subcode = zlib.decompress(payload[ecc_bytes + 2 + base_length:], -15)
+            assert len(base) == frames * SECTOR and len(subcode) == frames * 96
+            hunk = b"".join(base[i * SECTOR:(i + 1) * SECTOR] + subcode[i * 96:(i + 1) * 96] for i in range(frames))
+        assert binascii.crc_hqx(hunk, 0xFFFF) == crc
+        data += hunk
+    data = bytes(data[:logical])
+    assert hashlib.sha1(data).digest() == raw_sha1
+
+    metadata = []
+    offset = meta_offset
+    while offset:
+        tag, flags, length, offset_next = struct.unpack_from(">4sB3sQ", blob, offset)
+        length = int.from_bytes(length, 'big')
+        metadata.append((tag, flags, blob[offset + 16:offset + 16 + length]))
+        offset = offset_next
+    hashes = sorted(tag + hashlib.sha1(value).digest() for tag, flags, value in metadata if flags & 1)
+    assert hashlib.sha1(raw_sha1 + b"".join(hashes)).digest() == sha1
+    return data, [value.rstrip(b"\0").decode('ascii') for tag, flags, value in metadata]
+
+def make_image(path, seed=0):
+    """Write a data / audio / data image with odd track lengths and return (image bytes, TOC)."""
+    rng = random.Random(seed)
+
+    def data_track(count, mode):
+        out = bytearray()
+        for i in range(count):
+            # Half random (stored uncompressed), half compressible sectors
+            sector = bytearray(rng.randbytes(SECTOR)) if rng.random() < 0.5 else bytearray([i % 256]) * SECTOR
+            sector[15] = mode
+            out += sector
+        return out
+
+    image = bytes(data_track(301, 1) + rng.randbytes(123 * SECTOR) + data_track(77, 2))
+    with open(path, 'wb') as f:
+        f.write(image)
+    toc = [(1, True, 0), (2, False, 301), (3, True, 424), (cdrom.CDROM_LEADOUT, False, 501)]
+    return image, toc
+
+class ChdRoundTripTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.image_path = os.path.join(self.tmp.name, "disc.bin")
+        self.image, self.toc = make_image(self.image_path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_rip_to_chd_decodes_to_source(self):
+        chd_path = os.path.join(self.tmp.name, "disc.chd")
+        with ripper.ImageSectorSource(self.image_path, self.toc) as source:
+            result = ripper.rip_disc(source, chd.ChdWriter(chd_path, 2))
+        self.assertEqual(result.game_file, chd_path)
+        self.assertFalse(os.path.exists(chd_path + chd.PART_SUFFIX))
+        data, metadata = read_chd(chd_path)
+        self.assertEqual(metadata, [
+            "TRACK:1 TYPE:MODE1_RAW SUBTYPE:NONE FRAMES:301 PREGAP:0 PGTYPE:MODE1 PGSUB:RW POSTGAP:0",
+            "TRACK:2 TYPE:AUDIO SUBTYPE:NONE FRAMES:123 PREGAP:0 PGTYPE:MODE1 PGSUB:RW POSTGAP:0",
+            "TRACK:3 TYPE:MODE2_RAW SUBTYPE:NONE FRAMES:77 PREGAP:0 PGTYPE:MODE1 PGSUB:RW POSTGAP:0",
+        ])
+        frame = 0
+        for (_, is_data, start), (_, _, end) in zip(self.toc, self.toc[1:]):
+            for lba in range(start, end):
+                stored = data[frame * FRAME:frame * FRAME + SECTOR]
+                self.assertEqual(data[frame * FRAME + SECTOR:(frame + 1) * FRAME], bytes(96))
+                if not is_data:
+                    # Audio is stored big-endian
+                    stored = bytes(b for pair in zip(stored[1::2], stored[0::2]) for b in pair)
+                self.assertEqual(stored, self.image[lba * SECTOR:(lba + 1) * SECTOR], f"sector {lba}")
+                frame += 1
+            padding = -(end - start) % chd.TRACK_PADDING
+            self.assertEqual(data[frame * FRAME:(frame + padding) * FRAME], bytes(padding * FRAME))
+            frame += padding
+        self.assertEqual(len(data), frame * FRAME)
+
+    def test_hunks_round_trip(self):
+        compressible = bytes(chd.HUNK_BYTES)
+        payload, crc = chd.compress_hunk(compressible)
+        self.assertIsNotNone(payload)
+        self.assertEqual(chd.decompress_hunk(payload + b"next"), (compressible, len(payload)))
+        self.assertEqual(crc, binascii.crc_hqx(compressible, 0xFFFF))
+        self.assertIsNone(chd.compress_hunk(os.urandom(chd.HUNK_BYTES))[0])
+
+if __name__ == "__main__":
+    unittest.main()
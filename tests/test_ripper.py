@@ -0,0 +1,169 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import chd
+import ripper
+from test_chd import SECTOR, FRAME, make_image, read_chd
+
+class FlakySource(ripper.ImageSectorSource):
+    """Image source whose bad sectors fail every read, counting the sectors it serves."""
+
+    def __init__(self, image_path, toc, bad=()):
+        super().__init__(image_path, toc)
+        self.bad = set(bad)
+        self.sectors_read = 0
+
+    def read(self, lba, count, audio=False):
+        if self.bad.intersection(range(lba, lba + count)):
+            raise ripper.RipError(f"Read error at sector {lba}")
+        self.sectors_read += count
+        return super().read(lba, count, audio)
+
+    def batch_sectors(self):
+        return 13
+
+class ResumeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.image_path = os.path.join(self.tmp.name, "disc.bin")
+        self.image, self.toc = make_image(self.image_path)
+        # Checkpoint after every batch so an interrupted rip always leaves something to resume
+        self.interval = ripper.CHECKPOINT_INTERVAL
+        ripper.CHECKPOINT_INTERVAL = 0
+
+    def tearDown(self):
+        ripper.CHECKPOINT_INTERVAL = self.interval
+        self.tmp.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def writer(self, output):
+        if output.endswith(".chd"):
+            return chd.ChdWriter(output, 1)
+        return ripper.BinCueWriter(output, output[:-4] + ".cue")
+
+    def rip(self, output, bad=(), resumable=True, **kwargs):
+        source = FlakySource(self.image_path, self.toc, bad)
+        map_path = output + ripper.MAP_SUFFIX if resumable else None
+        try:
+            return ripper.rip_disc(source, self.writer(output), map_path=map_path, **kwargs), source.sectors_read
+        finally:
+            source.close()
+
+    def reference(self, ext):
+        output = self.path("reference" + ext)
+        result, _ = self.rip(output, resumable=False)
+        with open(output, 'rb') as f:
+            return f.read(), result
+
+    def assert_resumed(self, output, expected, reference, stopped_at):
+        result, resumed_read = self.rip(output)
+        with open(output, 'rb') as f:
+            self.assertEqual(f.read(), expected)
+        self.assertEqual(result.track_hashes, reference.track_hashes)
+        self.assertEqual(result.unreadable, [])
+        self.assertFalse(os.path.exists(output + ripper.PART_SUFFIX))
+        self.assertFalse(os.path.exists(output + ripper.MAP_SUFFIX))
+        # Only the sectors after the last checkpoint are read again, besides the TOC probe and
+        # fingerprint. A checkpoint misses the batch in flight and, for a CHD, the hunks still
+        # open or waiting on a worker.
+        lost = 13
+        if output.endswith(".chd"):
+            lost += (chd.MAX_PENDING_PER_WORKER + 1) * chd.FRAMES_PER_HUNK
+        overhead = len(self.toc) + ripper.FINGERPRINT_SECTORS
+        self.assertLessEqual(resumed_read, len(self.image) // SECTOR - stopped_at + lost + overhead)
+
+    def test_resume_after_bad_sector_matches_uninterrupted_rip(self):
+        for ext in (".chd", ".bin"):
+            expected, reference = self.reference(ext)
+            # Inside the first track, at the data/audio boundary and in the last track
+            for bad in (40, 300, 301, 302, 423, 450, 500):
+                with self.subTest(ext=ext, bad=bad):
+                    output = self.path(f"disc{bad}{ext}")
+                    with self.assertRaises(ripper.RipIncomplete):
+                        self.rip(output, bad=[bad])
+                    self.assertFalse(os.path.exists(output))
+                    self.assertTrue(os.path.exists(output + ripper.PART_SUFFIX))
+                    self.assert_resumed(output, expected, reference, bad)
+
+    def test_resume_after_cancel_matches_uninterrupted_rip(self):
+        for ext in (".chd", ".bin"):
+            expected, reference = self.reference(ext)
+            output = self.path("cancelled" + ext)
+            cancel = threading.Event()
+
+            def progress(p):
+                if p.sectors_done > 250:
+                    cancel.set()
+
+            with self.assertRaises(ripper.RipCancelled):
+                self.rip(output, progress=progress, cancel=cancel)
+            self.assert_resumed(output, expected, reference, 250)
+
+    def test_damaged_part_file_starts_over(self):
+        expected, reference = self.reference(".chd")
+        output = self.path("damaged.chd")
+        with self.assertRaises(ripper.RipIncomplete):
+            self.rip(output, bad=[400])
+        with open(output + ripper.PART_SUFFIX, 'r+b') as f:
+            f.truncate(500)
+        result, _ = self.rip(output)
+        with open(output, 'rb') as f:
+            self.assertEqual(f.read(), expected)
+        self.assertEqual(result.track_hashes, reference.track_hashes)
+
+    def test_sector_zero_filled_after_max_failures(self):
+        bad = [100, 350]
+        zeroed = bytearray(self.image)
+        for lba in bad:
+            zeroed[lba * SECTOR:(lba + 1) * SECTOR] = bytes(SECTOR)
+        for ext in (".chd", ".bin"):
+            with self.subTest(ext=ext):
+                output = self.path("damaged" + ext)
+                attempts = 0
+                while True:
+                    attempts += 1
+                    self.assertLessEqual(attempts, len(bad) * ripper.MAX_SECTOR_FAILURES)
+                    try:
+                        result, _ = self.rip(output, bad=bad)
+                        break
+                    except ripper.RipIncomplete:
+                        pass
+                self.assertEqual(result.unreadable, bad)
+                # Each sector is retried on the attempts before its failures reach the cap
+                self.assertEqual(attempts, len(bad) * (ripper.MAX_SECTOR_FAILURES // ripper.SECTOR_RETRIES - 1) + 1)
+                self.assertFalse(os.path.exists(output + ripper.MAP_SUFFIX))
+                self.assert_image(output, bytes(zeroed))
+
+    def test_sector_zero_filled_at_once_without_map(self):
+        result, _ = self.rip(self.path("once.bin"), bad=[7, 420], resumable=False)
+        self.assertEqual(result.unreadable, [7, 420])
+        zeroed = bytearray(self.image)
+        for lba in (7, 420):
+            zeroed[lba * SECTOR:(lba + 1) * SECTOR] = bytes(SECTOR)
+        self.assert_image(self.path("once.bin"), bytes(zeroed))
+
+    def assert_image(self, output, image):
+        if output.endswith(".bin"):
+            with open(output, 'rb') as f:
+                self.assertEqual(f.read(), image)
+            return
+        data, _ = read_chd(output)
+        frame = 0
+        for (_, is_data, start), (_, _, end) in zip(self.toc, self.toc[1:]):
+            for lba in range(start, end):
+                stored = data[frame * FRAME:frame * FRAME + SECTOR]
+                if not is_data:
+                    stored = bytes(chd.swap_audio(stored))
+                self.assertEqual(stored, image[lba * SECTOR:(lba + 1) * SECTOR], f"sector {lba}")
+                frame += 1
+            frame += -(end - start) % chd.TRACK_PADDING
+
+if __name__ == "__main__":
+    unittest.main()
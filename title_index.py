@@ -0,0 +1,195 @@
+import os
+import sys
+import mmap
+import struct
+
+import game_ids
+
+# Compiled title index layout (all integers little-endian):
+#   header:  magic, format version, entry count, offsets of the key table, record table and string blob
+#   keys:    count fixed-width "SYSTEM:GAME-ID" keys, NUL padded and sorted bytewise; versioned
+#            discs also get "SYSTEM:GAME-ID:VERSION:DISC" keys (see key_variants)
+#   records: count (title offset, title length) pairs parallel to the key table
+#   strings: UTF-8 titles
+MAGIC = b"RSTI"
+FORMAT_VERSION = 3
+HEADER = struct.Struct("<4sHHIIII")
+RECORD = struct.Struct("<IH")
+KEY_SIZE = 32
+
+CSV_PATH = "games.csv"
+INDEX_PATH = "games.idx"
+
+def make_key(game_id, system):
+    """Return the fixed-width index key for (game_id, system), or None if it does not fit."""
+    key = f"{system.strip().upper()}:{game_ids.normalize(game_id)}".encode('utf-8')
+    if len(key) > KEY_SIZE:
+        return None
+    return key.ljust(KEY_SIZE, b"\0")
+
+def key_variants(game_id, version="", disc=None):
+    """Return the ID keys for a disc, most specific first: ID:version:disc, ID:version:, ID::disc, ID."""
+    game_id = game_id.strip()
+    variants = []
+    if version and disc:
+        variants.append(f"{game_id}:{version}:{disc}")
+    if version:
+        variants.append(f"{game_id}:{version}:")
+    if disc:
+        variants.append(f"{game_id}::{disc}")
+    variants.append(game_id)
+    return variants
+
+def read_csv_titles(csv_path):
+    """Yield (game_id, system, title, version, disc) rows from games.csv."""
+    import csv
+    from games_db import split_version, title_disc
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader)  # Skip header
+        for row in reader:
+            if len(row) >= 4:  # Minimum required: game_id, title, region, system
+                # Older exports glue Saturn versions onto the ID: "T-8113H-50V1.000"
+                game_id, version = split_version(row[0])
+                if len(row) > 6 and row[6]:
+                    version = row[6]
+                # Older exports have no disc column; their titles still carry the disc tag
+                disc = int(row[7]) if len(row) > 7 and row[7].isdigit() else title_disc(row[1])
+                yield game_id, row[3], row[1].strip(), version, disc
+
+def read_db_titles(db_path):
+    """Yield (game_id, system, title, version, disc) rows from games.db."""
+    import sqlite3
+    conn = sqlite3.connect(db_path)
+    try:
+        for game_id, system, title, version, disc in conn.execute(
+                "SELECT game_id, system, title, version, disc FROM games WHERE game_id IS NOT NULL"):
+            yield game_id, "PSX" if system == "PS1" else system, (title or "").strip(), version or "", disc
+    finally:
+        conn.close()
+
+def write_index(rows, index_path):
+    """Compile (game_id, system, title, version, disc) rows into a sorted index.
+
+    Each row is stored under every key_variants() key for its version and disc number
+    (0 for a single-disc game). A row's own most specific key beats the fallback keys of other rows;
+    among fallbacks the first disc and lowest version win, and later rows win otherwise.
+    """
+    ranked = {}  # key -> (rank, title)
+    skipped = 0
+    for order, (game_id, system, title, version, disc) in enumerate(rows):
+        keys = [make_key(variant, system) for variant in key_variants(game_id, version, disc)]
+        if keys[-1] is None or not title:
+            skipped += 1
+            continue
+        for level, key in enumerate(keys):
+            rank = (level, disc, version, -order)
+            if key is not None and (key not in ranked or rank < ranked[key][0]):
+                ranked[key] = (rank, title)
+    entries = {key: title for key, (_, title) in ranked.items()}
+    keys = sorted(entries)
+    strings = bytearray()
+    records = bytearray()
+    for key in keys:
+        title = entries[key].encode('utf-8')
+        records += RECORD.pack(len(strings), len(title))
+        strings += title
+    keys_offset = HEADER.size
+    records_offset = keys_offset + len(keys) * KEY_SIZE
+    strings_offset = records_offset + len(records)
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(keys), keys_offset, records_offset, strings_offset))
+        f.write(b"".join(keys))
+        f.write(records)
+        f.write(strings)
+    os.replace(tmp_path, index_path)
+    print(f"Wrote {len(keys)} keys to {index_path} ({skipped} rows skipped)")
+    return len(keys)
+
+def build_index(csv_path=CSV_PATH, index_path=INDEX_PATH, db_path=None):
+    """Compile games.csv, plus games.db if given, into a title index."""
+    def rows():
+        if db_path:
+            yield from read_db_titles(db_path)
+        yield from read_csv_titles(csv_path)
+    return write_index(rows(), index_path)
+
+def index_is_stale(index_path, source_paths):
+    """Return True if the index is missing or older than any of its sources."""
+    try:
+        index_mtime = os.path.getmtime(index_path)
+    except OSError:
+        return True
+    return any(os.path.exists(p) and os.path.getmtime(p) > index_mtime for p in source_paths)
+
+class TitleIndex:
+    """Memory-mapped title lookup; behaves like the old {(game_id, system): title} dict for reads."""
+
+    def __init__(self, index_path):
+        with open(index_path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.count, self.keys_offset, self.records_offset, self.strings_offset = \
+            HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.mm.close()
+            raise ValueError(f"{index_path} is not a version {FORMAT_VERSION} title index")
+
+    def find(self, key):
+        """Binary search the key table; return the entry number or -1."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = self.keys_offset + mid * KEY_SIZE
+            probe = self.mm[offset:offset + KEY_SIZE]
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def title_at(self, entry):
+        title_offset, title_len = RECORD.unpack_from(self.mm, self.records_offset + entry * RECORD.size)
+        start = self.strings_offset + title_offset
+        return self.mm[start:start + title_len].decode('utf-8')
+
+    def get(self, id_and_system, default=None):
+        game_id, system = id_and_system
+        key = make_key(game_id, system)
+        entry = self.find(key) if key else -1
+        return self.title_at(entry) if entry >= 0 else default
+
+    def lookup(self, game_id, system, version="", disc=None):
+        """Return the title under the most specific key_variants() key present, or None."""
+        for variant in key_variants(game_id, version, disc):
+            title = self.get((variant, system))
+            if title is not None:
+                return title
+        return None
+
+    def __contains__(self, id_and_system):
+        return self.get(id_and_system) is not None
+
+    def __getitem__(self, id_and_system):
+        title = self.get(id_and_system)
+        if title is None:
+            raise KeyError(id_and_system)
+        return title
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self.mm.close()
+
+def main():
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else CSV_PATH
+    index_path = sys.argv[2] if len(sys.argv) > 2 else INDEX_PATH
+    db_path = sys.argv[3] if len(sys.argv) > 3 else None
+    print(f"Compiling {csv_path} into {index_path}...")
+    build_index(csv_path, index_path, db_path)
+
+if __name__ == "__main__":
+    main()